@@ -0,0 +1,43 @@
+"""
+Account rows for signup and login.
+
+Emails and phone numbers are normalized before they are stored or looked
+up (migrations/07_users.sql normalizes existing rows the same way), so a
+login is one equality match on an indexed column whatever the user typed.
+"""
+
+# Everything login reads; the rest of the row stays in the database
+LOGIN_COLUMNS = 'user_id, username, email, phone_number, password_hash, password_salt, password_iterations'
+
+_PHONE_CHARACTERS = frozenset('0123456789+')
+
+
+def normalize_email(email: str | None) -> str | None:
+    """Trimmed and lowercased, as lower(btrim(email)) in SQL; None when empty."""
+    return email.strip().lower() or None if isinstance(email, str) else None
+
+
+def normalize_phone(phone: str | None) -> str | None:
+    """Only '+' and digits, as regexp_replace(phone, '[^0-9+]', '', 'g') in SQL; None when empty."""
+    return ''.join(ch for ch in phone if ch in _PHONE_CHARACTERS) or None if isinstance(phone, str) else None
+
+
+def account_row(user_id: str, username: str, email: str | None, phone: str | None,
+                password_hash: str, password_salt: str, password_iterations: int) -> dict:
+    """The users row signup writes (inserted, or replacing the user's existing account)."""
+    return {
+        'user_id': user_id,
+        'username': username,
+        'email': normalize_email(email),
+        'phone_number': normalize_phone(phone),
+        'password_hash': password_hash,
+        'password_salt': password_salt,
+        'password_iterations': password_iterations,
+    }
+
+
+def login_lookup(email: str | None, phone: str | None) -> dict:
+    """find_user() criteria for a login attempt: the email when given, else the phone number."""
+    if email:
+        return {'email': normalize_email(email)}
+    return {'phone_number': normalize_phone(phone)}
@@ -0,0 +1,186 @@
+"""
+Submission payload validation against the question catalog, before any
+database call.
+
+At import the frontend's catalog (database/client_catalog.json, generated
+from questions.ts and menu.ts, so keyed by the question ids the client
+sends) is compiled into one table: question id -> the set of accepted
+response values (option letters for multiple-choice and multi-select,
+'1'-'5' for scale questions) or a length cap (text-input). Checking a
+payload is then a dict lookup and a set membership test per answer, a few
+microseconds for a full questionnaire, so a bad submission is turned away
+with a 400 instead of failing halfway through a write.
+
+Every questionnaire type accepts answers to any question in the catalog:
+the frontend keeps answers across a change of identity (questionnaire
+type) and submits all of them, and scores them all too.
+
+CHON_VALIDATE_ANSWERS=0 keeps the payload shape checks (types, lengths,
+duplicates) but skips the per-question ones, for clients built against a
+different catalog.
+"""
+import json
+import os
+
+import catalog
+
+MAX_USER_ID_LENGTH = 100
+MAX_CORPORATE_ROLE_LENGTH = 100
+MAX_TEXT_ANSWER_LENGTH = int(os.getenv('CHON_MAX_TEXT_ANSWER_LENGTH', '2000'))
+VALIDATE_ANSWERS = os.getenv('CHON_VALIDATE_ANSWERS', '1') != '0'
+
+SCALE_RANGE = (1, 5)
+CHOICE_TYPES = ('multiple-choice', 'multi-select')
+
+
+class ValidationError(ValueError):
+    def __init__(self, errors: list[str]):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+def compile_rules(client_catalog: dict) -> dict:
+    """{questionnaire_type: {question_id: frozenset of accepted values | int text length cap}}."""
+    scale_values = frozenset(str(value) for value in range(SCALE_RANGE[0], SCALE_RANGE[1] + 1))
+    table = {}
+    for question in client_catalog['questions']:
+        if question['type'] in CHOICE_TYPES:
+            table[question['id']] = frozenset(question.get('options', []))
+        elif question['type'] == 'scale-question':
+            table[question['id']] = scale_values
+        else:
+            table[question['id']] = MAX_TEXT_ANSWER_LENGTH
+    return {questionnaire_type: table for questionnaire_type in client_catalog['menus']}
+
+
+RULES = compile_rules(catalog.load_client_catalog())
+
+
+def _choice_error(question_id: int, value: str, options: frozenset) -> str | None:
+    if value in options:
+        return None
+    # Multi-select answers arrive as a JSON array of option ids
+    if value.startswith('['):
+        try:
+            selected = json.loads(value)
+        except ValueError:
+            selected = None
+        if (isinstance(selected, list) and selected and len(set(selected)) == len(selected)
+                and all(isinstance(option, str) and option in options for option in selected)):
+            return None
+    return f'question {question_id}: {value[:20]!r} is not one of {", ".join(sorted(options))}'
+
+
+def _answer_error(table: dict | None, question_id: int, value: str) -> str | None:
+    if table is not None and VALIDATE_ANSWERS:
+        rule = table.get(question_id)
+        if rule is None:
+            return f'question {question_id} is not in the question catalog'
+        if isinstance(rule, int):
+            if not value.strip() or len(value) > rule:
+                return f'question {question_id}: answer must be 1 to {rule} characters'
+            return None
+        return _choice_error(question_id, value, rule)
+    if len(value) > MAX_TEXT_ANSWER_LENGTH:
+        return f'question {question_id}: answer must be at most {MAX_TEXT_ANSWER_LENGTH} characters'
+    return None
+
+
+def _check_header(data: dict, errors: list[str]) -> dict | None:
+    """Check the user_id, type and corporate_role of a payload; returns the type's rules."""
+    user_id, questionnaire_type = data.get('user_id'), data.get('type')
+    if not isinstance(user_id, str) or not 0 < len(user_id) <= MAX_USER_ID_LENGTH:
+        errors.append(f'user_id must be a non-empty string of at most {MAX_USER_ID_LENGTH} characters')
+    table = RULES.get(questionnaire_type) if isinstance(questionnaire_type, str) else None
+    if table is None:
+        errors.append(f"Invalid type. Must be one of: {', '.join(RULES)}")
+    corporate_role = data.get('corporate_role')
+    if corporate_role is not None and (
+        not isinstance(corporate_role, str) or len(corporate_role) > MAX_CORPORATE_ROLE_LENGTH
+    ):
+        errors.append(f'corporate_role must be a string of at most {MAX_CORPORATE_ROLE_LENGTH} characters')
+    return table
+
+
+def validate_submission(data: dict) -> list[dict]:
+    """
+    The answers of a batch submission payload, normalized to
+    [{"question_id": int, "response_value": str}]. Raises ValidationError
+    listing every problem found.
+    """
+    errors = []
+    answers = data.get('answers')
+    table = _check_header(data, errors)
+    if not isinstance(answers, list) or not answers:
+        errors.append('answers must be a non-empty list')
+        raise ValidationError(errors)
+    if table is not None and len(answers) > len(table):
+        errors.append(f'{len(answers)} answers for a questionnaire of {len(table)} questions')
+        raise ValidationError(errors)
+
+    normalized, seen = [], set()
+    for answer in answers:
+        if not isinstance(answer, dict):
+            errors.append('each answer must be an object with question_id and response_value')
+            break
+        question_id, value = answer.get('question_id'), answer.get('response_value')
+        if type(question_id) is not int:
+            errors.append(f'question_id must be an integer, got {question_id!r:.20}')
+            continue
+        if question_id in seen:
+            errors.append(f'question {question_id} is answered more than once')
+            continue
+        seen.add(question_id)
+        if not isinstance(value, str):
+            errors.append(f'question {question_id}: response_value must be a string')
+            continue
+
+        error = _answer_error(table, question_id, value)
+        if error:
+            errors.append(error)
+            continue
+        normalized.append({'question_id': question_id, 'response_value': value})
+
+    if errors:
+        raise ValidationError(errors)
+    return normalized
+
+
+def validate_draft_patch(data: dict) -> dict:
+    """
+    The answers of a draft patch, normalized to {"<question_id>": response_value}
+    with None for answers being cleared. The payload carries user_id, type,
+    an optional corporate_role, a positive integer version and the changed
+    answers as an object keyed by question id. Raises ValidationError.
+    """
+    errors = []
+    version, answers = data.get('version'), data.get('answers')
+    table = _check_header(data, errors)
+    if type(version) is not int or version < 1:
+        errors.append('version must be a positive integer')
+    if not isinstance(answers, dict) or not answers:
+        errors.append('answers must be a non-empty object keyed by question id')
+        raise ValidationError(errors)
+    if table is not None and len(answers) > len(table):
+        errors.append(f'{len(answers)} answers for a questionnaire of {len(table)} questions')
+        raise ValidationError(errors)
+
+    normalized = {}
+    for key, value in answers.items():
+        try:
+            question_id = int(key)
+        except ValueError:
+            errors.append(f'question id must be an integer, got {key!r:.20}')
+            continue
+        if value is not None and not isinstance(value, str):
+            errors.append(f'question {question_id}: response_value must be a string, or null to clear it')
+            continue
+        error = _answer_error(table, question_id, value) if value is not None else None
+        if error:
+            errors.append(error)
+            continue
+        normalized[str(question_id)] = value
+
+    if errors:
+        raise ValidationError(errors)
+    return normalized
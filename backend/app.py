@@ -1,38 +1,67 @@
 import os
-from flask import Flask, jsonify, request
-from flask_cors import CORS
+from flask import Flask, g, jsonify, request
 from dotenv import load_dotenv
-from supabase import create_client
-import hashlib
-import os
-import binascii
+import math
+import time
 
-# Load environment variables
+# Load environment variables (before the backend modules read their settings)
 load_dotenv()
 
+import accounts
+import answer_validation
+import catalog
+import drafts
+import export
+import http_cache
+import intro_stats
+import intro_writer
+import metrics
+import outbox
+import password_hashing
+import question_stats
+import rate_limit
+import session_tokens
+import storage
+import submissions
+import user_cache
+import user_responses
+
 app = Flask(__name__)
-# Configure CORS to allow all requests
-CORS(app, origins="*", supports_credentials=True, allow_headers=["Content-Type", "Authorization"])
 
-# Initialize Supabase client
-supabase_url = os.getenv("SUPABASE_URL")
-supabase_key = os.getenv("SUPABASE_KEY")
+# Wall/storage/hashing time per route: Server-Timing header and /api/metrics
+metrics.init_app(app)
+
+# gzip for large JSON bodies (conditional GETs are handled per route)
+http_cache.init_app(app)
 
-supabase = create_client(supabase_url, supabase_key)
+# Supabase by default; CHON_STORAGE=sqlite for a local database.
+# CHON_USER_CACHE: per-user submission reads are cached outside the
+# instrumentation, so a hit shows up as no storage call
+db = user_cache.cache_storage(metrics.instrument_storage(storage.create_storage()))
+
+# CHON_OUTBOX_PATH: writes are spooled locally and drained in the background;
+# started now so writes left by a previous run drain without waiting for new ones
+if outbox.ENABLED:
+    outbox.get_outbox(db)
 
 @app.route('/')
 def index():
     return jsonify({"message": "CHON Personality Test API"})
 
-# Ensure CORS headers exist on every response and make preflight expectations explicit
+# CORS for every response (including preflights): allow all origins
 @app.after_request
-def apply_cors_headers(response):
-    origin = request.headers.get('Origin')
+def add_cors_headers(response):
+    return apply_cors_headers(response, request.headers.get('Origin'))
+
+def apply_cors_headers(response, origin: str | None):
     # Echo back the request origin when present; otherwise allow all
     response.headers['Access-Control-Allow-Origin'] = origin or '*'
-    response.headers['Vary'] = 'Origin'
+    response.vary.add('Origin')
     response.headers['Access-Control-Allow-Credentials'] = 'true'
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
+    response.headers['Access-Control-Allow-Headers'] = (
+        'Content-Type, Authorization, Idempotency-Key, If-None-Match, If-Modified-Since'
+    )
+    response.headers['Access-Control-Expose-Headers'] = 'ETag, Last-Modified, Retry-After, Server-Timing'
     response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS, PUT, PATCH, DELETE'
     return response
 
@@ -58,22 +87,13 @@ def update_intro_choice():
             return jsonify({'error': 'Invalid choice. Must be "yes" or "no"'}), 400
         
         try:
-            # First try to update
-            update_result = supabase.table('intro_choices').update({
-                'choice': choice,
-                'updated_at': 'NOW()'
-            }).eq('user_id', user_id).execute()
-            
-            # If no rows were updated, do an insert
-            if not update_result.data:
-                supabase.table('intro_choices').insert({
-                    'user_id': user_id,
-                    'choice': choice
-                }).execute()
+            # Single INSERT ... ON CONFLICT (user_id) DO UPDATE, optionally buffered
+            queued = intro_writer.save_intro_choice(db, user_id, choice)
             
             return jsonify({
                 'success': True,
-                'message': f'Successfully saved choice for user {user_id}'
+                'message': f'Successfully saved choice for user {user_id}',
+                'queued': queued
             })
         
         except Exception as e:
@@ -95,24 +115,9 @@ def get_intro_stats():
     Returns counts and percentages for yes/no responses
     """
     try:
-        # Get all intro choices
-        response = supabase.table('intro_choices').select('choice').execute()
-        choices = response.data
-        
-        # Count yes and no responses
-        yes_count = sum(1 for choice in choices if choice['choice'] == 'yes')
-        no_count = sum(1 for choice in choices if choice['choice'] == 'no')
-        total = yes_count + no_count
-        
-        # Calculate percentage
-        yes_percentage = round((yes_count / total) * 100) if total > 0 else 50
-        
-        return jsonify({
-            'yes_count': yes_count,
-            'no_count': no_count,
-            'total': total,
-            'yes_percentage': yes_percentage
-        })
+        # Running totals are kept by a trigger on intro_choices and cached briefly in-process;
+        # the response carries an ETag so polling clients mostly get 304s
+        return intro_stats.serve_intro_stats(db)
     
     except Exception as e:
         print(f"Error getting intro stats: {e}")
@@ -124,21 +129,39 @@ def get_intro_stats():
             'error': str(e)
         }), 500
 
-def _hash_password(password: str, salt: str | None = None):
-    """Return (hash_hex, salt_hex) using PBKDF2-HMAC-SHA256."""
-    if salt is None:
-        salt_bytes = os.urandom(16)
-    else:
-        salt_bytes = binascii.unhexlify(salt)
-    hash_bytes = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt_bytes, 100_000)
-    return binascii.hexlify(hash_bytes).decode('utf-8'), binascii.hexlify(salt_bytes).decode('utf-8')
-
-def _verify_password(password: str, salt_hex: str, expected_hash_hex: str) -> bool:
+def _timed_hashing(fn, *args):
+    """Run a hashing call and add its wall time (including queue wait) to this request's total."""
+    start = time.perf_counter()
     try:
-        calc_hash_hex, _ = _hash_password(password, salt_hex)
-        return calc_hash_hex == expected_hash_hex
-    except Exception:
-        return False
+        return fn(*args)
+    finally:
+        g.hash_ms = g.get('hash_ms', 0.0) + (time.perf_counter() - start) * 1000
+
+def _hash_password(password: str, salt: str | None = None):
+    """Return (hash_hex, salt_hex, iterations) using PBKDF2-HMAC-SHA256 in the hashing pool."""
+    return _timed_hashing(password_hashing.hasher.hash_password, password, salt)
+
+def _verify_password(password: str, salt_hex: str, expected_hash_hex: str, iterations: int | None = None) -> bool:
+    return _timed_hashing(password_hashing.hasher.verify_password, password, salt_hex, expected_hash_hex, iterations)
+
+def _hashing_saturated_response():
+    response = jsonify({'error': 'Server is busy, please retry shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+def _rate_limited_response(email: str | None, phone: str | None):
+    """429 when this client IP or this email/phone is out of attempts, else None. Checked before any hashing."""
+    retry_after = rate_limit.get_limiter().check(
+        rate_limit.client_ip(request.remote_addr, request.headers.get('X-Forwarded-For')),
+        rate_limit.normalize_identity(email, phone)
+    )
+    if not retry_after:
+        return None
+    metrics.RATE_LIMITED_TOTAL.inc(metrics.route_labels())
+    response = jsonify({'error': 'Too many attempts, please retry later'})
+    response.headers['Retry-After'] = str(math.ceil(retry_after))
+    return response, 429
+
 
 @app.route('/api/batch-question-responses', methods=['POST'])
 def batch_save_question_responses():
@@ -165,46 +188,61 @@ def batch_save_question_responses():
     if missing_fields:
         return jsonify({'error': f"Missing required fields: {', '.join(missing_fields)}"}), 400
     
+    # Lets a client retry after a timeout without creating a duplicate submission
+    idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+    if idempotency_key is not None and (
+        not isinstance(idempotency_key, str) or len(idempotency_key) > submissions.MAX_IDEMPOTENCY_KEY_LENGTH
+    ):
+        return jsonify({'error': f'idempotency_key must be a string of at most {submissions.MAX_IDEMPOTENCY_KEY_LENGTH} characters'}), 400
+    
+    # Rejected against the compiled catalog before anything is written
+    try:
+        answers = answer_validation.validate_submission(data)
+    except answer_validation.ValidationError as e:
+        return jsonify({'error': 'Invalid submission', 'details': e.errors}), 400
+    
     try:
-        # Create submission data with optional corporate_role
-        submission_data = {
-            'user_id': data['user_id'],
-            'questionnaire_type': data['type']
-        }
-        
         # Add corporate_role if provided and type is corporate or both
+        corporate_role = None
         if 'corporate_role' in data and data['type'] in ['corporate', 'both']:
-            submission_data['corporate_role'] = data['corporate_role']
-        
-        # Create the questionnaire submission
-        submission_response = supabase.table('questionnaire_submissions').insert(
-            submission_data
-        ).execute()
+            corporate_role = data['corporate_role']
         
-        submission_id = submission_response.data[0]['id']
-        
-        # Insert all answers
-        answers = []
-        for answer in data['answers']:
-            answers.append({
-                'submission_id': submission_id,
-                'question_id': answer['question_id'],
-                'response_value': answer['response_value']
+        if outbox.ENABLED:
+            # Durable once spooled; the database id exists only after the outbox drains
+            provisional_id = outbox.get_outbox(db).add_submission(
+                data['user_id'], data['type'], answers, corporate_role, idempotency_key
+            )
+            return jsonify({
+                'success': True,
+                'message': f'Queued submission for user {data["user_id"]}',
+                'submission_id': None,
+                'provisional_id': provisional_id,
+                'queued': True
             })
         
-        if answers:
-            supabase.table('question_answers').insert(answers).execute()
+        # Submission row and answers are written in one transaction
+        submission_id, created = submissions.save_submission(
+            db, data['user_id'], data['type'], answers, corporate_role, idempotency_key
+        )
         
         return jsonify({
             'success': True,
             'message': f'Successfully saved submission for user {data["user_id"]}',
-            'submission_id': submission_id
+            'submission_id': submission_id,
+            'duplicate': not created
         })
     
     except Exception as e:
         print(f"Error saving batch responses: {e}")
         return jsonify({'error': str(e)}), 500
 
+def _with_session(body: dict, user_id: str, password_hash: str | None) -> dict:
+    """`body` plus a fresh session (access and refresh token) when sessions are enabled"""
+    session = session_tokens.issue_session(user_id, password_hash)
+    if session:
+        body['session'] = session
+    return body
+
 @app.route('/api/signup', methods=['POST', 'OPTIONS'])
 def signup():
     """
@@ -231,40 +269,27 @@ def signup():
         user_id = data.get('user_id')
         username = data.get('username')
         password = data.get('password')
-        email = data.get('email')
-        phone = data.get('phone_number')
+        email = accounts.normalize_email(data.get('email'))
+        phone = accounts.normalize_phone(data.get('phone_number'))
 
         if not user_id or not username or not password:
             return jsonify({'error': 'Missing required fields: user_id, username, password'}), 400
         if not email and not phone:
             return jsonify({'error': 'Provide at least one of email or phone_number'}), 400
 
+        limited = _rate_limited_response(email, phone)
+        if limited:
+            return limited
+
         # Hash password
-        pwd_hash, salt = _hash_password(password)
-
-        # Upsert-like behavior: ensure unique by user_id
-        # Try update first
-        existing = supabase.table('users').select('id').eq('user_id', user_id).execute()
-        if existing.data:
-            # Update existing record
-            supabase.table('users').update({
-                'email': email,
-                'phone_number': phone,
-                'username': username,
-                'password_hash': pwd_hash,
-                'password_salt': salt,
-            }).eq('user_id', user_id).execute()
-        else:
-            supabase.table('users').insert({
-                'user_id': user_id,
-                'email': email,
-                'phone_number': phone,
-                'username': username,
-                'password_hash': pwd_hash,
-                'password_salt': salt,
-            }).execute()
-
-        return jsonify({'success': True})
+        pwd_hash, salt, iterations = _hash_password(password)
+
+        # Creates the account, or replaces the one already linked to this user_id, in one round trip
+        db.upsert_user(accounts.account_row(user_id, username, email, phone, pwd_hash, salt, iterations))
+
+        return jsonify(_with_session({'success': True}, user_id, pwd_hash))
+    except password_hashing.HashingSaturated:
+        return _hashing_saturated_response()
     except Exception as e:
         print(f"Error in signup: {e}")
         return jsonify({'error': str(e)}), 500
@@ -287,28 +312,43 @@ def login():
         if not data:
             return jsonify({'error': 'Invalid JSON'}), 400
 
-        email = data.get('email')
-        phone = data.get('phone_number')
+        email = accounts.normalize_email(data.get('email'))
+        phone = accounts.normalize_phone(data.get('phone_number'))
         password = data.get('password')
 
         if (not email and not phone) or not password:
             return jsonify({'error': 'Provide email or phone_number and password'}), 400
 
-        # Lookup user by email or phone
-        if email:
-            q = supabase.table('users').select('*').eq('email', email).limit(1).execute()
-        else:
-            q = supabase.table('users').select('*').eq('phone_number', phone).limit(1).execute()
+        limited = _rate_limited_response(email, phone)
+        if limited:
+            return limited
 
-        user_rows = q.data or []
-        if not user_rows:
+        # Lookup user by email or phone (indexed, normalized columns; only what login needs)
+        user = db.find_user(accounts.LOGIN_COLUMNS, **accounts.login_lookup(email, phone))
+
+        if not user:
             return jsonify({'error': 'Invalid credentials'}), 401
 
-        user = user_rows[0]
-        if not _verify_password(password, user.get('password_salt', ''), user.get('password_hash', '')):
+        stored_iterations = user.get('password_iterations')
+        if not _verify_password(password, user.get('password_salt', ''), user.get('password_hash', ''), stored_iterations):
             return jsonify({'error': 'Invalid credentials'}), 401
 
-        return jsonify({
+        # Upgrade hashes created with a different iteration count while we have the plaintext
+        password_hash = user.get('password_hash')
+        if password_hashing.hasher.needs_rehash(stored_iterations):
+            try:
+                pwd_hash, salt, iterations = _hash_password(password)
+                db.update_user(user.get('user_id'), {
+                    'password_hash': pwd_hash,
+                    'password_salt': salt,
+                    'password_iterations': iterations,
+                })
+                password_hash = pwd_hash
+            except Exception as e:
+                # The login itself succeeded; try again next time
+                print(f"Error rehashing password: {e}")
+
+        return jsonify(_with_session({
             'success': True,
             'user': {
                 'user_id': user.get('user_id'),
@@ -316,45 +356,292 @@ def login():
                 'email': user.get('email'),
                 'phone_number': user.get('phone_number'),
             }
-        })
+        }, user.get('user_id'), password_hash))
+    except password_hashing.HashingSaturated:
+        return _hashing_saturated_response()
     except Exception as e:
         print(f"Error in login: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/token/refresh', methods=['POST', 'OPTIONS'])
+def refresh_session():
+    """
+    Exchange a refresh token for a new session (access and refresh token).
+    Expects JSON: {"refresh_token": "..."}
+    """
+    if request.method == 'OPTIONS':
+        return ('', 204)
+    if not session_tokens.ENABLED:
+        return jsonify({'error': 'Sessions are not enabled'}), 404
+
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'Invalid JSON'}), 400
+
+        try:
+            claims = session_tokens.verify(data.get('refresh_token'), session_tokens.REFRESH)
+            # The only read: a changed password revokes the account's refresh tokens
+            user = db.find_user(session_tokens.REFRESH_COLUMNS, user_id=claims['sub'])
+            session = session_tokens.refreshed_session(claims, user)
+        except session_tokens.InvalidToken as e:
+            return jsonify({'error': str(e)}), 401
+
+        return jsonify({'success': True, 'session': session})
+    except Exception as e:
+        print(f"Error refreshing session: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/user-responses/<user_id>', methods=['GET'])
 def get_user_responses(user_id):
     """
     Get all responses for a specific user
+    Query parameters (all optional):
+        exists=1   -> {"user_id", "exists"} without loading any submission data
+        summary=1  -> submission/answer counts without loading any answers
+        limit=N, cursor=<next_cursor>  -> one page of submissions, oldest first
     """
     try:
-        # Get user's questionnaire submissions
-        submissions = supabase.table('questionnaire_submissions').select(
-            '*'
-        ).eq('user_id', user_id).execute()
-        
-        results = []
-        for submission in submissions.data:
-            # Get answers for this submission
-            answers = supabase.table('question_answers').select(
-                '*'
-            ).eq('submission_id', submission['id']).execute()
-            
-            results.append({
-                'submission_id': submission['id'],
-                'questionnaire_type': submission['questionnaire_type'],
-                'created_at': submission['created_at'],
-                'answers': answers.data
+        # A bearer token is checked by signature alone, without a database read
+        denied = session_tokens.authorize_user(request.headers.get('Authorization'), user_id)
+        if denied:
+            return jsonify({'error': denied[0]}), denied[1]
+
+        if request.args.get('exists') == '1':
+            response = jsonify({
+                'user_id': user_id,
+                'exists': user_responses.submission_exists(db, user_id)
             })
-        
-        return jsonify({
-            'user_id': user_id,
-            'submissions': results
-        })
+            response.headers['Cache-Control'] = user_responses.CACHE_CONTROL
+            return response
+
+        summary = request.args.get('summary') == '1'
+        try:
+            limit, cursor = (None, None) if summary else user_responses.parse_page_args(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        variant = 'summary' if summary else f'submissions:{limit}:{cursor}'
+
+        # Revalidation is answered from a one-row version query, before any answers are read.
+        # Pages need that query for their validators anyway; full reads derive them from the rows.
+        version = None
+        conditional = 'If-None-Match' in request.headers or 'If-Modified-Since' in request.headers
+        if conditional or limit is not None or cursor is not None:
+            version = user_responses.submission_version(db, user_id)
+            etag, last_modified = user_responses.validators(user_id, variant, version)
+            if http_cache.is_fresh(etag, last_modified):
+                return http_cache.not_modified(etag, last_modified, user_responses.CACHE_CONTROL)
+
+        if summary:
+            body, rows_version = user_responses.submission_summary(db, user_id)
+            body = {'user_id': user_id, **body}
+        else:
+            # Submissions and their answers come back in a single query
+            results, next_cursor, rows_version = user_responses.fetch_submissions(db, user_id, limit, cursor)
+            body = {
+                'user_id': user_id,
+                'submissions': results
+            }
+            if limit is not None:
+                body['next_cursor'] = next_cursor
+
+        etag, last_modified = user_responses.validators(user_id, variant, rows_version or version)
+        return http_cache.set_validators(jsonify(body), etag, last_modified, user_responses.CACHE_CONTROL)
     
     except Exception as e:
         print(f"Error getting user responses: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/drafts/<user_id>', methods=['GET', 'PATCH'])
+def user_draft(user_id):
+    """
+    The user's in-progress questionnaire (autosave).
+    GET   -> {"user_id", "type", "corporate_role", "answers": {"<question_id>": value}, "version", "updated_at"}
+    PATCH -> store the answers changed since the last patch. Expects JSON: {
+        "type": "mother/corporate/other/both",
+        "corporate_role": "founder/board_member/etc" (optional),
+        "version": 5,                        -- the previous patch's version + 1
+        "answers": {"12": "B", "13": null}   -- changed answers only; null clears one
+    }
+    A patch whose version is not newer than the stored draft's gets a 409.
+    """
+    try:
+        denied = session_tokens.authorize_user(request.headers.get('Authorization'), user_id)
+        if denied:
+            return jsonify({'error': denied[0]}), denied[1]
+
+        if request.method == 'GET':
+            draft = db.get_draft(user_id)
+            if draft is None:
+                return jsonify({'error': 'No draft'}), 404
+            etag, last_modified = drafts.validators(draft)
+            if http_cache.is_fresh(etag, last_modified):
+                return http_cache.not_modified(etag, last_modified, drafts.CACHE_CONTROL)
+            return http_cache.set_validators(jsonify(drafts.draft_body(draft)), etag, last_modified,
+                                             drafts.CACHE_CONTROL)
+
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'Invalid JSON'}), 400
+        try:
+            answers = answer_validation.validate_draft_patch({**data, 'user_id': user_id})
+        except answer_validation.ValidationError as e:
+            return jsonify({'error': 'Invalid draft', 'details': e.errors}), 400
+
+        # Rapid patches from one user are merged into a single write
+        version, applied = drafts.get_writer(db).patch(
+            user_id, data['version'], data['type'], data.get('corporate_role'), answers
+        )
+        if not applied:
+            return jsonify({'error': 'Draft has a newer version; fetch it and patch on top', 'version': version}), 409
+        return jsonify({'success': True, 'user_id': user_id, 'version': version})
+
+    except Exception as e:
+        print(f"Error saving draft: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/drafts/<user_id>/submit', methods=['POST'])
+def submit_draft(user_id):
+    """
+    Turn the user's draft into a submission without sending its answers again.
+    Optional JSON: {"version": 7} -- 409 unless the stored draft is at this version,
+    so every patch the client made is included. Idempotency-Key is honoured as in
+    /api/batch-question-responses.
+    """
+    try:
+        denied = session_tokens.authorize_user(request.headers.get('Authorization'), user_id)
+        if denied:
+            return jsonify({'error': denied[0]}), denied[1]
+
+        data = request.get_json(silent=True) or {}
+        version = data.get('version')
+        if version is not None and type(version) is not int:
+            return jsonify({'error': 'version must be an integer'}), 400
+        idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+        if idempotency_key is not None and (
+            not isinstance(idempotency_key, str) or len(idempotency_key) > submissions.MAX_IDEMPOTENCY_KEY_LENGTH
+        ):
+            return jsonify({'error': f'idempotency_key must be a string of at most {submissions.MAX_IDEMPOTENCY_KEY_LENGTH} characters'}), 400
+
+        # The draft becomes a submission and is deleted in one transaction
+        result = db.promote_draft(user_id, version, idempotency_key)
+        if 'status' in result:
+            error, status = drafts.PROMOTE_ERRORS[result['status']]
+            return jsonify({'error': error, 'version': result.get('version')}), status
+        if result['created']:
+            submissions.index_stored_submission(db, result['submission_id'])
+
+        return jsonify({
+            'success': True,
+            'message': f'Successfully saved submission for user {user_id}',
+            'submission_id': result['submission_id'],
+            'duplicate': not result['created']
+        })
+
+    except Exception as e:
+        print(f"Error submitting draft: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/questions', methods=['GET'])
+def get_question_index():
+    """
+    List questionnaire types with their question counts and catalog ETags
+    """
+    return catalog.serve_index()
+
+@app.route('/api/questions/<questionnaire_type>', methods=['GET'])
+def get_questions(questionnaire_type):
+    """
+    Get the question catalog for one questionnaire type
+    Query parameters:
+        lang=en|zh|all (default all) -> only that language's text fields
+    Served precompressed (gzip/br) with a strong ETag; If-None-Match -> 304
+    """
+    try:
+        return catalog.serve_questions(questionnaire_type)
+    except Exception as e:
+        print(f"Error getting questions: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/question-stats/<int:unique_question_id>', methods=['GET'])
+def get_question_stats(unique_question_id):
+    """
+    Get the answer distribution for one question (unique_question_id from
+    question_identity_mapping), across mother/corporate/other/both
+    """
+    try:
+        return jsonify(question_stats.get_question_stats(db, unique_question_id))
+    except Exception as e:
+        print(f"Error getting question stats: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/scores/<int:submission_id>', methods=['GET'])
+def get_submission_scores(submission_id):
+    """
+    Tag scores for one submission (same numbers as the frontend's tag stats).
+    ?percentiles=1 adds each tag's percentile rank within the questionnaire's population
+    """
+    # numpy is only imported by the scoring routes, keeping it out of cold starts
+    import scoring
+    try:
+        scores = scoring.get_submission_scores(db, submission_id)
+        if scores is None:
+            return jsonify({'error': 'Submission not found'}), 404
+        if request.args.get('percentiles') in ('1', 'true'):
+            scores = scoring.with_percentile_ranks(db, scores)
+        return jsonify(scores)
+    except Exception as e:
+        print(f"Error scoring submission: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/scores/population', methods=['GET'])
+def get_population_scores():
+    """Mean and percentiles of each tag's score across all submissions of ?type="""
+    import scoring
+    questionnaire_type = request.args.get('type')
+    if not questionnaire_type:
+        return jsonify({'error': 'Missing required parameter: type'}), 400
+    try:
+        population = scoring.get_population(db, questionnaire_type)
+        if population is None:
+            return jsonify({'error': f'Unknown questionnaire type: {questionnaire_type}'}), 404
+        return jsonify(population.summary())
+    except Exception as e:
+        print(f"Error getting population scores: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/similar-respondents/<int:submission_id>', methods=['GET'])
+def get_similar_respondents(submission_id):
+    """
+    The ?k= (default 10, max 100) submissions whose multiple-choice and scale
+    answers most often equal this submission's, best first
+    """
+    # numpy is only imported by the similarity routes, keeping it out of cold starts
+    import similarity
+    try:
+        k = int(request.args.get('k', 10))
+    except ValueError:
+        return jsonify({'error': 'k must be an integer'}), 400
+    if k < 1:
+        return jsonify({'error': 'k must be positive'}), 400
+    try:
+        result = similarity.similar_submissions(db, submission_id, k)
+        if result is None:
+            return jsonify({'error': 'Submission not found'}), 404
+        return jsonify(result)
+    except Exception as e:
+        print(f"Error finding similar respondents: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/export/submissions', methods=['GET'])
+def export_submissions():
+    """
+    Stream every submission with its answers as NDJSON (default) or ?format=csv,
+    gzip-compressed when accepted. ?updated_since=<ISO timestamp> for incremental
+    pulls, ?after_id= to resume, ?type= to filter. Bearer CHON_EXPORT_TOKEN required
+    """
+    return export.serve_export(db)
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5001))
     app.run(host='0.0.0.0', port=port)
@@ -0,0 +1,563 @@
+"""
+Async (ASGI) serving mode.
+
+The routes that spend their time waiting on the database are served by a
+Quart app with async storage (async_storage.py): a handler awaiting
+Supabase yields the event loop, so one process keeps hundreds of requests
+in flight over a shared connection pool, and independent queries go out
+concurrently. Every other route (catalog, scores, similar respondents,
+export, metrics) is passed to the WSGI app in app.py, which runs in worker
+threads, so both modes serve the same API.
+
+    pip install quart hypercorn   (poetry install --extras asgi)
+    hypercorn asgi:application --bind 0.0.0.0:5001
+
+Use a single worker per core; each one has its own event loop and pool.
+"""
+import asyncio
+import math
+import time
+
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from quart import Quart, Response, g, jsonify, request
+from werkzeug.exceptions import MethodNotAllowed, NotFound
+from werkzeug.routing import RequestRedirect
+
+import accounts
+import answer_validation
+import async_storage
+import drafts
+import http_cache
+import intro_stats
+import intro_writer
+import metrics
+import outbox
+import password_hashing
+import question_stats
+import rate_limit
+import session_tokens
+import submissions
+import user_cache
+import user_responses
+from app import apply_cors_headers, app as wsgi_app, db as sync_db
+
+app = Quart(__name__)
+
+db = async_storage.create_async_storage(sync_db)
+
+
+class _InstrumentedStorage:
+    """metrics.InstrumentedStorage for coroutine methods, on Quart's request globals."""
+
+    def __init__(self, inner):
+        self._inner = inner
+
+    def __getattr__(self, name):
+        attr = getattr(self._inner, name)
+        if not callable(attr):
+            return attr
+
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await attr(*args, **kwargs)
+            finally:
+                g.storage_seconds = g.get('storage_seconds', 0.0) + (time.perf_counter() - start)
+                g.storage_calls = g.get('storage_calls', 0) + 1
+        return timed
+
+
+adb = _InstrumentedStorage(db)
+if not isinstance(db, async_storage.ThreadedStorage):
+    # (ThreadedStorage calls sync_db, which is already cached)
+    adb = user_cache.cache_async_storage(adb)
+
+
+@app.before_request
+async def _start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+async def _finish_request(response):
+    # Same headers as the WSGI app's after_request hooks: compression, CORS, Server-Timing
+    if http_cache.should_compress(response, request.headers):
+        http_cache.gzip_response(response, await response.get_data())
+    apply_cors_headers(response, request.headers.get('Origin'))
+
+    started = g.get('request_started')
+    if started is not None:
+        rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        response.headers['Server-Timing'] = metrics.observe_request(
+            (rule, request.method), response.status_code, time.perf_counter() - started,
+            request.content_length or 0, response.content_length or 0,
+            g.get('storage_seconds', 0.0), g.get('storage_calls'),
+            g.hash_ms / 1000 if 'hash_ms' in g else None,
+        )
+    return response
+
+
+@app.after_serving
+async def _close_storage():
+    await db.aclose()
+
+
+@app.route('/api/intro-choice', methods=['POST'])
+async def update_intro_choice():
+    try:
+        data = await request.get_json()
+
+        if 'choice' not in data or 'user_id' not in data:
+            return jsonify({'error': 'Missing required fields'}), 400
+
+        choice = data['choice']
+        user_id = data['user_id']
+
+        if choice not in ['yes', 'no']:
+            return jsonify({'error': 'Invalid choice. Must be "yes" or "no"'}), 400
+
+        try:
+            if outbox.ENABLED:
+                # The outbox and write-behind buffer drain from their own threads, through the sync storage
+                await asyncio.to_thread(outbox.get_outbox(sync_db).add_intro_choice, user_id, choice)
+            elif intro_writer.WRITE_BEHIND:
+                intro_writer.get_buffer(sync_db).add(user_id, choice)
+            else:
+                await adb.upsert_intro_choices([{'user_id': user_id, 'choice': choice}])
+
+            return jsonify({
+                'success': True,
+                'message': f'Successfully saved choice for user {user_id}',
+                'queued': outbox.ENABLED or intro_writer.WRITE_BEHIND
+            })
+
+        except Exception as e:
+            return jsonify({
+                'error': str(e),
+                'message': 'Failed to save choice. Database operation failed.'
+            }), 500
+
+    except Exception as e:
+        return jsonify({
+            'error': str(e),
+            'message': 'Failed to process request.'
+        }), 500
+
+
+@app.route('/api/intro-stats', methods=['GET'])
+async def get_intro_stats():
+    try:
+        entry = await intro_stats.cached_entry_async(adb)
+        if http_cache.is_fresh(entry['etag'], entry['last_modified'], request.headers):
+            return http_cache.not_modified(entry['etag'], entry['last_modified'], intro_stats.CACHE_CONTROL,
+                                           response_class=Response)
+        return http_cache.set_validators(jsonify(entry['stats']), entry['etag'], entry['last_modified'],
+                                         intro_stats.CACHE_CONTROL)
+
+    except Exception as e:
+        print(f"Error getting intro stats: {e}")
+        return jsonify({
+            'yes_count': 0,
+            'no_count': 0,
+            'total': 0,
+            'yes_percentage': 50,
+            'error': str(e)
+        }), 500
+
+
+async def _timed_hashing(fn, *args):
+    """Run a hashing call in a thread and add its wall time (including queue wait) to this request's total."""
+    start = time.perf_counter()
+    try:
+        return await asyncio.to_thread(fn, *args)
+    finally:
+        g.hash_ms = g.get('hash_ms', 0.0) + (time.perf_counter() - start) * 1000
+
+
+def _hashing_saturated_response():
+    response = jsonify({'error': 'Server is busy, please retry shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+
+async def _rate_limited_response(email: str | None, phone: str | None):
+    limiter = rate_limit.get_limiter()
+    args = (rate_limit.client_ip(request.remote_addr, request.headers.get('X-Forwarded-For')),
+            rate_limit.normalize_identity(email, phone))
+    # Shared stores do I/O; the in-process one is a dict update
+    retry_after = await asyncio.to_thread(limiter.check, *args) if limiter.blocking else limiter.check(*args)
+    if not retry_after:
+        return None
+    metrics.RATE_LIMITED_TOTAL.inc((request.url_rule.rule, request.method))
+    response = jsonify({'error': 'Too many attempts, please retry later'})
+    response.headers['Retry-After'] = str(math.ceil(retry_after))
+    return response, 429
+
+
+@app.route('/api/batch-question-responses', methods=['POST'])
+async def batch_save_question_responses():
+    data = await request.get_json()
+
+    required_fields = ['user_id', 'type', 'answers']
+    missing_fields = [field for field in required_fields if field not in data]
+
+    if missing_fields:
+        return jsonify({'error': f"Missing required fields: {', '.join(missing_fields)}"}), 400
+
+    idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+    if idempotency_key is not None and (
+        not isinstance(idempotency_key, str) or len(idempotency_key) > submissions.MAX_IDEMPOTENCY_KEY_LENGTH
+    ):
+        return jsonify({'error': f'idempotency_key must be a string of at most {submissions.MAX_IDEMPOTENCY_KEY_LENGTH} characters'}), 400
+
+    try:
+        answers = answer_validation.validate_submission(data)
+    except answer_validation.ValidationError as e:
+        return jsonify({'error': 'Invalid submission', 'details': e.errors}), 400
+
+    try:
+        corporate_role = None
+        if 'corporate_role' in data and data['type'] in ['corporate', 'both']:
+            corporate_role = data['corporate_role']
+
+        if outbox.ENABLED:
+            # Durable once spooled; the database id exists only after the outbox drains
+            provisional_id = await asyncio.to_thread(
+                outbox.get_outbox(sync_db).add_submission,
+                data['user_id'], data['type'], answers, corporate_role, idempotency_key
+            )
+            return jsonify({
+                'success': True,
+                'message': f'Queued submission for user {data["user_id"]}',
+                'submission_id': None,
+                'provisional_id': provisional_id,
+                'queued': True
+            })
+
+        submission_id, created = await adb.save_submission(
+            data['user_id'], data['type'], answers, corporate_role, idempotency_key
+        )
+        if created:
+            await asyncio.to_thread(submissions.index_submission, sync_db, submission_id, answers)
+
+        return jsonify({
+            'success': True,
+            'message': f'Successfully saved submission for user {data["user_id"]}',
+            'submission_id': submission_id,
+            'duplicate': not created
+        })
+
+    except Exception as e:
+        print(f"Error saving batch responses: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+def _with_session(body: dict, user_id: str, password_hash: str | None) -> dict:
+    """`body` plus a fresh session (access and refresh token) when sessions are enabled"""
+    session = session_tokens.issue_session(user_id, password_hash)
+    if session:
+        body['session'] = session
+    return body
+
+
+@app.route('/api/signup', methods=['POST', 'OPTIONS'])
+async def signup():
+    if request.method == 'OPTIONS':
+        return ('', 204)
+
+    try:
+        data = await request.get_json()
+        if not data:
+            return jsonify({'error': 'Invalid JSON'}), 400
+
+        user_id = data.get('user_id')
+        username = data.get('username')
+        password = data.get('password')
+        email = accounts.normalize_email(data.get('email'))
+        phone = accounts.normalize_phone(data.get('phone_number'))
+
+        if not user_id or not username or not password:
+            return jsonify({'error': 'Missing required fields: user_id, username, password'}), 400
+        if not email and not phone:
+            return jsonify({'error': 'Provide at least one of email or phone_number'}), 400
+
+        limited = await _rate_limited_response(email, phone)
+        if limited:
+            return limited
+
+        pwd_hash, salt, iterations = await _timed_hashing(password_hashing.hasher.hash_password, password)
+
+        # Creates the account, or replaces the one already linked to this user_id
+        await adb.upsert_user(accounts.account_row(user_id, username, email, phone, pwd_hash, salt, iterations))
+
+        return jsonify(_with_session({'success': True}, user_id, pwd_hash))
+    except password_hashing.HashingSaturated:
+        return _hashing_saturated_response()
+    except Exception as e:
+        print(f"Error in signup: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/login', methods=['POST', 'OPTIONS'])
+async def login():
+    if request.method == 'OPTIONS':
+        return ('', 204)
+
+    try:
+        data = await request.get_json()
+        if not data:
+            return jsonify({'error': 'Invalid JSON'}), 400
+
+        email = accounts.normalize_email(data.get('email'))
+        phone = accounts.normalize_phone(data.get('phone_number'))
+        password = data.get('password')
+
+        if (not email and not phone) or not password:
+            return jsonify({'error': 'Provide email or phone_number and password'}), 400
+
+        limited = await _rate_limited_response(email, phone)
+        if limited:
+            return limited
+
+        user = await adb.find_user(accounts.LOGIN_COLUMNS, **accounts.login_lookup(email, phone))
+
+        if not user:
+            return jsonify({'error': 'Invalid credentials'}), 401
+
+        stored_iterations = user.get('password_iterations')
+        if not await _timed_hashing(password_hashing.hasher.verify_password, password,
+                                    user.get('password_salt', ''), user.get('password_hash', ''),
+                                    stored_iterations):
+            return jsonify({'error': 'Invalid credentials'}), 401
+
+        password_hash = user.get('password_hash')
+        if password_hashing.hasher.needs_rehash(stored_iterations):
+            try:
+                pwd_hash, salt, iterations = await _timed_hashing(password_hashing.hasher.hash_password, password)
+                await adb.update_user(user.get('user_id'), {
+                    'password_hash': pwd_hash,
+                    'password_salt': salt,
+                    'password_iterations': iterations,
+                })
+                password_hash = pwd_hash
+            except Exception as e:
+                print(f"Error rehashing password: {e}")
+
+        return jsonify(_with_session({
+            'success': True,
+            'user': {
+                'user_id': user.get('user_id'),
+                'username': user.get('username'),
+                'email': user.get('email'),
+                'phone_number': user.get('phone_number'),
+            }
+        }, user.get('user_id'), password_hash))
+    except password_hashing.HashingSaturated:
+        return _hashing_saturated_response()
+    except Exception as e:
+        print(f"Error in login: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/token/refresh', methods=['POST', 'OPTIONS'])
+async def refresh_session():
+    """
+    Exchange a refresh token for a new session (access and refresh token).
+    Expects JSON: {"refresh_token": "..."}
+    """
+    if request.method == 'OPTIONS':
+        return ('', 204)
+    if not session_tokens.ENABLED:
+        return jsonify({'error': 'Sessions are not enabled'}), 404
+
+    try:
+        data = await request.get_json()
+        if not data:
+            return jsonify({'error': 'Invalid JSON'}), 400
+
+        try:
+            claims = session_tokens.verify(data.get('refresh_token'), session_tokens.REFRESH)
+            # The only read: a changed password revokes the account's refresh tokens
+            user = await adb.find_user(session_tokens.REFRESH_COLUMNS, user_id=claims['sub'])
+            session = session_tokens.refreshed_session(claims, user)
+        except session_tokens.InvalidToken as e:
+            return jsonify({'error': str(e)}), 401
+
+        return jsonify({'success': True, 'session': session})
+    except Exception as e:
+        print(f"Error refreshing session: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/user-responses/<user_id>', methods=['GET'])
+async def get_user_responses(user_id):
+    try:
+        # A bearer token is checked by signature alone, without a database read
+        denied = session_tokens.authorize_user(request.headers.get('Authorization'), user_id)
+        if denied:
+            return jsonify({'error': denied[0]}), denied[1]
+
+        if request.args.get('exists') == '1':
+            response = jsonify({
+                'user_id': user_id,
+                'exists': await adb.submission_exists(user_id)
+            })
+            response.headers['Cache-Control'] = user_responses.CACHE_CONTROL
+            return response
+
+        summary = request.args.get('summary') == '1'
+        try:
+            limit, cursor = (None, None) if summary else user_responses.parse_page_args(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        variant = 'summary' if summary else f'submissions:{limit}:{cursor}'
+
+        conditional = 'If-None-Match' in request.headers or 'If-Modified-Since' in request.headers
+        paged = limit is not None or cursor is not None
+        if summary:
+            load = user_responses.submission_summary_async(adb, user_id)
+        else:
+            load = user_responses.fetch_submissions_async(adb, user_id, limit, cursor)
+
+        version = None
+        if conditional:
+            # Revalidation is answered from the one-row version query before any answers are read
+            version = await adb.get_submission_version(user_id)
+            etag, last_modified = user_responses.validators(user_id, variant, version)
+            if http_cache.is_fresh(etag, last_modified, request.headers):
+                load.close()
+                return http_cache.not_modified(etag, last_modified, user_responses.CACHE_CONTROL,
+                                               response_class=Response)
+            loaded = await load
+        elif paged:
+            # A page needs the version for its validators; neither query waits for the other
+            version, loaded = await asyncio.gather(adb.get_submission_version(user_id), load)
+        else:
+            loaded = await load
+
+        if summary:
+            body, rows_version = loaded
+            body = {'user_id': user_id, **body}
+        else:
+            results, next_cursor, rows_version = loaded
+            body = {
+                'user_id': user_id,
+                'submissions': results
+            }
+            if limit is not None:
+                body['next_cursor'] = next_cursor
+
+        etag, last_modified = user_responses.validators(user_id, variant, rows_version or version)
+        return http_cache.set_validators(jsonify(body), etag, last_modified, user_responses.CACHE_CONTROL)
+
+    except Exception as e:
+        print(f"Error getting user responses: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/drafts/<user_id>', methods=['GET', 'PATCH'])
+async def user_draft(user_id):
+    try:
+        denied = session_tokens.authorize_user(request.headers.get('Authorization'), user_id)
+        if denied:
+            return jsonify({'error': denied[0]}), denied[1]
+
+        if request.method == 'GET':
+            draft = await adb.get_draft(user_id)
+            if draft is None:
+                return jsonify({'error': 'No draft'}), 404
+            etag, last_modified = drafts.validators(draft)
+            if http_cache.is_fresh(etag, last_modified, request.headers):
+                return http_cache.not_modified(etag, last_modified, drafts.CACHE_CONTROL,
+                                               response_class=Response)
+            return http_cache.set_validators(jsonify(drafts.draft_body(draft)), etag, last_modified,
+                                             drafts.CACHE_CONTROL)
+
+        data = await request.get_json()
+        if not data:
+            return jsonify({'error': 'Invalid JSON'}), 400
+        try:
+            answers = answer_validation.validate_draft_patch({**data, 'user_id': user_id})
+        except answer_validation.ValidationError as e:
+            return jsonify({'error': 'Invalid draft', 'details': e.errors}), 400
+
+        # Rapid patches from one user are merged into a single write
+        version, applied = await asyncio.to_thread(
+            drafts.get_writer(sync_db).patch,
+            user_id, data['version'], data['type'], data.get('corporate_role'), answers
+        )
+        if not applied:
+            return jsonify({'error': 'Draft has a newer version; fetch it and patch on top', 'version': version}), 409
+        return jsonify({'success': True, 'user_id': user_id, 'version': version})
+
+    except Exception as e:
+        print(f"Error saving draft: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/drafts/<user_id>/submit', methods=['POST'])
+async def submit_draft(user_id):
+    try:
+        denied = session_tokens.authorize_user(request.headers.get('Authorization'), user_id)
+        if denied:
+            return jsonify({'error': denied[0]}), denied[1]
+
+        data = await request.get_json(silent=True) or {}
+        version = data.get('version')
+        if version is not None and type(version) is not int:
+            return jsonify({'error': 'version must be an integer'}), 400
+        idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+        if idempotency_key is not None and (
+            not isinstance(idempotency_key, str) or len(idempotency_key) > submissions.MAX_IDEMPOTENCY_KEY_LENGTH
+        ):
+            return jsonify({'error': f'idempotency_key must be a string of at most {submissions.MAX_IDEMPOTENCY_KEY_LENGTH} characters'}), 400
+
+        # The draft becomes a submission and is deleted in one transaction
+        result = await adb.promote_draft(user_id, version, idempotency_key)
+        if 'status' in result:
+            error, status = drafts.PROMOTE_ERRORS[result['status']]
+            return jsonify({'error': error, 'version': result.get('version')}), status
+        if result['created']:
+            await asyncio.to_thread(submissions.index_stored_submission, sync_db, result['submission_id'])
+
+        return jsonify({
+            'success': True,
+            'message': f'Successfully saved submission for user {user_id}',
+            'submission_id': result['submission_id'],
+            'duplicate': not result['created']
+        })
+
+    except Exception as e:
+        print(f"Error submitting draft: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/question-stats/<int:unique_question_id>', methods=['GET'])
+async def get_question_stats(unique_question_id):
+    try:
+        return jsonify(await question_stats.get_question_stats_async(adb, unique_question_id))
+    except Exception as e:
+        print(f"Error getting question stats: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+_wsgi = AsyncioWSGIMiddleware(wsgi_app)
+_routes = app.url_map.bind('')
+
+
+def _is_async_route(scope) -> bool:
+    try:
+        _routes.match(scope['path'], method=scope['method'])
+    except RequestRedirect:
+        return True
+    except (NotFound, MethodNotAllowed):
+        return False
+    return True
+
+
+async def application(scope, receive, send):
+    """The ASGI entry point: async routes in Quart, the rest in the WSGI app."""
+    if scope['type'] == 'http' and not _is_async_route(scope):
+        await _wsgi(scope, receive, send)
+    else:
+        await app(scope, receive, send)
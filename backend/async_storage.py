@@ -0,0 +1,198 @@
+"""
+Async counterparts of the storage backends, for the ASGI app (asgi.py).
+
+AsyncSupabaseStorage mirrors the SupabaseStorage methods the async routes
+use, on postgrest's AsyncPostgrestClient. One client, and so one pooled
+HTTP/2 connection set, is shared by every request in the process; queries
+that don't depend on each other are sent concurrently. Any other backend
+(SQLite) is wrapped in ThreadedStorage, which runs each call in a worker
+thread so it never blocks the event loop.
+"""
+import asyncio
+import os
+from datetime import datetime, timezone
+
+from storage import DRAFT_COLUMNS, STORAGE_BACKEND, SUBMISSION_COLUMNS
+
+MAX_CONNECTIONS = int(os.getenv('CHON_ASYNC_MAX_CONNECTIONS', '100'))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('CHON_ASYNC_MAX_KEEPALIVE_CONNECTIONS', '20'))
+
+
+class AsyncSupabaseStorage:
+    def __init__(self, url: str | None, key: str | None):
+        self._url = url
+        self._key = key
+        self._client = None
+
+    @property
+    def client(self):
+        # Created on first use, inside the event loop its connections belong to
+        if self._client is None:
+            self._client = self._create_client()
+        return self._client
+
+    def _create_client(self):
+        if not (self._url and self._key):
+            raise RuntimeError('Supabase credentials not found')
+        import httpx
+        from postgrest import AsyncPostgrestClient
+
+        class PooledClient(AsyncPostgrestClient):
+            def create_session(self, base_url, headers, timeout, verify=True, proxy=None):
+                return httpx.AsyncClient(
+                    base_url=base_url, headers=headers, timeout=timeout, verify=verify, proxy=proxy,
+                    follow_redirects=True, http2=True,
+                    limits=httpx.Limits(max_connections=MAX_CONNECTIONS,
+                                        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS),
+                )
+
+        return PooledClient(f"{self._url.rstrip('/')}/rest/v1", headers={
+            'apikey': self._key,
+            'Authorization': f'Bearer {self._key}',
+        })
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # intro_choices
+
+    async def upsert_intro_choices(self, rows: list[dict]):
+        await self.client.table('intro_choices').upsert(rows, on_conflict='user_id').execute()
+
+    async def get_intro_counts(self) -> tuple[dict, str | None]:
+        response = await self.client.table('intro_choice_counts').select('choice, count, updated_at').execute()
+        rows = response.data or []
+        return {row['choice']: row['count'] for row in rows}, max((row['updated_at'] for row in rows), default=None)
+
+    # questionnaire_submissions / question_answers
+
+    async def save_submission(self, user_id: str, questionnaire_type: str, answers: list[dict],
+                              corporate_role: str | None = None, idempotency_key: str | None = None):
+        response = await self.client.rpc('submit_questionnaire', {
+            'p_user_id': user_id,
+            'p_questionnaire_type': questionnaire_type,
+            'p_answers': answers,
+            'p_corporate_role': corporate_role,
+            'p_idempotency_key': idempotency_key
+        }).execute()
+        result = response.data
+        return result['submission_id'], result['created']
+
+    async def list_submissions(self, user_id: str, limit: int | None = None,
+                               after_id: int | None = None) -> list[dict]:
+        query = self.client.table('questionnaire_submissions').select(
+            f'{SUBMISSION_COLUMNS}, answers:question_answers(*)'
+        ).eq('user_id', user_id).order('id')
+        if after_id is not None:
+            query = query.gt('id', after_id)
+        if limit is not None:
+            query = query.limit(limit)
+        return (await query.execute()).data or []
+
+    async def submission_exists(self, user_id: str) -> bool:
+        response = await self.client.table('questionnaire_submissions').select(
+            'id'
+        ).eq('user_id', user_id).limit(1).execute()
+        return bool(response.data)
+
+    async def get_submission_version(self, user_id: str) -> tuple[int, int | None, str | None]:
+        response = await self.client.table('questionnaire_submissions').select(
+            'id, updated_at', count='exact'
+        ).eq('user_id', user_id).order('updated_at', desc=True).order('id', desc=True).limit(1).execute()
+        latest = response.data[0] if response.data else {}
+        return response.count or 0, latest.get('id'), latest.get('updated_at')
+
+    async def list_submission_answer_counts(self, user_id: str) -> list[dict]:
+        response = await self.client.table('questionnaire_submissions').select(
+            f'{SUBMISSION_COLUMNS}, question_answers(count)'
+        ).eq('user_id', user_id).order('id').execute()
+        rows = response.data or []
+        for row in rows:
+            embedded = row.pop('question_answers', None) or [{'count': 0}]
+            row['answer_count'] = embedded[0].get('count', 0)
+        return rows
+
+    # questionnaire_drafts
+
+    async def get_draft(self, user_id: str) -> dict | None:
+        rows = (await self.client.table('questionnaire_drafts').select(
+            DRAFT_COLUMNS
+        ).eq('user_id', user_id).limit(1).execute()).data or []
+        return rows[0] if rows else None
+
+    async def promote_draft(self, user_id: str, version: int | None = None,
+                            idempotency_key: str | None = None) -> dict:
+        response = await self.client.rpc('submit_draft', {
+            'p_user_id': user_id,
+            'p_version': version,
+            'p_idempotency_key': idempotency_key
+        }).execute()
+        return response.data
+
+    # users
+
+    async def find_user(self, columns: str = '*', **match) -> dict | None:
+        query = self.client.table('users').select(columns)
+        for column, value in match.items():
+            query = query.eq(column, value)
+        rows = (await query.limit(1).execute()).data or []
+        return rows[0] if rows else None
+
+    async def upsert_user(self, row: dict):
+        from postgrest.types import ReturnMethod
+        await self.client.table('users').upsert(
+            {**row, 'updated_at': datetime.now(timezone.utc).isoformat()},
+            on_conflict='user_id', returning=ReturnMethod.minimal
+        ).execute()
+
+    async def update_user(self, user_id: str, fields: dict):
+        await self.client.table('users').update(fields).eq('user_id', user_id).execute()
+
+    # question stats
+
+    async def get_question_stats(self, unique_question_id: int):
+        # Two independent reads, one round trip of latency
+        respondents, options = await asyncio.gather(
+            self.client.table('question_respondent_counts').select(
+                'respondents'
+            ).eq('unique_question_id', unique_question_id).execute(),
+            self.client.table('question_option_counts').select(
+                'option_value, count'
+            ).eq('unique_question_id', unique_question_id).execute(),
+        )
+        respondents, options = respondents.data or [], options.data or []
+        return (
+            respondents[0]['respondents'] if respondents else 0,
+            {row['option_value']: row['count'] for row in options}
+        )
+
+
+class ThreadedStorage:
+    """Any synchronous storage, each call run in a worker thread (asyncio.to_thread)."""
+
+    def __init__(self, inner):
+        self.sync = inner
+
+    def __getattr__(self, name):
+        attr = getattr(self.sync, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(attr, *args, **kwargs)
+        return call
+
+    async def aclose(self):
+        pass
+
+
+def create_async_storage(sync_db, backend: str = STORAGE_BACKEND):
+    """
+    The async storage for `backend`. Backends without a native async client
+    reuse `sync_db`, so both apps in the process see the same (e.g. in-memory) data.
+    """
+    if backend == 'supabase':
+        return AsyncSupabaseStorage(os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_KEY'))
+    return ThreadedStorage(sync_db)
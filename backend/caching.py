@@ -0,0 +1,98 @@
+from collections import OrderedDict
+import threading
+import time
+
+
+class TTLCache:
+    """
+    Small thread-safe in-process cache whose entries expire after `ttl` seconds.
+    Used to keep hot, cheap-to-be-stale reads (e.g. intro stats) off the database.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for `key`, calling `loader()` to fill it on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    async def aget_or_load(self, key, loader):
+        """get_or_load() for a coroutine function `loader` (the async serving mode)."""
+        value = self.get(key)
+        if value is None:
+            value = await loader()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+class LRUCache:
+    """
+    Small thread-safe in-process cache bounded to `maxsize` entries; the least
+    recently used entry is evicted first. For values that never go stale
+    (e.g. scores of an immutable submission) but must not grow without bound.
+    `on_evict(key, value)`, if given, is called (under the lock) for each eviction.
+    """
+
+    def __init__(self, maxsize: int, on_evict=None):
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                evicted = self._entries.popitem(last=False)
+                if self.on_evict is not None:
+                    self.on_evict(*evicted)
+
+    def get_or_load(self, key, loader):
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
@@ -0,0 +1,155 @@
+"""
+Question catalog served from database/output.json.
+
+The catalog is loaded once per process (on first use, to keep cold starts
+cheap) and split into per-questionnaire, per-language slices. Each slice is
+serialized once and precompressed (gzip, plus brotli when the `brotli`
+package is installed), with a strong ETag per encoding, so a request is a
+dictionary lookup and revalidation is a header comparison.
+
+Submissions are checked and scored against load_client_catalog() instead:
+the frontend's own catalog, whose question ids are the ones submissions
+carry (output.json numbers questions per questionnaire).
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+from flask import Response, jsonify, request
+
+import http_cache
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+CATALOG_PATH = os.getenv(
+    'CHON_CATALOG_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'database', 'output.json')
+)
+# The frontend's catalog (global question ids), which submissions are checked and scored against;
+# see database/generate_client_catalog.py
+CLIENT_CATALOG_PATH = os.getenv(
+    'CHON_CLIENT_CATALOG_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'database', 'client_catalog.json')
+)
+CATALOG_MAX_AGE = int(os.getenv('CHON_CATALOG_MAX_AGE_SECONDS', '300'))
+
+LANGUAGES = ('en', 'zh', 'all')
+
+_catalog = None
+_client_catalog = None
+_slices = None
+_load_lock = threading.RLock()
+
+
+def load_catalog() -> dict:
+    """The raw catalog: {questionnaire_type: {"type", "totalQuestions", "questions", ...}}."""
+    global _catalog
+    if _catalog is None:
+        with _load_lock:
+            if _catalog is None:
+                with open(CATALOG_PATH, 'r', encoding='utf-8') as f:
+                    _catalog = json.load(f)
+    return _catalog
+
+
+def load_client_catalog() -> dict:
+    """
+    {"questions": [{"id", "type", "options", "tags", ...}], "menus": {questionnaire_type: [question ids]}}.
+    Question ids are the ones submissions carry, unique across questionnaire types.
+    """
+    global _client_catalog
+    if _client_catalog is None:
+        with _load_lock:
+            if _client_catalog is None:
+                with open(CLIENT_CATALOG_PATH, 'r', encoding='utf-8') as f:
+                    _client_catalog = json.load(f)
+    return _client_catalog
+
+
+def _localize(value, language: str):
+    """Drop the other language's fields (textZh/minZh/... for 'en', *En for 'zh')."""
+    if language == 'all':
+        return value
+    drop_suffix = 'Zh' if language == 'en' else 'En'
+    if isinstance(value, dict):
+        return {k: _localize(v, language) for k, v in value.items() if not k.endswith(drop_suffix)}
+    if isinstance(value, list):
+        return [_localize(v, language) for v in value]
+    return value
+
+
+class CatalogSlice:
+    """One serialized representation of a questionnaire in one language, in every encoding."""
+
+    def __init__(self, data):
+        self.body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        digest = hashlib.sha256(self.body).hexdigest()[:32]
+        # Strong validators must differ per content-coding
+        self.encodings = {'identity': (self.body, f'"{digest}"')}
+        self.encodings['gzip'] = (gzip.compress(self.body, compresslevel=9, mtime=0), f'"{digest}-gzip"')
+        if brotli is not None:
+            self.encodings['br'] = (brotli.compress(self.body, quality=11), f'"{digest}-br"')
+        self.etags = {etag for _, etag in self.encodings.values()}
+
+
+def _build_slices() -> dict:
+    slices = {}
+    for questionnaire_type, questionnaire in load_catalog().items():
+        for language in LANGUAGES:
+            slices[(questionnaire_type, language)] = CatalogSlice(_localize(questionnaire, language))
+    return slices
+
+
+def get_slice(questionnaire_type: str, language: str) -> CatalogSlice | None:
+    global _slices
+    if _slices is None:
+        with _load_lock:
+            if _slices is None:
+                _slices = _build_slices()
+    return _slices.get((questionnaire_type, language))
+
+
+def serve_questions(questionnaire_type: str):
+    language = request.args.get('lang', 'all')
+    if language not in LANGUAGES:
+        return jsonify({'error': f"Invalid lang. Must be one of: {', '.join(LANGUAGES)}"}), 400
+
+    catalog_slice = get_slice(questionnaire_type, language)
+    if catalog_slice is None:
+        return jsonify({'error': f'Unknown questionnaire type: {questionnaire_type}'}), 404
+
+    accepted = http_cache.accepted_encodings()
+    encoding = next((e for e in ('br', 'gzip') if e in accepted and e in catalog_slice.encodings), 'identity')
+    body, etag = catalog_slice.encodings[encoding]
+
+    # Any encoding of the same slice is the same content, so any of its tags revalidates
+    requested_tags = http_cache.if_none_match()
+    if '*' in requested_tags or requested_tags & catalog_slice.etags:
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = f'public, max-age={CATALOG_MAX_AGE}, must-revalidate'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def serve_index():
+    """Questionnaire types with their question counts and per-language ETags."""
+    catalog = load_catalog()
+    return jsonify({
+        questionnaire_type: {
+            'totalQuestions': questionnaire.get('totalQuestions', len(questionnaire.get('questions', []))),
+            'etags': {language: get_slice(questionnaire_type, language).encodings['identity'][1]
+                      for language in LANGUAGES}
+        }
+        for questionnaire_type, questionnaire in catalog.items()
+    })
@@ -0,0 +1,173 @@
+"""
+Server-side drafts of in-progress questionnaires (autosave).
+
+The client sends deltas: the answers that changed since its last patch, and
+a version it increments with every patch. A patch is applied only when its
+version is newer than the stored one, so retried or reordered requests are
+no-ops and a second device editing from a stale copy gets a 409 and rebases
+(GET, then patch on top). Submitting promotes the stored draft to a
+submission in the database, so the answers are not uploaded again.
+
+Patches for the same user that arrive while that user's previous write is
+still in flight, or within CHON_DRAFT_COALESCE_MS of each other, are merged
+and written once (group commit). Only patches with versions increasing in
+arrival order are merged, and the merge applies only if the stored draft is
+older than its first patch, so each request gets the answer it would have
+had alone: a stale patch is never written and gets its 409. Every request
+still returns only after its delta is stored.
+"""
+import os
+import threading
+import time
+
+import http_cache
+
+COALESCE_MS = int(os.getenv('CHON_DRAFT_COALESCE_MS', '50'))
+
+# Per-user data: browsers may keep it, but must revalidate (cheaply, via ETag) on every use
+CACHE_CONTROL = 'private, no-cache'
+
+
+class _Batch:
+    def __init__(self):
+        self.patches = []
+        self.results = []
+        self.done = threading.Event()
+        self.error = None
+
+    def add(self, patch: tuple) -> int:
+        self.patches.append(patch)
+        self.results.append(None)
+        return len(self.patches) - 1
+
+    def chain(self) -> list[int]:
+        """
+        Indexes of the patches to write, in arrival order: each one newer than
+        the one before it. The others (a retry, or a device patching from a
+        stale copy) are not newer than a patch already taken, so they are
+        answered as not applied, as if written after it.
+        """
+        taken = []
+        for i, (version, _, _, _) in enumerate(self.patches):
+            if not taken or version > self.patches[taken[-1]][0]:
+                taken.append(i)
+        return taken
+
+    def merged(self, chain: list[int]) -> tuple:
+        """(version, questionnaire_type, corporate_role, answers) of the chained patches, one questionnaire type."""
+        corporate_role, answers = None, {}
+        for i in chain:
+            version, questionnaire_type, patch_role, patch_answers = self.patches[i]
+            corporate_role = patch_role if patch_role is not None else corporate_role
+            answers.update(patch_answers)
+        return version, questionnaire_type, corporate_role, answers
+
+
+class _Slot:
+    def __init__(self):
+        self.collecting = None
+        self.write_lock = threading.Lock()
+        self.requests = 0
+
+
+class DraftWriter:
+    def __init__(self, db, coalesce_ms: int = COALESCE_MS):
+        self.db = db
+        self.linger = coalesce_ms / 1000
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def patch(self, user_id: str, version: int, questionnaire_type: str, corporate_role: str | None,
+              answers: dict) -> tuple[int, bool]:
+        """Store a delta; returns (stored version, applied) of the write that carried it."""
+        with self._lock:
+            slot = self._slots.get(user_id)
+            if slot is None:
+                slot = self._slots[user_id] = _Slot()
+            slot.requests += 1
+            batch = slot.collecting
+            leader = batch is None
+            if leader:
+                batch = slot.collecting = _Batch()
+            index = batch.add((version, questionnaire_type, corporate_role, answers))
+        try:
+            if leader:
+                self._write(user_id, slot, batch)
+            else:
+                batch.done.wait()
+        finally:
+            with self._lock:
+                slot.requests -= 1
+                if not slot.requests:
+                    del self._slots[user_id]
+        if batch.error is not None:
+            raise batch.error
+        return batch.results[index]
+
+    def _write(self, user_id: str, slot: _Slot, batch: _Batch):
+        with slot.write_lock:
+            # Patches arriving during the previous write or the linger join this batch
+            if self.linger:
+                time.sleep(self.linger)
+            with self._lock:
+                slot.collecting = None
+            try:
+                self._write_chain(user_id, batch)
+            except Exception as e:
+                batch.error = e
+            finally:
+                batch.done.set()
+
+    def _write_chain(self, user_id: str, batch: _Batch):
+        chain = batch.chain()
+        result = None
+        if len(chain) > 1 and len({batch.patches[i][1] for i in chain}) == 1:
+            # One write, applied only if the stored draft is older than the first patch
+            result = self.db.patch_draft(user_id, *batch.merged(chain), first_version=batch.patches[chain[0]][0])
+            for i in chain:
+                batch.results[i] = result
+        if result is None or not result[1]:
+            # A single patch, a change of questionnaire type, or a merge the stored
+            # draft is too new for: write them one by one, as if they came in apart
+            for i in chain:
+                result = batch.results[i] = self.db.patch_draft(user_id, *batch.patches[i])
+        for i, patch_result in enumerate(batch.results):
+            if patch_result is None:
+                batch.results[i] = (result[0], False)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer(db) -> DraftWriter:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = DraftWriter(db)
+    return _writer
+
+
+def draft_body(draft: dict) -> dict:
+    return {
+        'user_id': draft['user_id'],
+        'type': draft['questionnaire_type'],
+        'corporate_role': draft['corporate_role'],
+        'answers': draft['answers'],
+        'version': draft['version'],
+        'updated_at': draft['updated_at'],
+    }
+
+
+def validators(draft: dict):
+    """(ETag, Last-Modified) of a draft; every applied patch bumps its version."""
+    return http_cache.make_etag('draft', draft['user_id'], draft['version'], draft['updated_at']), \
+        http_cache.parse_timestamp(draft['updated_at'])
+
+
+PROMOTE_ERRORS = {
+    'not_found': ('No draft to submit', 404),
+    'conflict': ('Draft has changed; fetch it and submit its current version', 409),
+    'empty': ('Draft has no answers', 400),
+}
@@ -0,0 +1,128 @@
+"""
+Bulk export of every submission with its answers, for the research team.
+
+The response is a generator: submissions are read one keyset page at a
+time (id > last id seen), serialized, optionally gzip-compressed and
+flushed to the client before the next page is fetched, so memory stays flat
+however many submissions there are. `updated_since` limits the export to
+submissions created or changed since a previous pull, and the
+X-Export-Started-At header is the value to pass next time
+(database/export_submissions.py does this for nightly syncs).
+
+Requires `Authorization: Bearer $CHON_EXPORT_TOKEN`; without the token
+configured the endpoint is disabled.
+"""
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import datetime, timezone
+
+from flask import Response, jsonify, request
+
+import http_cache
+import session_tokens
+from storage import EXPORT_COLUMNS
+
+EXPORT_TOKEN = os.getenv('CHON_EXPORT_TOKEN')
+PAGE_SIZE = int(os.getenv('CHON_EXPORT_PAGE_SIZE', '500'))
+
+FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+CSV_COLUMNS = ('submission_id', 'user_id', 'questionnaire_type', 'corporate_role', 'created_at', 'updated_at',
+               'question_id', 'response_value')
+
+
+def iter_submissions(db, after_id: int | None = None, updated_since: datetime | None = None,
+                     questionnaire_type: str | None = None):
+    """Pages of submissions (answers embedded) in id order, fetched as they are consumed."""
+    while True:
+        page = db.scan_submissions(after_id=after_id, limit=PAGE_SIZE, questionnaire_type=questionnaire_type,
+                                   updated_since=updated_since, columns=EXPORT_COLUMNS)
+        if not page:
+            return
+        yield page
+        if len(page) < PAGE_SIZE:
+            return
+        after_id = page[-1]['id']
+
+
+def ndjson_page(page: list[dict]) -> str:
+    return ''.join(
+        json.dumps({
+            **{column: submission.get(column) for column in ('id', 'user_id', 'questionnaire_type',
+                                                             'corporate_role', 'created_at', 'updated_at')},
+            'answers': [{'question_id': a['question_id'], 'response_value': a['response_value']}
+                        for a in submission.get('answers') or ()],
+        }, ensure_ascii=False) + '\n'
+        for submission in page
+    )
+
+
+def csv_page(page: list[dict]) -> str:
+    """One row per answer, submission columns repeated."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for submission in page:
+        head = [submission['id'], submission.get('user_id'), submission.get('questionnaire_type'),
+                submission.get('corporate_role'), submission.get('created_at'), submission.get('updated_at')]
+        for answer in submission.get('answers') or ():
+            writer.writerow([*head, answer['question_id'], answer['response_value']])
+    return buffer.getvalue()
+
+
+def stream(db, export_format: str, compress: bool, **filters):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # wbits 31: gzip container
+
+    def encode(text: str) -> bytes:
+        data = text.encode('utf-8')
+        return compressor.compress(data) if compressor is not None else data
+
+    serialize = ndjson_page if export_format == 'ndjson' else csv_page
+    if export_format == 'csv':
+        yield encode(','.join(CSV_COLUMNS) + '\r\n')
+    for page in iter_submissions(db, **filters):
+        chunk = encode(serialize(page))
+        if chunk:
+            yield chunk
+    if compressor is not None:
+        yield compressor.flush()
+
+
+def parse_updated_since(value: str | None) -> datetime | None:
+    """ISO 8601 timestamp; naive values are taken as UTC. Raises ValueError."""
+    if not value:
+        return None
+    since = datetime.fromisoformat(value)
+    return since if since.tzinfo is not None else since.replace(tzinfo=timezone.utc)
+
+
+def serve_export(db):
+    if not EXPORT_TOKEN:
+        return jsonify({'error': 'Export is not enabled'}), 404
+    if not session_tokens.bearer_matches(request.headers.get('Authorization'), EXPORT_TOKEN):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in FORMATS:
+        return jsonify({'error': f"Invalid format. Must be one of: {', '.join(FORMATS)}"}), 400
+    try:
+        updated_since = parse_updated_since(request.args.get('updated_since'))
+        after_id = int(request.args['after_id']) if request.args.get('after_id') else None
+    except ValueError:
+        return jsonify({'error': 'updated_since must be an ISO 8601 timestamp and after_id an integer'}), 400
+
+    started_at = datetime.now(timezone.utc)
+    compress = 'gzip' in http_cache.accepted_encodings()
+    response = Response(
+        stream(db, export_format, compress, after_id=after_id,
+               updated_since=updated_since, questionnaire_type=request.args.get('type')),
+        mimetype=FORMATS[export_format]
+    )
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Content-Disposition'] = f'attachment; filename="submissions.{export_format}"'
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Export-Started-At'] = started_at.isoformat()
+    response.vary.add('Accept-Encoding')
+    return response
@@ -0,0 +1,117 @@
+"""
+HTTP validators, conditional requests and response compression.
+
+Read endpoints derive an ETag (and Last-Modified, from the rows' updated_at)
+from a cheap version of the data they serve, so a client holding a current
+copy gets a 304 before the body is loaded or serialized. Large JSON/text
+responses are gzip-compressed on the way out when the client accepts it;
+strong ETags get an encoding suffix so each representation has its own.
+"""
+import gzip
+import hashlib
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from flask import Response, request
+
+COMPRESS_MIN_BYTES = int(os.getenv('CHON_COMPRESS_MIN_BYTES', '1024'))
+COMPRESS_LEVEL = 6
+
+_COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+
+def accepted_encodings(headers=None) -> set:
+    headers = request.headers if headers is None else headers
+    accepted = set()
+    for item in headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = item.strip().partition(';')
+        if coding and params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.lower())
+    return accepted
+
+
+def if_none_match(headers=None) -> set:
+    header = (request.headers if headers is None else headers).get('If-None-Match', '')
+    if header.strip() == '*':
+        return {'*'}
+    return {tag.strip().removeprefix('W/') for tag in header.split(',') if tag.strip()}
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha256('|'.join(map(str, parts)).encode('utf-8')).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def parse_timestamp(value) -> datetime | None:
+    """A database timestamp (ISO 8601, or SQLite's 'YYYY-MM-DD HH:MM:SS' UTC) as an aware datetime."""
+    if not value:
+        return None
+    parsed = value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+
+def is_fresh(etag: str, last_modified: datetime | None = None, headers=None) -> bool:
+    """
+    Whether the client's copy is current: If-None-Match, else If-Modified-Since (RFC 9110 13.2.2).
+    `headers` defaults to the current Flask request's.
+    """
+    headers = request.headers if headers is None else headers
+    requested = if_none_match(headers)
+    if requested:
+        return '*' in requested or bool(requested & {etag, _encoded_etag(etag, 'gzip')})
+    since = headers.get('If-Modified-Since')
+    if since and last_modified is not None:
+        try:
+            return last_modified.replace(microsecond=0) <= parsedate_to_datetime(since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def set_validators(response: Response, etag: str, last_modified: datetime | None, cache_control: str) -> Response:
+    response.headers['ETag'] = etag
+    if last_modified is not None:
+        response.headers['Last-Modified'] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    response.headers['Cache-Control'] = cache_control
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def not_modified(etag: str, last_modified: datetime | None, cache_control: str,
+                 response_class=Response) -> Response:
+    return set_validators(response_class(status=304), etag, last_modified, cache_control)
+
+
+def _encoded_etag(etag: str, coding: str) -> str:
+    return f'{etag[:-1]}-{coding}"'
+
+
+def should_compress(response, headers=None) -> bool:
+    """Whether `response` is a candidate for gzip (the body size is checked separately)."""
+    return (response.status_code == 200 and 'Content-Encoding' not in response.headers
+            and (response.mimetype or '').startswith(_COMPRESSIBLE_TYPES)
+            and 'gzip' in accepted_encodings(headers))
+
+
+def gzip_response(response, body: bytes):
+    """Replace the body of a response (Flask or Quart) with its gzip encoding, if it is large enough."""
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+    response.set_data(gzip.compress(body, compresslevel=COMPRESS_LEVEL, mtime=0))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        response.headers['ETag'] = _encoded_etag(etag, 'gzip')
+    return response
+
+
+def _compress_response(response: Response) -> Response:
+    if response.direct_passthrough or response.is_streamed or not should_compress(response):
+        return response
+    return gzip_response(response, response.get_data())
+
+
+def init_app(app):
+    app.after_request(_compress_response)
@@ -0,0 +1,70 @@
+import os
+
+from flask import jsonify
+
+import http_cache
+from caching import TTLCache
+
+# Stats are read on every intro page visit; a few seconds of staleness is fine
+INTRO_STATS_TTL_SECONDS = float(os.getenv('CHON_INTRO_STATS_TTL_SECONDS', '5'))
+
+_stats_cache = TTLCache(INTRO_STATS_TTL_SECONDS)
+
+# Shared by every visitor; clients and CDNs may reuse it for as long as we cache it ourselves
+CACHE_CONTROL = f'public, max-age={int(INTRO_STATS_TTL_SECONDS)}, stale-while-revalidate=30'
+
+
+def build_intro_stats(yes_count: int, no_count: int) -> dict:
+    """Shape the yes/no totals the way the intro page expects them."""
+    total = yes_count + no_count
+    yes_percentage = round((yes_count / total) * 100) if total > 0 else 50
+    return {
+        'yes_count': yes_count,
+        'no_count': no_count,
+        'total': total,
+        'yes_percentage': yes_percentage
+    }
+
+
+def _load_intro_counts(db) -> dict:
+    """
+    Read the running yes/no totals. They are maintained on every write to
+    `intro_choices` (see migrations/02_intro_choice_counts.sql), so this is a
+    constant-size read no matter how many users have answered.
+    Returns {"stats", "etag", "last_modified"}.
+    """
+    return _entry(*db.get_intro_counts())
+
+
+async def _load_intro_counts_async(db) -> dict:
+    return _entry(*await db.get_intro_counts())
+
+
+def _entry(counts: dict, updated_at) -> dict:
+    stats = build_intro_stats(counts.get('yes', 0), counts.get('no', 0))
+    return {
+        'stats': stats,
+        'etag': http_cache.make_etag('intro-stats', stats['yes_count'], stats['no_count']),
+        'last_modified': http_cache.parse_timestamp(updated_at),
+    }
+
+
+def _cached(db) -> dict:
+    return _stats_cache.get_or_load('intro_stats', lambda: _load_intro_counts(db))
+
+
+async def cached_entry_async(db) -> dict:
+    """{"stats", "etag", "last_modified"} through the same cache, for async storage."""
+    return await _stats_cache.aget_or_load('intro_stats', lambda: _load_intro_counts_async(db))
+
+
+def get_intro_stats(db) -> dict:
+    return _cached(db)['stats']
+
+
+def serve_intro_stats(db):
+    """The stats as a JSON response with validators; 304 when the client's copy is current."""
+    entry = _cached(db)
+    if http_cache.is_fresh(entry['etag'], entry['last_modified']):
+        return http_cache.not_modified(entry['etag'], entry['last_modified'], CACHE_CONTROL)
+    return http_cache.set_validators(jsonify(entry['stats']), entry['etag'], entry['last_modified'], CACHE_CONTROL)
@@ -0,0 +1,90 @@
+import atexit
+import os
+import threading
+
+import outbox
+
+# Write-behind is opt-in: it only makes sense on long-lived servers (gunicorn),
+# not on serverless functions that may be frozen before the buffer flushes
+WRITE_BEHIND = os.getenv('CHON_INTRO_WRITE_BEHIND') == '1'
+FLUSH_INTERVAL_MS = int(os.getenv('CHON_INTRO_FLUSH_INTERVAL_MS', '200'))
+FLUSH_MAX_ROWS = int(os.getenv('CHON_INTRO_FLUSH_MAX_ROWS', '500'))
+
+
+class IntroChoiceBuffer:
+    """
+    Buffers intro choices in-process and flushes them as one multi-row upsert
+    every `interval_ms` or as soon as `max_rows` distinct users are pending.
+    Repeated choices from the same user coalesce to the latest one.
+    """
+
+    def __init__(self, flush_rows, interval_ms: int = FLUSH_INTERVAL_MS, max_rows: int = FLUSH_MAX_ROWS):
+        self._flush_rows = flush_rows
+        self.interval = interval_ms / 1000
+        self.max_rows = max_rows
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def add(self, user_id: str, choice: str):
+        with self._lock:
+            self._pending[user_id] = choice
+            full = len(self._pending) >= self.max_rows
+            if self._thread is None:
+                # Started on first use so it lives in the forked worker, not the master
+                self._thread = threading.Thread(target=self._run, name='intro-choice-flusher', daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return
+            try:
+                self._flush_rows([{'user_id': user_id, 'choice': choice} for user_id, choice in batch.items()])
+            except Exception as e:
+                print(f"Error flushing intro choices: {e}")
+                with self._lock:
+                    # Requeue, but never overwrite a newer choice that arrived meanwhile
+                    for user_id, choice in batch.items():
+                        self._pending.setdefault(user_id, choice)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer(db) -> IntroChoiceBuffer:
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = IntroChoiceBuffer(db.upsert_intro_choices)
+                atexit.register(_buffer.flush)
+    return _buffer
+
+
+def save_intro_choice(db, user_id: str, choice: str) -> bool:
+    """
+    Persist a choice with a single INSERT ... ON CONFLICT (user_id) DO UPDATE.
+    Returns True when it was queued (outbox or write-behind) instead of written.
+    """
+    if outbox.ENABLED:
+        outbox.get_outbox(db).add_intro_choice(user_id, choice)
+        return True
+    if WRITE_BEHIND:
+        get_buffer(db).add(user_id, choice)
+        return True
+    db.upsert_intro_choices([{'user_id': user_id, 'choice': choice}])
+    return False
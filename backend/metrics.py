@@ -0,0 +1,242 @@
+"""
+Per-request latency instrumentation.
+
+For every request we record wall time, time spent in storage (Supabase) calls,
+time spent hashing passwords and request/response sizes, labelled by route.
+Each response gets a `Server-Timing` header, and `/api/metrics` exposes the
+in-process histograms in the Prometheus text format to requests carrying
+`Authorization: Bearer $CHON_METRICS_TOKEN` (without the token configured
+it answers 404). Serverless instances each keep their own numbers, so
+scrape/aggregate accordingly.
+"""
+import bisect
+import os
+import threading
+import time
+
+from flask import Response, g, has_request_context, request
+
+import session_tokens
+
+# Bearer token required to read /api/metrics; without it the endpoint is disabled
+METRICS_TOKEN = os.getenv('CHON_METRICS_TOKEN')
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+class Histogram:
+    """Fixed-bucket histogram with one series per label tuple; updates are O(log buckets)."""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # per-bucket counts (+Inf last), sum, count
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+        for labels, (counts, total, count) in sorted(snapshot.items()):
+            label_text = ','.join(f'{name}="{label_value}"' for name, label_value in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {count}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            snapshot = dict(self._values)
+        for labels, value in sorted(snapshot.items()):
+            label_text = ','.join(f'{name}="{label_value}"' for name, label_value in zip(self.label_names, labels))
+            lines.append(f'{self.name}{{{label_text}}} {value}')
+        return lines
+
+
+class Gauge:
+    """Current values, set directly or read from registered callbacks when scraped."""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def set(self, labels: tuple, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+    def set_function(self, callback):
+        """`callback()` returns {labels: value}; it runs on every scrape, so it must be cheap."""
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} gauge']
+        with self._lock:
+            snapshot, callbacks = dict(self._values), list(self._callbacks)
+        for callback in callbacks:
+            try:
+                snapshot.update(callback())
+            except Exception as e:
+                print(f"Error collecting {self.name}: {e}")
+        for labels, value in sorted(snapshot.items()):
+            label_text = ','.join(f'{name}="{label_value}"' for name, label_value in zip(self.label_names, labels))
+            lines.append(f'{self.name}{{{label_text}}} {value}')
+        return lines
+
+
+ROUTE_LABELS = ('route', 'method')
+
+REQUEST_DURATION = Histogram('chon_request_duration_seconds', 'Wall time per request', ROUTE_LABELS, LATENCY_BUCKETS)
+STORAGE_DURATION = Histogram('chon_storage_duration_seconds', 'Time per request spent in storage (Supabase) calls',
+                             ROUTE_LABELS, LATENCY_BUCKETS)
+HASH_DURATION = Histogram('chon_password_hash_duration_seconds', 'Time per request spent hashing passwords',
+                          ROUTE_LABELS, LATENCY_BUCKETS)
+REQUEST_BYTES = Histogram('chon_request_bytes', 'Request body size', ROUTE_LABELS, SIZE_BUCKETS)
+RESPONSE_BYTES = Histogram('chon_response_bytes', 'Response body size', ROUTE_LABELS, SIZE_BUCKETS)
+REQUESTS_TOTAL = Counter('chon_requests_total', 'Requests by route and status', (*ROUTE_LABELS, 'status'))
+STORAGE_CALLS_TOTAL = Counter('chon_storage_calls_total', 'Storage (Supabase) round trips', ROUTE_LABELS)
+RATE_LIMITED_TOTAL = Counter('chon_rate_limited_total', 'Requests rejected by rate limiting', ROUTE_LABELS)
+OUTBOX_DEPTH = Gauge('chon_outbox_depth', 'Writes waiting in the local outbox', ('kind',))
+OUTBOX_LAG = Gauge('chon_outbox_lag_seconds', 'Age of the oldest write waiting in the local outbox', ('kind',))
+OUTBOX_FLUSHES_TOTAL = Counter('chon_outbox_flushes_total', 'Outbox batches sent to storage, by outcome',
+                               ('kind', 'outcome'))
+USER_CACHE_LOOKUPS = Counter('chon_user_cache_lookups_total',
+                             'Per-user read cache lookups by result (local_hit, shared_hit, miss)', ('result',))
+USER_CACHE_EVICTIONS = Counter('chon_user_cache_evictions_total', 'Users evicted from the in-process read cache',
+                               ('tier',))
+
+REGISTRY = [REQUEST_DURATION, STORAGE_DURATION, HASH_DURATION, REQUEST_BYTES, RESPONSE_BYTES,
+            REQUESTS_TOTAL, STORAGE_CALLS_TOTAL, RATE_LIMITED_TOTAL, OUTBOX_DEPTH, OUTBOX_LAG,
+            OUTBOX_FLUSHES_TOTAL, USER_CACHE_LOOKUPS, USER_CACHE_EVICTIONS]
+
+
+class InstrumentedStorage:
+    """Storage proxy that adds the time and count of each call to the current request."""
+
+    def __init__(self, inner):
+        self._inner = inner
+
+    def __getattr__(self, name):
+        attr = getattr(self._inner, name)
+        if not callable(attr):
+            return attr
+
+        def timed(*args, **kwargs):
+            if not has_request_context():
+                return attr(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                g.storage_seconds = g.get('storage_seconds', 0.0) + (time.perf_counter() - start)
+                g.storage_calls = g.get('storage_calls', 0) + 1
+        return timed
+
+
+def instrument_storage(db):
+    return InstrumentedStorage(db)
+
+
+def route_labels() -> tuple:
+    # The URL rule, not the path, keeps label cardinality bounded (no user ids)
+    rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    return rule, request.method
+
+
+def _before_request():
+    g.request_started = time.perf_counter()
+
+
+def observe_request(labels: tuple, status: int, wall: float, request_bytes: int, response_bytes: int | None,
+                    storage_seconds: float | None = None, storage_calls: int | None = None,
+                    hash_seconds: float | None = None) -> str:
+    """Record one finished request; returns its Server-Timing header value."""
+    REQUEST_DURATION.observe(labels, wall)
+    REQUESTS_TOTAL.inc((*labels, str(status)))
+    if storage_calls is not None:
+        STORAGE_DURATION.observe(labels, storage_seconds)
+        STORAGE_CALLS_TOTAL.inc(labels, storage_calls)
+    if hash_seconds is not None:
+        HASH_DURATION.observe(labels, hash_seconds)
+    REQUEST_BYTES.observe(labels, request_bytes)
+    if response_bytes is not None:
+        RESPONSE_BYTES.observe(labels, response_bytes)
+
+    timings = [f'app;dur={wall * 1000:.1f}']
+    if storage_calls is not None:
+        timings.append(f'db;dur={storage_seconds * 1000:.1f};desc="{storage_calls} calls"')
+    if hash_seconds is not None:
+        timings.append(f'pbkdf2;dur={hash_seconds * 1000:.1f}')
+    return ', '.join(timings)
+
+
+def _after_request(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+
+    response.headers['Server-Timing'] = observe_request(
+        route_labels(), response.status_code, time.perf_counter() - started,
+        request.content_length or 0,
+        None if response.is_streamed else (response.calculate_content_length() or 0),
+        g.get('storage_seconds', 0.0), g.get('storage_calls'),
+        g.hash_ms / 1000 if 'hash_ms' in g else None,
+    )
+    return response
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def _metrics_endpoint():
+    # Route names, traffic and limiter counters are not for the public: no token, no endpoint
+    if not METRICS_TOKEN:
+        return Response('Metrics are not enabled\n', status=404, mimetype='text/plain')
+    if not session_tokens.bearer_matches(request.headers.get('Authorization'), METRICS_TOKEN):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule('/api/metrics', 'metrics', _metrics_endpoint, methods=['GET'])
@@ -0,0 +1,58 @@
+-- Running yes/no totals for the intro question, so /api/intro-stats reads
+-- two rows instead of scanning every intro_choices row
+CREATE TABLE IF NOT EXISTS intro_choice_counts (
+    choice VARCHAR(10) PRIMARY KEY CHECK (choice IN ('yes', 'no')),
+    count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+ALTER TABLE intro_choice_counts ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY read_intro_choice_counts ON intro_choice_counts FOR SELECT TO public 
+    USING (true);
+
+-- Keep the totals in step with every write to intro_choices, including a user
+-- flipping from yes to no (decrement the old choice, increment the new one)
+CREATE OR REPLACE FUNCTION maintain_intro_choice_counts()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.choice IS NOT NULL THEN
+        IF TG_OP = 'DELETE' OR NEW.choice IS DISTINCT FROM OLD.choice THEN
+            UPDATE intro_choice_counts
+            SET count = count - 1, updated_at = NOW()
+            WHERE choice = OLD.choice;
+        END IF;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.choice IS NOT NULL THEN
+        IF TG_OP = 'INSERT' OR NEW.choice IS DISTINCT FROM OLD.choice THEN
+            UPDATE intro_choice_counts
+            SET count = count + 1, updated_at = NOW()
+            WHERE choice = NEW.choice;
+        END IF;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ language 'plpgsql' SECURITY DEFINER SET search_path = public;
+
+-- The trigger and the backfill run under one lock that blocks writes to
+-- intro_choices (but not reads), so no choice is counted twice or missed
+BEGIN;
+
+LOCK TABLE intro_choices IN SHARE ROW EXCLUSIVE MODE;
+
+CREATE TRIGGER maintain_intro_choice_counts_trigger
+    AFTER INSERT OR UPDATE OF choice OR DELETE ON intro_choices
+    FOR EACH ROW
+    EXECUTE PROCEDURE maintain_intro_choice_counts();
+
+-- Seed both rows and backfill from the existing choices
+INSERT INTO intro_choice_counts (choice, count)
+SELECT c.choice, COUNT(ic.user_id)
+FROM (VALUES ('yes'), ('no')) AS c(choice)
+LEFT JOIN intro_choices ic ON ic.choice = c.choice
+GROUP BY c.choice
+ON CONFLICT (choice) DO UPDATE SET count = EXCLUDED.count, updated_at = NOW();
+
+COMMIT;
@@ -0,0 +1,5 @@
+-- Store the PBKDF2 iteration count with each password hash so the count can be
+-- raised (CHON_PBKDF2_ITERATIONS) and old hashes upgraded on the next login.
+-- Existing hashes were all created with 100,000 iterations.
+ALTER TABLE IF EXISTS users
+    ADD COLUMN IF NOT EXISTS password_iterations INTEGER NOT NULL DEFAULT 100000;
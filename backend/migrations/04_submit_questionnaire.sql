@@ -0,0 +1,46 @@
+-- Columns written by /api/batch-question-responses
+ALTER TABLE questionnaire_submissions
+    ADD COLUMN IF NOT EXISTS corporate_role VARCHAR(50);
+
+ALTER TABLE questionnaire_submissions
+    ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(100);
+
+-- One submission per (user, client-supplied key); rows without a key are unaffected
+CREATE UNIQUE INDEX IF NOT EXISTS idx_questionnaire_submissions_idempotency
+ON questionnaire_submissions(user_id, idempotency_key);
+
+-- Insert a submission and all of its answers in one transaction / one round trip.
+-- p_answers is a JSON array of {"question_id": 1, "response_value": "A"}.
+-- When p_idempotency_key was already used by this user, nothing is written and
+-- the original submission id is returned with "created": false.
+CREATE OR REPLACE FUNCTION submit_questionnaire(
+    p_user_id VARCHAR,
+    p_questionnaire_type VARCHAR,
+    p_answers JSONB,
+    p_corporate_role VARCHAR DEFAULT NULL,
+    p_idempotency_key VARCHAR DEFAULT NULL
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_submission_id INTEGER;
+BEGIN
+    INSERT INTO questionnaire_submissions (user_id, questionnaire_type, corporate_role, idempotency_key)
+    VALUES (p_user_id, p_questionnaire_type, p_corporate_role, p_idempotency_key)
+    ON CONFLICT (user_id, idempotency_key) DO NOTHING
+    RETURNING id INTO v_submission_id;
+
+    IF v_submission_id IS NULL THEN
+        SELECT id INTO v_submission_id
+        FROM questionnaire_submissions
+        WHERE user_id = p_user_id AND idempotency_key = p_idempotency_key;
+
+        RETURN jsonb_build_object('submission_id', v_submission_id, 'created', false);
+    END IF;
+
+    INSERT INTO question_answers (submission_id, question_id, response_value)
+    SELECT v_submission_id, (answer->>'question_id')::INTEGER, answer->>'response_value'
+    FROM jsonb_array_elements(COALESCE(p_answers, '[]'::JSONB)) AS answer;
+
+    RETURN jsonb_build_object('submission_id', v_submission_id, 'created', true);
+END;
+$$ language 'plpgsql';
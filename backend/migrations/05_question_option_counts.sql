@@ -0,0 +1,157 @@
+-- Maps (questionnaire_type, question_id) to the question's id across all four
+-- questionnaires (loaded by database/bulk_load.py). question_id is the
+-- frontend's global id from questions.ts, the one stored answers carry, and
+-- every type maps every question (database/generate_mapping.py). question_type
+-- tells the stats below which answers are options rather than free text.
+CREATE TABLE IF NOT EXISTS question_identity_mapping (
+    questionnaire_type VARCHAR(20) NOT NULL,
+    question_id INTEGER NOT NULL,
+    unique_question_id INTEGER NOT NULL,
+    question_type VARCHAR(20)
+);
+
+ALTER TABLE question_identity_mapping
+    ADD COLUMN IF NOT EXISTS question_type VARCHAR(20);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_question_identity_mapping_key
+ON question_identity_mapping(questionnaire_type, question_id);
+
+CREATE INDEX IF NOT EXISTS idx_question_identity_mapping_unique_id
+ON question_identity_mapping(unique_question_id);
+
+-- Running answer distributions per unique question, maintained by
+-- submit_questionnaire so /api/question-stats never scans question_answers
+CREATE TABLE IF NOT EXISTS question_option_counts (
+    unique_question_id INTEGER NOT NULL,
+    option_value VARCHAR(50) NOT NULL,
+    count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (unique_question_id, option_value)
+);
+
+-- Number of submissions that answered each question (the percentage base;
+-- multi-select answers count once here but once per option above)
+CREATE TABLE IF NOT EXISTS question_respondent_counts (
+    unique_question_id INTEGER PRIMARY KEY,
+    respondents BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+ALTER TABLE question_identity_mapping ENABLE ROW LEVEL SECURITY;
+ALTER TABLE question_option_counts ENABLE ROW LEVEL SECURITY;
+ALTER TABLE question_respondent_counts ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY read_question_identity_mapping ON question_identity_mapping FOR SELECT TO public 
+    USING (true);
+
+CREATE POLICY read_question_option_counts ON question_option_counts FOR SELECT TO public 
+    USING (true);
+
+CREATE POLICY read_question_respondent_counts ON question_respondent_counts FOR SELECT TO public 
+    USING (true);
+
+-- The option(s) an answer selected: multi-select answers are stored as a JSON array
+CREATE OR REPLACE FUNCTION answer_options(p_response_value TEXT)
+RETURNS SETOF TEXT AS $$
+    SELECT DISTINCT option_value
+    FROM jsonb_array_elements_text(
+        CASE WHEN left(p_response_value, 1) = '[' THEN p_response_value::JSONB
+             ELSE jsonb_build_array(p_response_value) END
+    ) AS option_value
+    WHERE option_value <> '';
+$$ language 'sql' IMMUTABLE;
+
+-- Add one submission's choice answers to the running distributions
+CREATE OR REPLACE FUNCTION add_question_option_counts(p_submission_id INTEGER, p_questionnaire_type VARCHAR)
+RETURNS VOID AS $$
+    WITH options AS (
+        SELECT m.unique_question_id, o.option_value
+        FROM question_answers qa
+        JOIN question_identity_mapping m
+            ON m.questionnaire_type = p_questionnaire_type AND m.question_id = qa.question_id
+        CROSS JOIN LATERAL answer_options(qa.response_value) AS o(option_value)
+        WHERE qa.submission_id = p_submission_id
+          AND m.question_type IN ('multiple-choice', 'multi-select', 'scale-question')
+    ),
+    option_totals AS (
+        INSERT INTO question_option_counts AS c (unique_question_id, option_value, count)
+        SELECT unique_question_id, option_value, COUNT(*)
+        FROM options
+        GROUP BY unique_question_id, option_value
+        ON CONFLICT (unique_question_id, option_value)
+        DO UPDATE SET count = c.count + EXCLUDED.count, updated_at = NOW()
+    )
+    INSERT INTO question_respondent_counts AS r (unique_question_id, respondents)
+    SELECT DISTINCT unique_question_id, 1
+    FROM options
+    ON CONFLICT (unique_question_id)
+    DO UPDATE SET respondents = r.respondents + 1, updated_at = NOW();
+$$ language 'sql';
+
+-- Same as 04_submit_questionnaire.sql, plus the distribution update in the
+-- same transaction
+CREATE OR REPLACE FUNCTION submit_questionnaire(
+    p_user_id VARCHAR,
+    p_questionnaire_type VARCHAR,
+    p_answers JSONB,
+    p_corporate_role VARCHAR DEFAULT NULL,
+    p_idempotency_key VARCHAR DEFAULT NULL
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_submission_id INTEGER;
+BEGIN
+    INSERT INTO questionnaire_submissions (user_id, questionnaire_type, corporate_role, idempotency_key)
+    VALUES (p_user_id, p_questionnaire_type, p_corporate_role, p_idempotency_key)
+    ON CONFLICT (user_id, idempotency_key) DO NOTHING
+    RETURNING id INTO v_submission_id;
+
+    IF v_submission_id IS NULL THEN
+        SELECT id INTO v_submission_id
+        FROM questionnaire_submissions
+        WHERE user_id = p_user_id AND idempotency_key = p_idempotency_key;
+
+        RETURN jsonb_build_object('submission_id', v_submission_id, 'created', false);
+    END IF;
+
+    INSERT INTO question_answers (submission_id, question_id, response_value)
+    SELECT v_submission_id, (answer->>'question_id')::INTEGER, answer->>'response_value'
+    FROM jsonb_array_elements(COALESCE(p_answers, '[]'::JSONB)) AS answer;
+
+    PERFORM add_question_option_counts(v_submission_id, p_questionnaire_type);
+
+    RETURN jsonb_build_object('submission_id', v_submission_id, 'created', true);
+END;
+$$ language 'plpgsql';
+
+-- Recount the distributions from every stored answer. Run after loading a
+-- new mapping (database/bulk_load.py question-mapping does), since counts
+-- are kept per unique question and the old ones may be keyed differently.
+CREATE OR REPLACE FUNCTION rebuild_question_option_counts()
+RETURNS VOID AS $$
+    DELETE FROM question_option_counts;
+    DELETE FROM question_respondent_counts;
+
+    INSERT INTO question_option_counts (unique_question_id, option_value, count)
+    SELECT m.unique_question_id, o.option_value, COUNT(*)
+    FROM question_answers qa
+    JOIN questionnaire_submissions s ON s.id = qa.submission_id
+    JOIN question_identity_mapping m
+        ON m.questionnaire_type = s.questionnaire_type AND m.question_id = qa.question_id
+    CROSS JOIN LATERAL answer_options(qa.response_value) AS o(option_value)
+    WHERE m.question_type IN ('multiple-choice', 'multi-select', 'scale-question')
+    GROUP BY m.unique_question_id, o.option_value;
+
+    INSERT INTO question_respondent_counts (unique_question_id, respondents)
+    SELECT m.unique_question_id, COUNT(DISTINCT qa.submission_id)
+    FROM question_answers qa
+    JOIN questionnaire_submissions s ON s.id = qa.submission_id
+    JOIN question_identity_mapping m
+        ON m.questionnaire_type = s.questionnaire_type AND m.question_id = qa.question_id
+    WHERE m.question_type IN ('multiple-choice', 'multi-select', 'scale-question')
+      AND EXISTS (SELECT 1 FROM answer_options(qa.response_value))
+    GROUP BY m.unique_question_id;
+$$ language 'sql';
+
+-- Backfill from the answers stored so far
+SELECT rebuild_question_option_counts();
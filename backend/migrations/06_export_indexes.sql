@@ -0,0 +1,4 @@
+-- Incremental exports (/api/export/submissions?updated_since=...) read only
+-- the submissions changed since the last pull, walking them in id order.
+CREATE INDEX IF NOT EXISTS idx_questionnaire_submissions_updated_at
+ON questionnaire_submissions(updated_at, id);
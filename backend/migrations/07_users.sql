@@ -0,0 +1,42 @@
+-- Accounts for /api/signup and /api/login. The table predates migrations/ on
+-- existing projects; this declares it for new ones and adds what the lookups need.
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    user_id VARCHAR(100) NOT NULL,
+    username VARCHAR(100),
+    email VARCHAR(255),
+    phone_number VARCHAR(50),
+    password_hash TEXT,
+    password_salt TEXT,
+    password_iterations INTEGER NOT NULL DEFAULT 100000,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Only the API (service key) reads or writes accounts: with no policies, the
+-- public anon key sees no rows, password hashes and salts included
+ALTER TABLE users ENABLE ROW LEVEL SECURITY;
+
+-- Signup used to update every row with the user's user_id, so duplicates
+-- carry the same account; keep the newest before making user_id unique
+DELETE FROM users older
+USING users newer
+WHERE older.user_id = newer.user_id AND older.id < newer.id;
+
+-- Conflict target of the signup upsert (INSERT ... ON CONFLICT (user_id) DO UPDATE)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_user_id
+ON users(user_id);
+
+-- Emails are stored lowercased and trimmed, phone numbers as '+' and digits
+-- only (see accounts.py), so login is an equality match on an index
+UPDATE users SET
+    email = NULLIF(lower(btrim(email)), ''),
+    phone_number = NULLIF(regexp_replace(phone_number, '[^0-9+]', '', 'g'), '')
+WHERE email IS DISTINCT FROM NULLIF(lower(btrim(email)), '')
+   OR phone_number IS DISTINCT FROM NULLIF(regexp_replace(phone_number, '[^0-9+]', '', 'g'), '');
+
+CREATE INDEX IF NOT EXISTS idx_users_email
+ON users(email) WHERE email IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_users_phone_number
+ON users(phone_number) WHERE phone_number IS NOT NULL;
@@ -0,0 +1,25 @@
+-- Several submissions in one transaction / one round trip, for the outbox
+-- flusher (outbox.py). p_submissions is a JSON array of
+-- {"user_id", "questionnaire_type", "answers", "corporate_role", "idempotency_key"};
+-- the result is the submit_questionnaire() result of each, in the same order.
+CREATE OR REPLACE FUNCTION submit_questionnaires(p_submissions JSONB)
+RETURNS JSONB AS $$
+DECLARE
+    v_submission JSONB;
+    v_results JSONB := '[]'::JSONB;
+BEGIN
+    FOR v_submission IN
+        SELECT value FROM jsonb_array_elements(COALESCE(p_submissions, '[]'::JSONB))
+    LOOP
+        v_results := v_results || jsonb_build_array(submit_questionnaire(
+            (v_submission->>'user_id')::VARCHAR,
+            (v_submission->>'questionnaire_type')::VARCHAR,
+            v_submission->'answers',
+            (v_submission->>'corporate_role')::VARCHAR,
+            (v_submission->>'idempotency_key')::VARCHAR
+        ));
+    END LOOP;
+
+    RETURN v_results;
+END;
+$$ language 'plpgsql';
@@ -0,0 +1,115 @@
+-- In-progress questionnaires saved by /api/drafts/<user_id> (one draft per
+-- user). answers maps question ids to response values, e.g. {"1": "A", "7": "4"}.
+-- Drafts are kept apart from questionnaire_submissions so stats, exports and
+-- reads of submitted answers never see half-finished ones.
+CREATE TABLE IF NOT EXISTS questionnaire_drafts (
+    id SERIAL PRIMARY KEY,
+    user_id VARCHAR(100) NOT NULL,
+    questionnaire_type VARCHAR(50) NOT NULL,
+    corporate_role VARCHAR(50),
+    answers JSONB NOT NULL DEFAULT '{}',
+    version INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_questionnaire_drafts_user_id
+ON questionnaire_drafts(user_id);
+
+-- Only the API (service key) reads or writes drafts
+ALTER TABLE questionnaire_drafts ENABLE ROW LEVEL SECURITY;
+
+-- Apply a delta to a user's draft in one round trip. p_answers maps question
+-- ids to their new value, or to null to clear them. The patch is applied
+-- only when p_version is newer than the stored version, so retried or
+-- reordered patches are no-ops; switching questionnaire type starts over.
+-- p_first_version, for several patches merged into one (versions
+-- p_first_version < ... < p_version), requires the stored version to be older
+-- than the first of them, so a merge never carries a stale patch.
+-- Returns {"version": <stored version>, "applied": true|false}.
+CREATE OR REPLACE FUNCTION patch_draft(
+    p_user_id VARCHAR,
+    p_version INTEGER,
+    p_questionnaire_type VARCHAR,
+    p_corporate_role VARCHAR,
+    p_answers JSONB,
+    p_first_version INTEGER DEFAULT NULL
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_version INTEGER;
+BEGIN
+    INSERT INTO questionnaire_drafts AS draft (user_id, questionnaire_type, corporate_role, answers, version)
+    VALUES (p_user_id, p_questionnaire_type, p_corporate_role, jsonb_strip_nulls(p_answers), p_version)
+    ON CONFLICT (user_id) DO UPDATE SET
+        answers = CASE
+            WHEN draft.questionnaire_type = excluded.questionnaire_type
+            THEN jsonb_strip_nulls(draft.answers || p_answers)
+            ELSE excluded.answers
+        END,
+        questionnaire_type = excluded.questionnaire_type,
+        corporate_role = COALESCE(excluded.corporate_role, draft.corporate_role),
+        version = excluded.version,
+        updated_at = NOW()
+    WHERE draft.version < excluded.version AND draft.version < COALESCE(p_first_version, excluded.version)
+    RETURNING version INTO v_version;
+
+    IF v_version IS NULL THEN
+        SELECT version INTO v_version FROM questionnaire_drafts WHERE user_id = p_user_id;
+        RETURN jsonb_build_object('version', v_version, 'applied', false);
+    END IF;
+
+    RETURN jsonb_build_object('version', v_version, 'applied', true);
+END;
+$$ language 'plpgsql';
+
+-- Turn a user's draft into a submission (submit_questionnaire) and delete it,
+-- in one transaction, without the client sending the answers again.
+-- p_version, when given, must be the draft's current version. Returns the
+-- submit_questionnaire() result, or {"status": "not_found" | "conflict" | "empty"}.
+-- A retry after success finds no draft but the submission under
+-- p_idempotency_key, and returns it with "created": false.
+CREATE OR REPLACE FUNCTION submit_draft(
+    p_user_id VARCHAR,
+    p_version INTEGER DEFAULT NULL,
+    p_idempotency_key VARCHAR DEFAULT NULL
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_draft questionnaire_drafts%ROWTYPE;
+    v_submission_id INTEGER;
+BEGIN
+    SELECT * INTO v_draft FROM questionnaire_drafts WHERE user_id = p_user_id FOR UPDATE;
+
+    IF NOT FOUND THEN
+        SELECT id INTO v_submission_id
+        FROM questionnaire_submissions
+        WHERE user_id = p_user_id AND idempotency_key = p_idempotency_key;
+
+        IF v_submission_id IS NOT NULL THEN
+            RETURN jsonb_build_object('submission_id', v_submission_id, 'created', false);
+        END IF;
+        RETURN jsonb_build_object('status', 'not_found');
+    END IF;
+
+    IF p_version IS NOT NULL AND v_draft.version <> p_version THEN
+        RETURN jsonb_build_object('status', 'conflict', 'version', v_draft.version);
+    END IF;
+
+    IF v_draft.answers = '{}'::JSONB THEN
+        RETURN jsonb_build_object('status', 'empty', 'version', v_draft.version);
+    END IF;
+
+    DELETE FROM questionnaire_drafts WHERE id = v_draft.id;
+
+    RETURN submit_questionnaire(
+        p_user_id,
+        v_draft.questionnaire_type,
+        (SELECT jsonb_agg(jsonb_build_object('question_id', key::INTEGER, 'response_value', value)
+                          ORDER BY key::INTEGER)
+         FROM jsonb_each_text(v_draft.answers)),
+        v_draft.corporate_role,
+        p_idempotency_key
+    );
+END;
+$$ language 'plpgsql';
@@ -0,0 +1,249 @@
+"""
+Durable local outbox for the write endpoints (intro choices, submissions).
+
+With CHON_OUTBOX_PATH set, a write is appended to a SQLite spool in WAL mode
+(fsynced before the request is acknowledged) and answered right away, with
+a provisional id in place of the database id. A background thread drains
+the spool to storage: intro choices as one multi-row upsert, submissions
+through one `submit_questionnaires` call per batch. Failed batches back off
+exponentially and stay spooled, so a slow or unavailable Supabase delays
+writes instead of failing them. Rows that keep failing are retried one at
+a time, so a single bad row cannot hold back the rest.
+
+Workers on one host may share the spool: a flusher leases the rows it sends,
+and rows from a crashed worker are picked up again once their lease ends.
+Sends are idempotent (upserts; submissions carry an idempotency key), so a
+row sent twice is stored once. Spooled writes are not visible to reads until
+they are drained. Not for serverless functions, whose disk and threads do
+not outlive the request.
+"""
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+import metrics
+import submissions
+
+OUTBOX_PATH = os.getenv('CHON_OUTBOX_PATH')
+ENABLED = bool(OUTBOX_PATH)
+FLUSH_INTERVAL_MS = int(os.getenv('CHON_OUTBOX_FLUSH_INTERVAL_MS', '200'))
+BATCH_SIZE = int(os.getenv('CHON_OUTBOX_BATCH_SIZE', '100'))
+MAX_BACKOFF_SECONDS = float(os.getenv('CHON_OUTBOX_MAX_BACKOFF_SECONDS', '60'))
+# How long a flusher may hold rows before another worker may send them
+LEASE_SECONDS = 60
+# Rows that failed this many times in a batch are sent on their own
+ISOLATE_AFTER_ATTEMPTS = 3
+
+INTRO_CHOICE = 'intro_choice'
+SUBMISSION = 'submission'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    dedupe_key TEXT,
+    payload TEXT NOT NULL,
+    created REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_outbox_dedupe ON outbox(kind, dedupe_key);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(next_attempt, id);
+"""
+
+
+def _backoff(attempts: int) -> float:
+    # Full jitter keeps workers that failed together from retrying together
+    return random.uniform(0.5, 1.0) * min(MAX_BACKOFF_SECONDS, 0.5 * 2 ** attempts)
+
+
+class Outbox:
+    def __init__(self, path: str, db, interval_ms: int = FLUSH_INTERVAL_MS, batch_size: int = BATCH_SIZE):
+        self.path = path
+        self.db = db
+        self.interval = interval_ms / 1000
+        self.batch_size = batch_size
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            # An acknowledged write must survive power loss, not only a crash
+            self._conn.execute('PRAGMA synchronous=FULL')
+            self._conn.executescript(_SCHEMA)
+
+    def append(self, kind: str, payload: dict, dedupe_key: str | None = None) -> int:
+        """
+        Spool a write; returns its outbox id. A pending write of the same kind
+        and dedupe_key is replaced (it is superseded), and the new one is
+        queued behind anything already being sent.
+        """
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                if dedupe_key is not None:
+                    self._conn.execute('DELETE FROM outbox WHERE kind = ? AND dedupe_key = ?', (kind, dedupe_key))
+                outbox_id = self._conn.execute(
+                    'INSERT INTO outbox (kind, dedupe_key, payload, created) VALUES (?, ?, ?, ?) RETURNING id',
+                    (kind, dedupe_key, json.dumps(payload, separators=(',', ':')), time.time())
+                ).fetchone()[0]
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+        return outbox_id
+
+    def add_intro_choice(self, user_id: str, choice: str) -> int:
+        return self.append(INTRO_CHOICE, {'user_id': user_id, 'choice': choice}, dedupe_key=user_id)
+
+    def add_submission(self, user_id: str, questionnaire_type: str, answers: list[dict],
+                       corporate_role: str | None = None, idempotency_key: str | None = None) -> str:
+        """
+        Spool a submission; returns its provisional id, the idempotency key it
+        is saved with (generated when the client sent none). Retrying with it
+        as the Idempotency-Key never creates a second submission.
+        """
+        idempotency_key = idempotency_key or f'outbox-{uuid.uuid4().hex}'
+        self.append(SUBMISSION, {
+            'user_id': user_id,
+            'questionnaire_type': questionnaire_type,
+            'answers': answers,
+            'corporate_role': corporate_role,
+            'idempotency_key': idempotency_key,
+        }, dedupe_key=f'{user_id}:{idempotency_key}')
+        return idempotency_key
+
+    # draining
+
+    def _claim(self, now: float) -> list[tuple]:
+        """Lease up to batch_size due rows, oldest first."""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self._conn.execute(
+                    'SELECT id, kind, payload, attempts FROM outbox WHERE next_attempt <= ? ORDER BY id LIMIT ?',
+                    (now, self.batch_size)
+                ).fetchall()
+                self._conn.executemany('UPDATE outbox SET next_attempt = ? WHERE id = ?',
+                                       [(now + LEASE_SECONDS, row[0]) for row in rows])
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+        return rows
+
+    def _done(self, ids: list[int]):
+        with self._lock:
+            self._conn.executemany('DELETE FROM outbox WHERE id = ?', [(outbox_id,) for outbox_id in ids])
+
+    def _failed(self, rows: list[tuple], error: str):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                'UPDATE outbox SET attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?',
+                [(attempts + 1, now + _backoff(attempts), error[:500], outbox_id)
+                 for outbox_id, _, _, attempts in rows]
+            )
+
+    def _send(self, kind: str, payloads: list[dict]):
+        if kind == INTRO_CHOICE:
+            self.db.upsert_intro_choices(payloads)
+        elif kind == SUBMISSION:
+            results = self.db.save_submissions(payloads)
+            for payload, (submission_id, created) in zip(payloads, results):
+                if created:
+                    submissions.index_submission(self.db, submission_id, payload['answers'])
+        else:
+            raise ValueError(f'Unknown outbox kind: {kind}')
+
+    def flush(self) -> int:
+        """Send one batch of due rows; returns how many rows were claimed."""
+        with self._flush_lock:
+            rows = self._claim(time.time())
+            batches = {}
+            for row in rows:
+                _, kind, _, attempts = row
+                if attempts >= ISOLATE_AFTER_ATTEMPTS:
+                    batches[(kind, row[0])] = [row]
+                else:
+                    batches.setdefault((kind, None), []).append(row)
+            for (kind, _), batch in batches.items():
+                try:
+                    self._send(kind, [json.loads(payload) for _, _, payload, _ in batch])
+                except Exception as e:
+                    print(f"Error flushing {len(batch)} outbox {kind} rows: {e}")
+                    metrics.OUTBOX_FLUSHES_TOTAL.inc((kind, 'error'))
+                    self._failed(batch, str(e))
+                else:
+                    metrics.OUTBOX_FLUSHES_TOTAL.inc((kind, 'ok'))
+                    self._done([row[0] for row in batch])
+            return len(rows)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                # A full batch means a backlog: keep going without waiting
+                while self.flush() >= self.batch_size:
+                    pass
+            except Exception as e:
+                print(f"Error draining outbox: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='outbox-flusher', daemon=True)
+            self._thread.start()
+
+    # metrics
+
+    def stats(self) -> dict:
+        """{kind: (pending rows, age in seconds of the oldest)}."""
+        with self._lock:
+            rows = self._conn.execute('SELECT kind, COUNT(*), MIN(created) FROM outbox GROUP BY kind').fetchall()
+        now = time.time()
+        return {kind: (count, now - oldest) for kind, count, oldest in rows}
+
+    def _depth(self) -> dict:
+        stats = self.stats()
+        return {(kind,): stats.get(kind, (0, 0.0))[0] for kind in (INTRO_CHOICE, SUBMISSION)}
+
+    def _lag(self) -> dict:
+        stats = self.stats()
+        return {(kind,): round(stats.get(kind, (0, 0.0))[1], 3) for kind in (INTRO_CHOICE, SUBMISSION)}
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox(db) -> Outbox:
+    """The process's outbox, draining into `db`; created, and its flusher started, on first use."""
+    global _outbox
+    if _outbox is None:
+        with _outbox_lock:
+            if _outbox is None:
+                outbox = Outbox(OUTBOX_PATH, db)
+                outbox.start()
+                metrics.OUTBOX_DEPTH.set_function(lambda: _outbox._depth())
+                metrics.OUTBOX_LAG.set_function(lambda: _outbox._lag())
+                _outbox = outbox
+    return _outbox
+
+
+def _reopen_after_fork():
+    # Neither the SQLite connection nor the flusher thread survive fork(); a
+    # preloaded server's workers each get their own, and drain what's left
+    global _outbox, _outbox_lock
+    _outbox_lock = threading.Lock()
+    if _outbox is not None:
+        _outbox = Outbox(_outbox.path, _outbox.db)
+        _outbox.start()
+
+
+os.register_at_fork(after_in_child=_reopen_after_fork)
@@ -0,0 +1,107 @@
+import binascii
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+# Iteration count used by every hash created before it became configurable
+LEGACY_ITERATIONS = 100_000
+
+PBKDF2_ITERATIONS = int(os.getenv('CHON_PBKDF2_ITERATIONS', str(LEGACY_ITERATIONS)))
+# 0 hashes inline in the request thread (still bounded by the queue)
+HASH_WORKERS = int(os.getenv('CHON_HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
+HASH_QUEUE_SIZE = int(os.getenv('CHON_HASH_QUEUE_SIZE', str(max(HASH_WORKERS, 1) * 4)))
+HASH_TIMEOUT_SECONDS = float(os.getenv('CHON_HASH_TIMEOUT_SECONDS', '10'))
+
+
+class HashingSaturated(Exception):
+    """
+    Raised when every hashing slot is taken, or a hash didn't finish within
+    the timeout; callers should answer 503 right away.
+    """
+
+
+def _pbkdf2(password: str, salt_bytes: bytes, iterations: int) -> bytes:
+    # Module-level so it can be pickled into pool workers
+    return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt_bytes, iterations)
+
+
+class PasswordHasher:
+    """
+    Runs PBKDF2 off the request thread in a process pool.
+    At most `queue_size` hashes may be running or waiting at once; beyond that
+    `HashingSaturated` is raised instead of queueing, so a login burst cannot
+    starve cheap endpoints served by the same workers.
+    """
+
+    def __init__(self, workers: int = HASH_WORKERS, queue_size: int = HASH_QUEUE_SIZE,
+                 timeout: float = HASH_TIMEOUT_SECONDS, iterations: int = PBKDF2_ITERATIONS):
+        self.workers = workers
+        self.timeout = timeout
+        self.iterations = iterations
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        # Created lazily so gunicorn workers fork before the pool exists
+        if self._pool is None and self.workers > 0:
+            with self._pool_lock:
+                if self._pool is None:
+                    try:
+                        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                    except (OSError, NotImplementedError) as e:
+                        # e.g. serverless sandboxes without /dev/shm for semaphores
+                        print(f"Warning: hashing pool unavailable, hashing inline: {e}")
+                        self.workers = 0
+        return self._pool
+
+    def _derive(self, password: str, salt_bytes: bytes, iterations: int) -> bytes:
+        if not self._slots.acquire(blocking=False):
+            raise HashingSaturated('Password hashing queue is full')
+        try:
+            pool = self._get_pool()
+            future = pool.submit(_pbkdf2, password, salt_bytes, iterations) if pool is not None else None
+        except BaseException:
+            self._slots.release()
+            raise
+        if future is None:
+            try:
+                return _pbkdf2(password, salt_bytes, iterations)
+            finally:
+                self._slots.release()
+        # The slot is held until the hash finishes, not until we stop waiting for it,
+        # so timed-out hashes still count against the queue while they occupy the pool
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise HashingSaturated(f'Password hashing took longer than {self.timeout}s')
+
+    def hash_password(self, password: str, salt: str | None = None, iterations: int | None = None):
+        """Return (hash_hex, salt_hex, iterations) using PBKDF2-HMAC-SHA256."""
+        iterations = iterations or self.iterations
+        salt_bytes = os.urandom(16) if salt is None else binascii.unhexlify(salt)
+        hash_bytes = self._derive(password, salt_bytes, iterations)
+        return (
+            binascii.hexlify(hash_bytes).decode('utf-8'),
+            binascii.hexlify(salt_bytes).decode('utf-8'),
+            iterations
+        )
+
+    def verify_password(self, password: str, salt_hex: str, expected_hash_hex: str,
+                        iterations: int | None = None) -> bool:
+        try:
+            calc_hash_hex, _, _ = self.hash_password(password, salt_hex, iterations or LEGACY_ITERATIONS)
+        except HashingSaturated:
+            raise
+        except Exception:
+            return False
+        return hmac.compare_digest(calc_hash_hex, expected_hash_hex or '')
+
+    def needs_rehash(self, iterations: int | None) -> bool:
+        return (iterations or LEGACY_ITERATIONS) != self.iterations
+
+
+hasher = PasswordHasher()
@@ -0,0 +1,44 @@
+import os
+
+from caching import TTLCache
+
+QUESTION_STATS_TTL_SECONDS = float(os.getenv('CHON_QUESTION_STATS_TTL_SECONDS', '30'))
+
+_stats_cache = TTLCache(QUESTION_STATS_TTL_SECONDS)
+
+
+def _load_question_stats(db, unique_question_id: int) -> dict:
+    """
+    Answer distribution for one question across all four questionnaires, read
+    from the running counts kept by the submission write path (no scan of
+    question_answers). Percentages are of respondents who answered the
+    question, so multi-select options can add up to more than 100.
+    """
+    return _build(unique_question_id, *db.get_question_stats(unique_question_id))
+
+
+def _build(unique_question_id: int, respondents: int, counts: dict) -> dict:
+    return {
+        'unique_question_id': unique_question_id,
+        'respondents': respondents,
+        'options': [
+            {
+                'value': value,
+                'count': count,
+                'percentage': round(count / respondents * 100, 1) if respondents else 0
+            }
+            for value, count in sorted(counts.items())
+        ]
+    }
+
+
+def get_question_stats(db, unique_question_id: int) -> dict:
+    return _stats_cache.get_or_load(
+        unique_question_id, lambda: _load_question_stats(db, unique_question_id)
+    )
+
+
+async def get_question_stats_async(db, unique_question_id: int) -> dict:
+    async def load():
+        return _build(unique_question_id, *await db.get_question_stats(unique_question_id))
+    return await _stats_cache.aget_or_load(unique_question_id, load)
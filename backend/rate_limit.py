@@ -0,0 +1,236 @@
+"""
+Token-bucket admission control for the password endpoints (login, signup).
+
+Every attempt takes one token from the bucket of the client IP and one from
+the bucket of the email / phone number it names. Buckets refill at a steady
+rate up to a small burst; an attempt finding either bucket empty takes no
+token from either and is answered 429 with Retry-After before any hashing or
+database work, so a credential-stuffing burst or a retry loop costs almost
+nothing, and hammering one account doesn't use up its IP's allowance.
+
+CHON_RATE_LIMIT_STORE picks where buckets live:
+    memory (default)      -- per process
+    sqlite:/path/to/file  -- shared by the processes on one host
+    redis://host:6379/0   -- shared by every instance (needs the `redis` package)
+When a shared store is unreachable the attempt is let through, so the
+limiter can never lock everyone out. CHON_RATE_LIMIT=0 turns it off (load tests).
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import accounts
+
+RATE_LIMIT_ENABLED = os.getenv('CHON_RATE_LIMIT', '1') != '0'
+IP_BURST = int(os.getenv('CHON_AUTH_IP_BURST', '20'))
+IP_PER_MINUTE = float(os.getenv('CHON_AUTH_IP_PER_MINUTE', '20'))
+IDENTITY_BURST = int(os.getenv('CHON_AUTH_IDENTITY_BURST', '5'))
+IDENTITY_PER_MINUTE = float(os.getenv('CHON_AUTH_IDENTITY_PER_MINUTE', '5'))
+# Proxies in front of the app that append to X-Forwarded-For; 0 trusts only the socket. Vercel
+# (which sets VERCEL=1 in its functions) puts one in front of api/index.py, so it defaults to 1 there
+TRUSTED_PROXIES = int(os.getenv('CHON_TRUSTED_PROXIES', '1' if os.getenv('VERCEL') else '0'))
+RATE_LIMIT_STORE = os.getenv('CHON_RATE_LIMIT_STORE', 'memory')
+MAX_MEMORY_KEYS = int(os.getenv('CHON_RATE_LIMIT_MAX_KEYS', '100000'))
+
+
+def _refill(tokens: float, updated: float, now: float, burst: int, per_second: float) -> float:
+    return min(burst, tokens + (now - updated) * per_second)
+
+
+def _take_all(states: list, buckets: list, now: float) -> tuple[list, float]:
+    """
+    New (tokens, updated) per bucket and the wait: a token is taken from every
+    bucket only when every bucket has one, so a rejected attempt costs nothing.
+    """
+    refilled = [_refill(*(state or (burst, now)), now, burst, per_second)
+                for state, (_, burst, per_second) in zip(states, buckets)]
+    wait = max([(1 - tokens) / per_second for tokens, (_, _, per_second) in zip(refilled, buckets) if tokens < 1],
+               default=0.0)
+    return [(tokens - 1 if wait == 0 else tokens, now) for tokens in refilled], wait
+
+
+class MemoryStore:
+    """Buckets in a dict bounded to `max_keys` (least recently used dropped, i.e. refilled)."""
+
+    def __init__(self, max_keys: int = MAX_MEMORY_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, buckets: list, now: float) -> float:
+        """
+        Take a token from each (key, burst, per_second) bucket; returns 0 on
+        success, else the seconds until all of them have one (nothing taken).
+        """
+        with self._lock:
+            states, wait = _take_all([self._buckets.get(key) for key, _, _ in buckets], buckets, now)
+            for (key, _, _), state in zip(buckets, states):
+                self._buckets[key] = state
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+class SQLiteStore:
+    """Buckets in a SQLite file, updated in one IMMEDIATE transaction per attempt."""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=1)
+        self._lock = threading.Lock()
+        self._takes = 0
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit_buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)'
+            )
+
+    def take(self, buckets: list, now: float) -> float:
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                states = [
+                    self._conn.execute('SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?', (key,)).fetchone()
+                    for key, _, _ in buckets
+                ]
+                states, wait = _take_all(states, buckets, now)
+                self._conn.executemany(
+                    'INSERT INTO rate_limit_buckets (key, tokens, updated) VALUES (?, ?, ?) '
+                    'ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                    [(key, tokens, updated) for (key, _, _), (tokens, updated) in zip(buckets, states)]
+                )
+                self._takes += 1
+                if self._takes % 1000 == 0:
+                    # Buckets idle long enough to be full again carry no information
+                    self._conn.execute('DELETE FROM rate_limit_buckets WHERE updated < ?', (now - 3600,))
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            return wait
+
+
+class RedisStore:
+    """Buckets in Redis, checked and taken atomically by a server-side script."""
+
+    _SCRIPT = """
+    local now = tonumber(ARGV[1])
+    local tokens, wait = {}, 0
+    for i, key in ipairs(KEYS) do
+        local burst, per_second = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+        local state = redis.call('HMGET', key, 'tokens', 'updated')
+        local updated = tonumber(state[2]) or now
+        tokens[i] = math.min(burst, (tonumber(state[1]) or burst) + math.max(0, now - updated) * per_second)
+        if tokens[i] < 1 then wait = math.max(wait, (1 - tokens[i]) / per_second) end
+    end
+    for i, key in ipairs(KEYS) do
+        local burst, per_second = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+        if wait == 0 then tokens[i] = tokens[i] - 1 end
+        redis.call('HSET', key, 'tokens', tokens[i], 'updated', now)
+        redis.call('EXPIRE', key, math.ceil(burst / per_second) + 1)
+    end
+    return tostring(wait)
+    """
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('CHON_RATE_LIMIT_STORE=redis:// needs the redis package: pip install redis')
+        self._client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        self._take = self._client.register_script(self._SCRIPT)
+
+    def take(self, buckets: list, now: float) -> float:
+        # The script reads the clock passed in, so every instance must agree on wall time
+        args = [now]
+        for _, burst, per_second in buckets:
+            args += [burst, per_second]
+        return float(self._take(keys=[f'chon:rl:{key}' for key, _, _ in buckets], args=args))
+
+
+def create_store(spec: str = RATE_LIMIT_STORE):
+    if spec == 'memory':
+        return MemoryStore()
+    if spec.startswith('sqlite:'):
+        return SQLiteStore(spec.removeprefix('sqlite:'))
+    if spec.startswith(('redis://', 'rediss://')):
+        return RedisStore(spec)
+    raise ValueError(f'Unknown CHON_RATE_LIMIT_STORE: {spec}')
+
+
+class AuthLimiter:
+    def __init__(self, store):
+        self.store = store
+        # Shared stores count across processes, so they need the wall clock
+        self._clock = time.monotonic if isinstance(store, MemoryStore) else time.time
+
+    def check(self, ip: str | None, identity: str | None) -> float:
+        """
+        Take a token for the IP and for the identity (normalized email or
+        phone), or none when either bucket is empty. Returns 0 when the
+        attempt may proceed, else the Retry-After in seconds.
+        """
+        if not RATE_LIMIT_ENABLED:
+            return 0.0
+        now = self._clock()
+        buckets = []
+        if ip:
+            buckets.append((f'ip:{ip}', IP_BURST, IP_PER_MINUTE / 60))
+        if identity:
+            buckets.append((f'id:{identity}', IDENTITY_BURST, IDENTITY_PER_MINUTE / 60))
+        if not buckets:
+            return 0.0
+        try:
+            # All buckets at once: an attempt the identity limit rejects must not spend the IP's token
+            return self.store.take(buckets, now)
+        except Exception as e:
+            print(f"Rate limit store unavailable, admitting request: {e}")
+            return 0.0
+
+    @property
+    def blocking(self) -> bool:
+        """Whether check() does I/O (and so should run off the event loop in the async app)."""
+        return not isinstance(self.store, MemoryStore)
+
+
+def normalize_identity(email: str | None, phone: str | None) -> str | None:
+    """The identity bucket of a login/signup attempt, the same however the email or phone is written."""
+    email, phone = accounts.normalize_email(email), accounts.normalize_phone(phone)
+    if email:
+        return f'email:{email}'
+    if phone:
+        return f'phone:{phone}'
+    return None
+
+
+def client_ip(remote_addr: str | None, forwarded_for: str | None) -> str | None:
+    """The client address, taken from X-Forwarded-For only as far as trusted proxies wrote it."""
+    global _warned_untrusted_forwarding
+    if TRUSTED_PROXIES and forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(',') if hop.strip()]
+        if hops:
+            return hops[-min(TRUSTED_PROXIES, len(hops))]
+    elif forwarded_for and not _warned_untrusted_forwarding:
+        # Behind a proxy every client shares the proxy's address, and so its IP bucket
+        _warned_untrusted_forwarding = True
+        print(f"Warning: X-Forwarded-For is set but CHON_TRUSTED_PROXIES is 0; "
+              f"rate limiting by the proxy address {remote_addr}. Set CHON_TRUSTED_PROXIES to the number of proxies.")
+    return remote_addr
+
+
+_warned_untrusted_forwarding = False
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> AuthLimiter:
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = AuthLimiter(create_store())
+    return _limiter
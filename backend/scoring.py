@@ -0,0 +1,266 @@
+"""
+Server-side tag scoring, the same numbers as calculateTagStatsFromLocalAnswers
+in frontend/src/utils/scoring.ts.
+
+The frontend's catalog (catalog.load_client_catalog, keyed by the question ids
+submissions carry) is compiled once into a dense weight matrix W (tagged
+scale questions x tags, 1 where a question counts towards a tag). Like the
+frontend, every answered question counts, whichever questionnaire it is from.
+A batch of submissions becomes a score matrix S (submissions x questions,
+A-E / 1-5 mapped to 1-5, 0 when unanswered) and an answered mask M, so every
+tag total of the batch is one matrix product: [S; M] @ W. Questions that only
+carry gendered tags (tagsFemale / tagsMale) get extra column blocks in W,
+selected per submission by the gender answer (question 1: A female, B male).
+Percentages and averages are rounded like JavaScript's toFixed(2).
+
+Per-submission scores are cached by submission id (submissions don't change);
+population means and percentiles are recomputed from a keyset scan of all
+submissions at most every CHON_POPULATION_TTL_SECONDS.
+"""
+import os
+import re
+import threading
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+
+import catalog
+from caching import LRUCache, TTLCache
+
+TAGS = ('自我意识', '奉献精神', '社交情商', '情绪调节', '客观能力', '核心耐力')
+MAX_SCORE = 5
+GENDER_QUESTION_ID = 1
+PERCENTILES = (10, 25, 50, 75, 90)
+
+SCAN_BATCH_SIZE = int(os.getenv('CHON_SCORING_BATCH_SIZE', '500'))
+_submission_scores = LRUCache(int(os.getenv('CHON_SCORE_CACHE_SIZE', '10000')))
+_population = TTLCache(float(os.getenv('CHON_POPULATION_TTL_SECONDS', '600')))
+
+_LETTER_SCORES = {'A': 1, 'B': 2, 'C': 3, 'D': 4, 'E': 5}
+_LEADING_INT = re.compile(r'\s*([+-]?\d+)')
+
+
+def parse_score(value) -> int:
+    """parseScore() from scoring.ts: A-E map to 1-5, otherwise the leading integer (0 if none)."""
+    if not isinstance(value, str):
+        return 0
+    if value in _LETTER_SCORES:
+        return _LETTER_SCORES[value]
+    match = _LEADING_INT.match(value)
+    return int(match.group(1)) if match else 0
+
+
+class CompiledQuestionnaire:
+    """Weight matrix and question index for one questionnaire type."""
+
+    def __init__(self, questions: list[dict]):
+        tag_index = {tag: i for i, tag in enumerate(TAGS)}
+        scored = [q for q in questions if q.get('type') == 'scale-question'
+                  and (q.get('tags') or q.get('tagsFemale') or q.get('tagsMale'))]
+        self.question_index = {q['id']: i for i, q in enumerate(scored)}
+
+        # Column blocks: tags, then tagsFemale / tagsMale for questions without plain tags
+        self.weights = np.zeros((len(scored), 3 * len(TAGS)), dtype=np.float64)
+        for row, question in enumerate(scored):
+            if question.get('tags'):
+                blocks = ((0, question['tags']),)
+            else:
+                blocks = ((1, question.get('tagsFemale') or ()), (2, question.get('tagsMale') or ()))
+            for block, tags in blocks:
+                for tag in tags:
+                    if tag in tag_index:
+                        self.weights[row, block * len(TAGS) + tag_index[tag]] += 1
+
+    def matrices(self, submissions: list[dict]):
+        """(scores, answered, gender) for a batch; gender is 1 female, 2 male, 0 unknown."""
+        scores = np.zeros((len(submissions), len(self.question_index)), dtype=np.float64)
+        gender = np.zeros(len(submissions), dtype=np.int8)
+        for row, submission in enumerate(submissions):
+            for answer in submission.get('answers') or ():
+                question_id = int(answer['question_id'])
+                value = answer['response_value']
+                if question_id == GENDER_QUESTION_ID:
+                    gender[row] = 1 if value == 'A' else 2 if value == 'B' else 0
+                column = self.question_index.get(question_id)
+                if column is not None:
+                    score = parse_score(value)
+                    if score > 0:
+                        scores[row, column] = score
+        return scores, (scores > 0).astype(np.float64), gender
+
+    def tag_totals(self, submissions: list[dict]):
+        """(score_sums, answered_counts), each submissions x tags, with one matmul for the batch."""
+        scores, answered, gender = self.matrices(submissions)
+        totals = np.vstack((scores, answered)) @ self.weights
+        n, t = len(submissions), len(TAGS)
+        female = (gender == 1)[:, None]
+        male = (gender == 2)[:, None]
+
+        def by_gender(block):
+            return block[:, :t] + female * block[:, t:2 * t] + male * block[:, 2 * t:]
+        return by_gender(totals[:n]), by_gender(totals[n:])
+
+
+_compiled = None
+_compile_lock = threading.Lock()
+
+
+def compiled(questionnaire_type: str) -> CompiledQuestionnaire | None:
+    """The compiled catalog, or None when `questionnaire_type` isn't one of the frontend's."""
+    global _compiled
+    client_catalog = catalog.load_client_catalog()
+    if questionnaire_type not in client_catalog['menus']:
+        return None
+    if _compiled is None:
+        with _compile_lock:
+            if _compiled is None:
+                _compiled = CompiledQuestionnaire(client_catalog['questions'])
+    return _compiled
+
+
+_HUNDREDTH = Decimal('0.01')
+
+
+def _round_half_up(value: float) -> float:
+    """Number(value.toFixed(2)): the exact binary value rounded half up (np.round rounds half to even)."""
+    return float(Decimal(value).quantize(_HUNDREDTH, rounding=ROUND_HALF_UP))
+
+
+_to_fixed = np.vectorize(_round_half_up, otypes=[np.float64])
+
+
+def _percentages(score_sums, answered_counts):
+    possible = answered_counts * MAX_SCORE
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Unanswered tags are 0/0; they become 0, as in the frontend
+        percentage = np.minimum(100, _to_fixed(np.nan_to_num(score_sums / possible * 100)))
+        average = _to_fixed(np.nan_to_num(score_sums / answered_counts))
+    return possible, percentage, average
+
+
+def score_batch(questionnaire_type: str, submissions: list[dict]) -> list[dict]:
+    """TagStats per tag for every submission in the batch, in order."""
+    questionnaire = compiled(questionnaire_type)
+    if questionnaire is None or not submissions:
+        return [{tag: _empty_stats() for tag in TAGS} for _ in submissions]
+    score_sums, answered_counts = questionnaire.tag_totals(submissions)
+    possible, percentage, average = _percentages(score_sums, answered_counts)
+    return [
+        {
+            tag: {
+                'userScore': int(score_sums[row, i]),
+                'totalPossibleScore': int(possible[row, i]),
+                'scorePercentage': float(percentage[row, i]),
+                'averageScore': float(average[row, i]),
+                'answeredQuestions': int(answered_counts[row, i]),
+            }
+            for i, tag in enumerate(TAGS)
+        }
+        for row in range(len(submissions))
+    ]
+
+
+def _empty_stats() -> dict:
+    return {'userScore': 0, 'totalPossibleScore': 0, 'scorePercentage': 0.0, 'averageScore': 0.0,
+            'answeredQuestions': 0}
+
+
+def get_submission_scores(db, submission_id: int) -> dict | None:
+    """{submission_id, questionnaire_type, tags: {tag: TagStats}}, or None for an unknown submission."""
+    cached = _submission_scores.get(submission_id)
+    if cached is not None:
+        return cached
+    submission = db.get_submission(submission_id)
+    if submission is None:
+        return None
+    result = {
+        'submission_id': submission['id'],
+        'questionnaire_type': submission['questionnaire_type'],
+        'tags': score_batch(submission['questionnaire_type'], [submission])[0],
+    }
+    _submission_scores.set(submission_id, result)
+    return result
+
+
+class Population:
+    """scorePercentage of every submission of one type that answered each tag, sorted per tag."""
+
+    def __init__(self, questionnaire_type: str, sorted_percentages: list, mean_average_scores: list):
+        self.questionnaire_type = questionnaire_type
+        self.sorted_percentages = sorted_percentages
+        self.mean_average_scores = mean_average_scores
+
+    def percentile_rank(self, tag_index: int, percentage: float) -> float | None:
+        """Share of the population (0-100) scoring at or below `percentage`."""
+        values = self.sorted_percentages[tag_index]
+        if not len(values):
+            return None
+        return round(float(np.searchsorted(values, percentage, side='right')) / len(values) * 100, 2)
+
+    def summary(self) -> dict:
+        tags = {}
+        for i, tag in enumerate(TAGS):
+            values = self.sorted_percentages[i]
+            tags[tag] = {
+                'respondents': int(len(values)),
+                'meanScorePercentage': round(float(values.mean()), 2) if len(values) else None,
+                'meanAverageScore': self.mean_average_scores[i],
+                'percentiles': {
+                    f'p{p}': round(float(v), 2) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))
+                } if len(values) else None,
+            }
+        return {'questionnaire_type': self.questionnaire_type, 'tags': tags}
+
+
+def _build_population(db, questionnaire_type: str) -> Population:
+    questionnaire = compiled(questionnaire_type)
+    percentage_batches, average_batches, answered_batches = [], [], []
+    after_id = None
+    while True:
+        batch = db.scan_submissions(after_id=after_id, limit=SCAN_BATCH_SIZE, questionnaire_type=questionnaire_type)
+        if not batch:
+            break
+        score_sums, answered_counts = questionnaire.tag_totals(batch)
+        _, percentage, average = _percentages(score_sums, answered_counts)
+        percentage_batches.append(percentage)
+        average_batches.append(average)
+        answered_batches.append(answered_counts > 0)
+        after_id = batch[-1]['id']
+        if len(batch) < SCAN_BATCH_SIZE:
+            break
+
+    if percentage_batches:
+        percentage = np.vstack(percentage_batches)
+        average = np.vstack(average_batches)
+        answered = np.vstack(answered_batches)
+    else:
+        percentage = average = np.zeros((0, len(TAGS)))
+        answered = np.zeros((0, len(TAGS)), dtype=bool)
+
+    # Like the frontend, a tag only has a score for submissions that answered one of its questions
+    sorted_percentages = [np.sort(percentage[answered[:, i], i]) for i in range(len(TAGS))]
+    mean_average_scores = [
+        round(float(average[answered[:, i], i].mean()), 2) if answered[:, i].any() else None
+        for i in range(len(TAGS))
+    ]
+    return Population(questionnaire_type, sorted_percentages, mean_average_scores)
+
+
+def get_population(db, questionnaire_type: str) -> Population | None:
+    if compiled(questionnaire_type) is None:
+        return None
+    return _population.get_or_load(questionnaire_type, lambda: _build_population(db, questionnaire_type))
+
+
+def with_percentile_ranks(db, scores: dict) -> dict:
+    """A copy of `scores` with each tag's percentile rank within its questionnaire's population."""
+    population = get_population(db, scores['questionnaire_type'])
+    tags = {}
+    for i, tag in enumerate(TAGS):
+        stats = dict(scores['tags'][tag])
+        stats['percentileRank'] = (
+            population.percentile_rank(i, stats['scorePercentage'])
+            if population is not None and stats['answeredQuestions'] else None
+        )
+        tags[tag] = stats
+    return {**scores, 'tags': tags}
@@ -0,0 +1,133 @@
+"""
+Stateless session tokens issued by login and signup.
+
+A token is base64url(JSON claims) + '.' + base64url(HMAC-SHA256 of them), so
+checking one is a hash and a JSON parse: no database, no password hashing.
+Access tokens are short-lived (CHON_SESSION_TTL_SECONDS) and authorize reads
+such as /api/user-responses/<user_id>. Refresh tokens live longer
+(CHON_REFRESH_TTL_SECONDS) and are exchanged at /api/token/refresh for a
+new pair. That exchange is the only place that reads the users row, and it
+rejects the token once the password has changed.
+
+CHON_SESSION_SECRET holds the signing key. A comma-separated list signs
+with the first key and accepts all of them, for rotation. Without it no
+tokens are issued and the endpoints behave as before.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+
+SECRETS = [secret.encode('utf-8') for secret in os.getenv('CHON_SESSION_SECRET', '').split(',') if secret]
+ENABLED = bool(SECRETS)
+ACCESS_TTL_SECONDS = int(os.getenv('CHON_SESSION_TTL_SECONDS', '900'))
+REFRESH_TTL_SECONDS = int(os.getenv('CHON_REFRESH_TTL_SECONDS', str(30 * 24 * 3600)))
+# Reject reads of user data that carry no token (the frontend's anonymous users send none)
+REQUIRE_FOR_USER_DATA = os.getenv('CHON_REQUIRE_SESSION') == '1'
+
+ACCESS = 'access'
+REFRESH = 'refresh'
+
+
+class InvalidToken(Exception):
+    """The token is malformed, forged, expired or of the wrong kind; the message is client-facing."""
+
+
+def _encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _sign(payload: bytes, secret: bytes) -> bytes:
+    return hmac.new(secret, payload, hashlib.sha256).digest()
+
+
+def password_fingerprint(password_hash: str | None) -> str:
+    """Ties refresh tokens to the current password without putting the hash in them."""
+    return _encode(_sign(f'pwd:{password_hash or ""}'.encode('utf-8'), SECRETS[0])[:12])
+
+
+def issue(user_id: str, kind: str, ttl: int, now: float | None = None, **claims) -> str:
+    now = int(time.time() if now is None else now)
+    payload = json.dumps({'sub': user_id, 'typ': kind, 'iat': now, 'exp': now + ttl, **claims},
+                         separators=(',', ':'), sort_keys=True).encode('utf-8')
+    return f'{_encode(payload)}.{_encode(_sign(payload, SECRETS[0]))}'
+
+
+def verify(token: str, kind: str = ACCESS, now: float | None = None) -> dict:
+    """The claims of a valid, unexpired token of `kind`. Raises InvalidToken."""
+    if not ENABLED:
+        raise InvalidToken('Sessions are not enabled')
+    try:
+        encoded_payload, _, encoded_signature = token.partition('.')
+        payload, signature = _decode(encoded_payload), _decode(encoded_signature)
+    except (AttributeError, ValueError):
+        raise InvalidToken('Malformed token')
+    if not any(hmac.compare_digest(signature, _sign(payload, secret)) for secret in SECRETS):
+        raise InvalidToken('Invalid token')
+    claims = json.loads(payload)
+    if claims.get('typ') != kind:
+        raise InvalidToken(f'Not an {kind} token' if kind == ACCESS else f'Not a {kind} token')
+    if claims.get('exp', 0) <= (time.time() if now is None else now):
+        raise InvalidToken('Token expired')
+    return claims
+
+
+def issue_session(user_id: str, password_hash: str | None) -> dict | None:
+    """The session returned by login, signup and refresh; None when sessions are disabled."""
+    if not ENABLED:
+        return None
+    return {
+        'access_token': issue(user_id, ACCESS, ACCESS_TTL_SECONDS),
+        'refresh_token': issue(user_id, REFRESH, REFRESH_TTL_SECONDS, pwd=password_fingerprint(password_hash)),
+        'token_type': 'Bearer',
+        'expires_in': ACCESS_TTL_SECONDS,
+    }
+
+
+def bearer_token(authorization: str | None) -> str | None:
+    scheme, _, token = (authorization or '').partition(' ')
+    return token.strip() if scheme.lower() == 'bearer' and token.strip() else None
+
+
+def bearer_matches(authorization: str | None, secret: str) -> bool:
+    """Whether the Authorization header is exactly `Bearer <secret>`, compared in constant time."""
+    return hmac.compare_digest((authorization or '').encode('utf-8'), f'Bearer {secret}'.encode('utf-8'))
+
+
+def authorize_user(authorization: str | None, user_id: str) -> tuple[str, int] | None:
+    """
+    Check the caller may read `user_id`'s data. Returns None when allowed,
+    else (error message, HTTP status). A request without a token is allowed
+    unless CHON_REQUIRE_SESSION=1; one with a token must carry a valid
+    access token for the same user.
+    """
+    token = bearer_token(authorization) if ENABLED else None
+    if token is None:
+        return ('Authentication required', 401) if REQUIRE_FOR_USER_DATA and ENABLED else None
+    try:
+        claims = verify(token, ACCESS)
+    except InvalidToken as e:
+        return str(e), 401
+    if not hmac.compare_digest(claims['sub'].encode('utf-8'), user_id.encode('utf-8')):
+        return 'Token does not grant access to this user', 403
+    return None
+
+
+REFRESH_COLUMNS = 'user_id, password_hash'
+
+
+def refreshed_session(claims: dict, user: dict | None) -> dict:
+    """
+    A new session for verified refresh-token `claims`, given the users row
+    (REFRESH_COLUMNS) of its subject. Raises InvalidToken when the account is
+    gone or its password changed since the token was issued.
+    """
+    if user is None or not hmac.compare_digest(claims.get('pwd', ''), password_fingerprint(user.get('password_hash'))):
+        raise InvalidToken('Session revoked, please log in again')
+    return issue_session(claims['sub'], user.get('password_hash'))
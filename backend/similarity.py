@@ -0,0 +1,349 @@
+"""
+"Similar respondents": top-k submissions whose answers match a given
+submission's answers most often.
+
+Every multiple-choice and scale answer is keyed by its question id in the
+frontend's catalog (database/client_catalog.json). Those ids are global, so
+submissions of different questionnaires are comparable on the questions
+they share. A submission is encoded as an int8 vector with one column per
+question (1-based option index, 0 when unanswered), and the same answers
+are also stored transposed: one bitmap per (question, option) with a bit
+per submission.
+
+A query only touches the bitmaps of the options the query submission chose.
+They are summed with a bit-sliced counter (a handful of word-wide AND/XOR
+per bitmap) and the top k are read off the count's bit planes from the most
+significant one down, so a query is a few dozen passes over N/64 words
+instead of a comparison per submission and question.
+
+The index is appended to as submissions are saved. With
+CHON_SIMILARITY_INDEX_PATH set it lives in a memory-mapped file that every
+worker maps and appends to (under an flock); otherwise each process builds
+its own copy in memory on first use.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+import catalog
+
+INDEX_PATH = os.getenv('CHON_SIMILARITY_INDEX_PATH')
+# Rows are allocated in multiples of 64 (one bitmap word)
+INITIAL_CAPACITY = max(64, int(os.getenv('CHON_SIMILARITY_INITIAL_CAPACITY', str(1 << 16))) // 64 * 64)
+SCAN_BATCH_SIZE = 500
+RECENT_ROWS = 4096
+MAX_K = 100
+
+SCALE_VALUES = ('1', '2', '3', '4', '5')
+_SCALE_LETTERS = ('A', 'B', 'C', 'D', 'E')
+
+_MAGIC = 0x43484F4E53494D31  # "CHONSIM1"
+_HEADER_WORDS = 8  # magic, layout fingerprint, capacity, count, dims, bitmaps, 2 spare
+_COUNT = 3
+
+
+class AnswerLayout:
+    """Column and bitmap positions of every (question, option) pair."""
+
+    def __init__(self, questions: list[dict]):
+        self.columns = {}      # question_id -> column
+        self.codes = []        # per column: {response_value: 1-based option code}
+        self.bit_offsets = []  # per column: first bitmap of its options
+        n_bits = 0
+        for question in sorted(questions, key=lambda q: q['id']):
+            if question.get('type') == 'scale-question':
+                codes = {value: i + 1 for i, value in enumerate(SCALE_VALUES)}
+                codes.update({letter: i + 1 for i, letter in enumerate(_SCALE_LETTERS)})
+                n_options = len(SCALE_VALUES)
+            elif question.get('type') == 'multiple-choice':
+                codes = {option_id: i + 1 for i, option_id in enumerate(question.get('options', []))}
+                n_options = len(codes)
+            else:
+                continue
+            self.columns[question['id']] = len(self.codes)
+            self.codes.append(codes)
+            self.bit_offsets.append(n_bits)
+            n_bits += n_options
+        self.dims = len(self.codes)
+        self.n_bits = n_bits
+        described = json.dumps([[question_id, len(self.codes[col])] for question_id, col in self.columns.items()])
+        self.fingerprint = int.from_bytes(hashlib.sha256(described.encode()).digest()[:7], 'little')
+
+    def encode(self, answers: list[dict]) -> np.ndarray:
+        """int8 vector for `answers`, as stored (question_id, response_value)."""
+        vector = np.zeros(self.dims, dtype=np.int8)
+        for answer in answers:
+            column = self.columns.get(int(answer['question_id']))
+            if column is not None:
+                vector[column] = self.codes[column].get(answer['response_value'], 0)
+        return vector
+
+    def bits(self, vector: np.ndarray) -> list[int]:
+        """Bitmap numbers of the options chosen in `vector`."""
+        return [self.bit_offsets[column] + int(vector[column]) - 1 for column in np.flatnonzero(vector)]
+
+
+def load_layout() -> AnswerLayout:
+    return AnswerLayout(catalog.load_client_catalog()['questions'])
+
+
+class _Arrays:
+    """Header, submission ids, int8 vectors and bitmaps laid out in one byte buffer."""
+
+    def __init__(self, buffer, capacity: int, dims: int, n_bits: int):
+        self.buffer = buffer
+        offset = _HEADER_WORDS * 8
+        self.header = buffer[:offset].view(np.int64)
+        self.ids = buffer[offset:offset + capacity * 8].view(np.int64)
+        offset += capacity * 8
+        row_bytes = (dims + 7) // 8 * 8
+        self.vectors = buffer[offset:offset + capacity * row_bytes].view(np.int8).reshape(capacity, row_bytes)[:, :dims]
+        offset += capacity * row_bytes
+        self.bitmaps = buffer[offset:offset + n_bits * capacity // 8].view(np.uint64).reshape(n_bits, capacity // 64)
+
+    @staticmethod
+    def size(capacity: int, dims: int, n_bits: int) -> int:
+        return _HEADER_WORDS * 8 + capacity * 8 + capacity * ((dims + 7) // 8 * 8) + n_bits * capacity // 8
+
+
+class SimilarityIndex:
+    def __init__(self, layout: AnswerLayout, path: str | None = None):
+        self.layout = layout
+        self.path = path
+        self._lock = threading.Lock()
+        self._arrays = None
+        self._inode = None
+
+    # buffers
+
+    def _allocate(self, capacity: int) -> _Arrays:
+        size = _Arrays.size(capacity, self.layout.dims, self.layout.n_bits)
+        if self.path is None:
+            arrays = _Arrays(np.zeros(size, dtype=np.uint8), capacity, self.layout.dims, self.layout.n_bits)
+        else:
+            # Build the new file beside the old one and swap it in atomically
+            tmp_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.truncate(size)
+            arrays = _Arrays(np.memmap(tmp_path, dtype=np.uint8, mode='r+', shape=(size,)),
+                             capacity, self.layout.dims, self.layout.n_bits)
+        arrays.header[:6] = (_MAGIC, self.layout.fingerprint, capacity, 0, self.layout.dims, self.layout.n_bits)
+        return arrays
+
+    def _commit_file(self, arrays: _Arrays):
+        if self.path is not None:
+            arrays.buffer.flush()
+            os.replace(arrays.buffer.filename, self.path)
+            self._inode = os.stat(self.path).st_ino
+
+    def _map_file(self) -> bool:
+        """Map the index file if it exists and matches the layout."""
+        try:
+            stat = os.stat(self.path)
+            buffer = np.memmap(self.path, dtype=np.uint8, mode='r+')
+        except (FileNotFoundError, ValueError):
+            return False
+        header = buffer[:_HEADER_WORDS * 8].view(np.int64)
+        if header[0] != _MAGIC or header[1] != self.layout.fingerprint:
+            return False
+        capacity = int(header[2])
+        if buffer.size != _Arrays.size(capacity, self.layout.dims, self.layout.n_bits):
+            return False
+        self._arrays = _Arrays(buffer, capacity, self.layout.dims, self.layout.n_bits)
+        self._inode = stat.st_ino
+        return True
+
+    def _refresh_mapping(self):
+        """Pick up a file another worker grew (and so replaced) since we mapped it."""
+        if self.path is not None and os.stat(self.path).st_ino != self._inode:
+            self._map_file()
+
+    def _file_lock(self):
+        return _FileLock(None if self.path is None else f'{self.path}.lock')
+
+    # loading
+
+    def open(self, db):
+        """Map or build the index, then add any submissions saved since it was last written."""
+        with self._lock, self._file_lock():
+            if self.path is None or not self._map_file():
+                self._arrays = self._allocate(INITIAL_CAPACITY)
+                self._commit_file(self._arrays)
+            count = int(self._arrays.header[_COUNT])
+            after_id = int(self._arrays.ids[:count].max()) if count else None
+            while True:
+                batch = db.scan_submissions(after_id=after_id, limit=SCAN_BATCH_SIZE)
+                for submission in batch:
+                    self._append(submission['id'], self.layout.encode(submission['answers']))
+                if len(batch) < SCAN_BATCH_SIZE:
+                    break
+                after_id = batch[-1]['id']
+
+    # writes
+
+    def add(self, submission_id: int, vector: np.ndarray):
+        with self._lock, self._file_lock():
+            self._refresh_mapping()
+            # A worker that opened the index after this submission was saved already scanned it in
+            count = int(self._arrays.header[_COUNT])
+            if (self._arrays.ids[max(0, count - RECENT_ROWS):count] == submission_id).any():
+                return
+            self._append(submission_id, vector)
+
+    def _append(self, submission_id: int, vector: np.ndarray):
+        arrays = self._arrays
+        count = int(arrays.header[_COUNT])
+        if count == len(arrays.ids):
+            arrays = self._grow(arrays, count)
+        arrays.ids[count] = submission_id
+        arrays.vectors[count] = vector
+        word, bit = divmod(count, 64)
+        for bitmap in self.layout.bits(vector):
+            arrays.bitmaps[bitmap, word] |= np.uint64(1 << bit)
+        # Publish the row only once it is complete; readers ignore rows >= count
+        arrays.header[_COUNT] = count + 1
+
+    def _grow(self, arrays: _Arrays, count: int) -> _Arrays:
+        grown = self._allocate(len(arrays.ids) * 2)
+        grown.ids[:count] = arrays.ids[:count]
+        grown.vectors[:count] = arrays.vectors[:count]
+        grown.bitmaps[:, :arrays.bitmaps.shape[1]] = arrays.bitmaps
+        grown.header[_COUNT] = count
+        self._commit_file(grown)
+        self._arrays = grown
+        return grown
+
+    # reads
+
+    def vector_of(self, submission_id: int) -> np.ndarray | None:
+        self._refresh_mapping()
+        arrays = self._arrays
+        count = int(arrays.header[_COUNT])
+        positions = np.flatnonzero(arrays.ids[:count] == submission_id)
+        return arrays.vectors[positions[0]].copy() if len(positions) else None
+
+    def query(self, vector: np.ndarray, k: int, exclude_id: int | None = None) -> list[dict]:
+        """The k indexed submissions with the most answers equal to `vector`'s, best first."""
+        self._refresh_mapping()
+        arrays = self._arrays
+        count = int(arrays.header[_COUNT])
+        words = (count + 63) // 64
+        bits = self.layout.bits(vector)
+        if not count or not bits:
+            return []
+
+        # Bit-sliced per-submission count of matching answers: planes[i] holds bit i of every count
+        planes = [np.zeros(words, dtype=np.uint64) for _ in range(len(bits).bit_length())]
+        carry, next_carry = np.empty(words, dtype=np.uint64), np.empty(words, dtype=np.uint64)
+        for added, bitmap in enumerate(bits, start=1):
+            carry[:] = arrays.bitmaps[bitmap, :words]
+            for plane in planes[:added.bit_length()]:
+                np.bitwise_and(plane, carry, out=next_carry)
+                plane ^= carry
+                carry, next_carry = next_carry, carry
+
+        candidates = np.full(words, np.uint64(0xFFFFFFFFFFFFFFFF), dtype=np.uint64)
+        if count % 64:
+            candidates[-1] = np.uint64((1 << (count % 64)) - 1)
+        if exclude_id is not None:
+            for position in np.flatnonzero(arrays.ids[:count] == exclude_id):
+                candidates[position // 64] &= ~np.uint64(1 << (position % 64))
+
+        # Top-k over the bit planes: `chosen` beat the threshold, `candidates` may still tie it
+        chosen = np.zeros(words, dtype=np.uint64)
+        for plane in reversed(planes):
+            with_bit = candidates & plane
+            selected = int(np.bitwise_count(chosen | with_bit).sum())
+            if selected > k:
+                candidates = with_bit
+            else:
+                chosen |= with_bit
+                candidates &= ~plane
+                if selected == k:
+                    break
+        positions = _positions(chosen)
+        if len(positions) < k:
+            positions = np.concatenate((positions, _positions(candidates)[:k - len(positions)]))
+
+        matches = np.zeros(len(positions), dtype=np.int64)
+        for i, plane in enumerate(planes):
+            matches += ((plane[positions // 64] >> (positions % 64).astype(np.uint64)) & np.uint64(1)).astype(np.int64) << i
+        order = np.lexsort((positions, -matches))
+        return [
+            {'submission_id': int(arrays.ids[positions[i]]), 'matching_answers': int(matches[i])}
+            for i in order
+        ]
+
+
+def _positions(mask: np.ndarray) -> np.ndarray:
+    # Bit b of word w is submission position w * 64 + b (little-endian words)
+    words = np.flatnonzero(mask)
+    bits = np.unpackbits(mask[words].view(np.uint8), bitorder='little').reshape(len(words), 64)
+    word_index, bit = np.nonzero(bits)
+    return words[word_index] * 64 + bit
+
+
+class _FileLock:
+    """Exclusive flock on `path` for the duration of a with-block; a no-op without a path."""
+
+    def __init__(self, path: str | None):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        if self.path is not None:
+            self._file = open(self.path, 'a')
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index(db) -> SimilarityIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = SimilarityIndex(load_layout(), INDEX_PATH)
+                index.open(db)
+                _index = index
+    return _index
+
+
+def add_submission(db, submission_id: int, answers: list[dict]):
+    """Append a newly saved submission. Without a shared index file, only an already-built index is updated."""
+    if _index is None and INDEX_PATH is None:
+        return
+    index = get_index(db)
+    index.add(submission_id, index.layout.encode(answers))
+
+
+def similar_submissions(db, submission_id: int, k: int) -> dict | None:
+    """
+    {submission_id, compared_answers, neighbors: [{submission_id, matching_answers}]}
+    with up to k neighbors, most similar first; None for an unknown submission.
+    """
+    index = get_index(db)
+    vector = index.vector_of(submission_id)
+    if vector is None:
+        submission = db.get_submission(submission_id)
+        if submission is None:
+            return None
+        vector = index.layout.encode(submission['answers'])
+    return {
+        'submission_id': submission_id,
+        'compared_answers': int(np.count_nonzero(vector)),
+        'neighbors': index.query(vector, min(k, MAX_K), exclude_id=submission_id),
+    }
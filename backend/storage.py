@@ -0,0 +1,701 @@
+"""
+Repository layer in front of the tables the API uses: intro_choices (and its
+counters), questionnaire_submissions, question_answers, users and
+question_identity_mapping.
+
+CHON_STORAGE selects the implementation:
+    supabase (default) -- SUPABASE_URL / SUPABASE_KEY
+    sqlite             -- local database built from migrations/*.sql, at
+                          CHON_SQLITE_PATH (default ':memory:')
+The SQLite backend needs no network access, so the Python side of every
+endpoint can be profiled and load-tested in isolation.
+"""
+import glob
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+STORAGE_BACKEND = os.getenv('CHON_STORAGE', 'supabase')
+SQLITE_PATH = os.getenv('CHON_SQLITE_PATH', ':memory:')
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+DATABASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'database')
+
+# Question types whose answers are options (counted in question_option_counts)
+CHOICE_QUESTION_TYPES = ('multiple-choice', 'multi-select', 'scale-question')
+
+SUBMISSION_COLUMNS = 'id, questionnaire_type, created_at, updated_at'
+EXPORT_COLUMNS = 'id, user_id, questionnaire_type, corporate_role, created_at, updated_at'
+DRAFT_COLUMNS = 'user_id, questionnaire_type, corporate_role, answers, version, updated_at'
+
+
+class SupabaseStorage:
+    """
+    Talks to Supabase's PostgREST API. Only the postgrest client is imported,
+    and only on first use, so cold starts don't pay for the full supabase
+    package (auth, storage, realtime, functions) that the API never touches.
+    """
+
+    def __init__(self, url: str | None, key: str | None):
+        self._url = url
+        self._key = key
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._create_client()
+        return self._client
+
+    def _create_client(self):
+        if not (self._url and self._key):
+            raise RuntimeError('Supabase credentials not found')
+        from postgrest import SyncPostgrestClient
+        # Same headers supabase.create_client() would send
+        return SyncPostgrestClient(f"{self._url.rstrip('/')}/rest/v1", headers={
+            'apikey': self._key,
+            'Authorization': f'Bearer {self._key}',
+        })
+
+    # intro_choices
+
+    def upsert_intro_choices(self, rows: list[dict]):
+        """INSERT ... ON CONFLICT (user_id) DO UPDATE for one or more {user_id, choice} rows."""
+        self.client.table('intro_choices').upsert(rows, on_conflict='user_id').execute()
+
+    def get_intro_counts(self) -> tuple[dict, str | None]:
+        """
+        Running totals kept by the trigger in migrations/02_intro_choice_counts.sql,
+        as ({choice: count}, latest updated_at).
+        """
+        rows = self.client.table('intro_choice_counts').select('choice, count, updated_at').execute().data or []
+        return {row['choice']: row['count'] for row in rows}, max((row['updated_at'] for row in rows), default=None)
+
+    # questionnaire_submissions / question_answers
+
+    def save_submission(self, user_id: str, questionnaire_type: str, answers: list[dict],
+                        corporate_role: str | None = None, idempotency_key: str | None = None):
+        """
+        Insert a submission and its answers atomically via the `submit_questionnaire`
+        function (migrations/04_submit_questionnaire.sql). Returns (submission_id, created).
+        """
+        response = self.client.rpc('submit_questionnaire', {
+            'p_user_id': user_id,
+            'p_questionnaire_type': questionnaire_type,
+            'p_answers': answers,
+            'p_corporate_role': corporate_role,
+            'p_idempotency_key': idempotency_key
+        }).execute()
+        result = response.data
+        return result['submission_id'], result['created']
+
+    def save_submissions(self, submissions: list[dict]) -> list[tuple[int, bool]]:
+        """
+        Several submissions ({user_id, questionnaire_type, answers, corporate_role,
+        idempotency_key}) in one transaction and one round trip, via `submit_questionnaires`
+        (migrations/08_submit_questionnaires.sql). Returns (submission_id, created) for each, in order.
+        """
+        response = self.client.rpc('submit_questionnaires', {'p_submissions': submissions}).execute()
+        return [(result['submission_id'], result['created']) for result in response.data]
+
+    def list_submissions(self, user_id: str, limit: int | None = None, after_id: int | None = None) -> list[dict]:
+        """Submissions ordered by id with their answers embedded under 'answers' (one round trip)."""
+        query = self.client.table('questionnaire_submissions').select(
+            f'{SUBMISSION_COLUMNS}, answers:question_answers(*)'
+        ).eq('user_id', user_id).order('id')
+        if after_id is not None:
+            query = query.gt('id', after_id)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.execute().data or []
+
+    def get_submission(self, submission_id: int) -> dict | None:
+        """One submission with its answers embedded under 'answers', or None."""
+        rows = self.client.table('questionnaire_submissions').select(
+            f'{SUBMISSION_COLUMNS}, answers:question_answers(question_id, response_value)'
+        ).eq('id', submission_id).limit(1).execute().data or []
+        return rows[0] if rows else None
+
+    def scan_submissions(self, after_id: int | None = None, limit: int = 500,
+                         questionnaire_type: str | None = None, updated_since: datetime | None = None,
+                         columns: str = SUBMISSION_COLUMNS) -> list[dict]:
+        """Everyone's submissions in id order, one keyset page at a time, answers embedded."""
+        query = self.client.table('questionnaire_submissions').select(
+            f'{columns}, answers:question_answers(question_id, response_value)'
+        ).order('id').limit(limit)
+        if after_id is not None:
+            query = query.gt('id', after_id)
+        if questionnaire_type is not None:
+            query = query.eq('questionnaire_type', questionnaire_type)
+        if updated_since is not None:
+            query = query.gte('updated_at', updated_since.isoformat())
+        return query.execute().data or []
+
+    def submission_exists(self, user_id: str) -> bool:
+        response = self.client.table('questionnaire_submissions').select(
+            'id'
+        ).eq('user_id', user_id).limit(1).execute()
+        return bool(response.data)
+
+    def get_submission_version(self, user_id: str) -> tuple[int, int | None, str | None]:
+        """
+        (submission count, id, updated_at) of a user's most recently updated
+        submission: enough to tell whether anything changed without reading them.
+        """
+        response = self.client.table('questionnaire_submissions').select(
+            'id, updated_at', count='exact'
+        ).eq('user_id', user_id).order('updated_at', desc=True).order('id', desc=True).limit(1).execute()
+        latest = response.data[0] if response.data else {}
+        return response.count or 0, latest.get('id'), latest.get('updated_at')
+
+    def list_submission_answer_counts(self, user_id: str) -> list[dict]:
+        """Submissions ordered by id with an 'answer_count' instead of the answers themselves."""
+        rows = self.client.table('questionnaire_submissions').select(
+            f'{SUBMISSION_COLUMNS}, question_answers(count)'
+        ).eq('user_id', user_id).order('id').execute().data or []
+        for row in rows:
+            embedded = row.pop('question_answers', None) or [{'count': 0}]
+            row['answer_count'] = embedded[0].get('count', 0)
+        return rows
+
+    # questionnaire_drafts
+
+    def get_draft(self, user_id: str) -> dict | None:
+        rows = self.client.table('questionnaire_drafts').select(
+            DRAFT_COLUMNS
+        ).eq('user_id', user_id).limit(1).execute().data or []
+        return rows[0] if rows else None
+
+    def patch_draft(self, user_id: str, version: int, questionnaire_type: str,
+                    corporate_role: str | None, answers: dict, first_version: int | None = None) -> tuple[int, bool]:
+        """
+        Apply a delta ({question_id: value or None}) via `patch_draft`
+        (migrations/09_questionnaire_drafts.sql). For patches merged into one,
+        `first_version` is the version of the first: the stored draft must be
+        older than it. Returns (stored version, applied).
+        """
+        result = self.client.rpc('patch_draft', {
+            'p_user_id': user_id,
+            'p_version': version,
+            'p_questionnaire_type': questionnaire_type,
+            'p_corporate_role': corporate_role,
+            'p_answers': answers,
+            'p_first_version': first_version
+        }).execute().data
+        return result['version'], result['applied']
+
+    def promote_draft(self, user_id: str, version: int | None = None, idempotency_key: str | None = None) -> dict:
+        """
+        Submit the user's draft via `submit_draft`: {submission_id, created}, or
+        {status: not_found | conflict | empty, ...} when there is nothing to submit.
+        """
+        return self.client.rpc('submit_draft', {
+            'p_user_id': user_id,
+            'p_version': version,
+            'p_idempotency_key': idempotency_key
+        }).execute().data
+
+    # users
+
+    def find_user(self, columns: str = '*', **match) -> dict | None:
+        """First user matching every column=value in `match` (e.g. email=...)."""
+        query = self.client.table('users').select(columns)
+        for column, value in match.items():
+            query = query.eq(column, value)
+        rows = query.limit(1).execute().data or []
+        return rows[0] if rows else None
+
+    def upsert_user(self, row: dict):
+        """INSERT ... ON CONFLICT (user_id) DO UPDATE: create the account or replace its fields, one round trip."""
+        from postgrest.types import ReturnMethod
+        self.client.table('users').upsert(
+            {**row, 'updated_at': datetime.now(timezone.utc).isoformat()},
+            on_conflict='user_id', returning=ReturnMethod.minimal
+        ).execute()
+
+    def update_user(self, user_id: str, fields: dict):
+        self.client.table('users').update(fields).eq('user_id', user_id).execute()
+
+    # question_identity_mapping
+
+    def get_question_mapping(self) -> dict:
+        """{(questionnaire_type, question_id): unique_question_id}"""
+        rows = self.client.table('question_identity_mapping').select(
+            'questionnaire_type, question_id, unique_question_id'
+        ).execute().data or []
+        return {(row['questionnaire_type'], row['question_id']): row['unique_question_id'] for row in rows}
+
+    def get_question_stats(self, unique_question_id: int):
+        """
+        (respondents, {option_value: count}) from the running distributions
+        maintained by submit_questionnaire (migrations/05_question_option_counts.sql).
+        """
+        respondents = self.client.table('question_respondent_counts').select(
+            'respondents'
+        ).eq('unique_question_id', unique_question_id).execute().data or []
+        options = self.client.table('question_option_counts').select(
+            'option_value, count'
+        ).eq('unique_question_id', unique_question_id).execute().data or []
+        return (
+            respondents[0]['respondents'] if respondents else 0,
+            {row['option_value']: row['count'] for row in options}
+        )
+
+
+# SQLite equivalents of the plpgsql triggers and seed rows in migrations/
+_SQLITE_LOCAL_SCHEMA = """
+INSERT OR IGNORE INTO intro_choice_counts (choice, count) VALUES ('yes', 0), ('no', 0);
+
+CREATE TRIGGER IF NOT EXISTS intro_choice_counts_insert
+AFTER INSERT ON intro_choices
+BEGIN
+    UPDATE intro_choice_counts SET count = count + 1, updated_at = CURRENT_TIMESTAMP WHERE choice = NEW.choice;
+END;
+
+CREATE TRIGGER IF NOT EXISTS intro_choice_counts_update
+AFTER UPDATE OF choice ON intro_choices
+WHEN NEW.choice IS NOT OLD.choice
+BEGIN
+    UPDATE intro_choice_counts SET count = count - 1, updated_at = CURRENT_TIMESTAMP WHERE choice = OLD.choice;
+    UPDATE intro_choice_counts SET count = count + 1, updated_at = CURRENT_TIMESTAMP WHERE choice = NEW.choice;
+END;
+
+CREATE TRIGGER IF NOT EXISTS intro_choice_counts_delete
+AFTER DELETE ON intro_choices
+BEGIN
+    UPDATE intro_choice_counts SET count = count - 1, updated_at = CURRENT_TIMESTAMP WHERE choice = OLD.choice;
+END;
+"""
+
+
+def _split_sql(script: str) -> list[str]:
+    """Split a migration into statements, keeping $$-quoted function bodies intact."""
+    statements, current, in_dollar = [], [], False
+    for part in re.split(r'(\$\$|;)', script):
+        if part == '$$':
+            in_dollar = not in_dollar
+        if part == ';' and not in_dollar:
+            statement = ''.join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+        else:
+            current.append(part)
+    tail = ''.join(current).strip()
+    if tail:
+        statements.append(tail)
+    return statements
+
+
+def _strip_comments(script: str) -> str:
+    return '\n'.join(line for line in script.splitlines() if not line.strip().startswith('--'))
+
+
+def _to_sqlite(statement: str) -> str:
+    statement = re.sub(r'\bSERIAL PRIMARY KEY\b', 'INTEGER PRIMARY KEY AUTOINCREMENT', statement)
+    statement = re.sub(r'\bSERIAL\b', 'INTEGER', statement)
+    statement = re.sub(r'TIMESTAMP WITH TIME ZONE DEFAULT NOW\(\)', 'TEXT DEFAULT CURRENT_TIMESTAMP', statement)
+    return statement
+
+
+_ADD_COLUMN = re.compile(
+    r'ALTER TABLE (?:IF EXISTS )?(\w+)\s+ADD COLUMN (?:IF NOT EXISTS )?(\w+)\s+(.*)', re.S | re.I
+)
+
+
+def _apply_migration(conn, script: str):
+    """
+    Run the portable subset of a Postgres migration on SQLite: CREATE TABLE,
+    CREATE [UNIQUE] INDEX and ALTER TABLE ... ADD COLUMN. Row level security,
+    policies, plpgsql functions/triggers and seed queries are Postgres-only and
+    have hand-written equivalents in _SQLITE_LOCAL_SCHEMA where they matter.
+    """
+    for statement in _split_sql(_strip_comments(script)):
+        upper = statement.upper()
+        if upper.startswith(('CREATE TABLE', 'CREATE INDEX', 'CREATE UNIQUE INDEX')):
+            conn.execute(_to_sqlite(statement))
+        elif upper.startswith('ALTER TABLE') and 'ADD COLUMN' in upper:
+            table, column, definition = _ADD_COLUMN.match(statement).groups()
+            existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+            # Postgres' IF EXISTS / IF NOT EXISTS, which SQLite lacks
+            if existing and column not in existing:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {_to_sqlite(definition)}')
+
+
+class SQLiteStorage:
+    """
+    Local stand-in for SupabaseStorage. One connection is shared by all threads
+    and serialized with a lock, which is enough for profiling the API.
+    """
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        with self._lock:
+            if path != ':memory:':
+                self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA foreign_keys=ON')
+            for migration in sorted(glob.glob(os.path.join(MIGRATIONS_DIR, '*.sql'))):
+                with open(migration, 'r', encoding='utf-8') as f:
+                    _apply_migration(self._conn, f.read())
+            self._conn.executescript(_SQLITE_LOCAL_SCHEMA)
+            self._seed_question_mapping()
+
+    def _seed_question_mapping(self):
+        """Load database/question_mapping.json, as database/bulk_load.py does on Supabase."""
+        if self._conn.execute('SELECT 1 FROM question_identity_mapping LIMIT 1').fetchone():
+            return
+        try:
+            with open(os.path.join(DATABASE_DIR, 'question_mapping.json'), 'r', encoding='utf-8') as f:
+                mapping = json.load(f)
+            with open(os.path.join(DATABASE_DIR, 'unique_questions.json'), 'r', encoding='utf-8') as f:
+                unique_questions = json.load(f)
+        except FileNotFoundError:
+            return
+        rows = []
+        for key, unique_id in mapping.items():
+            questionnaire_type, question_id = key.split(':')
+            question_type = unique_questions.get(str(unique_id), {}).get('type')
+            rows.append((questionnaire_type, int(question_id), unique_id, question_type))
+        self._conn.executemany(
+            'INSERT OR IGNORE INTO question_identity_mapping '
+            '(questionnaire_type, question_id, unique_question_id, question_type) VALUES (?, ?, ?, ?)',
+            rows
+        )
+
+    def _query(self, sql: str, params=()) -> list[dict]:
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            self._conn.execute(sql, params)
+
+    # intro_choices
+
+    def upsert_intro_choices(self, rows: list[dict]):
+        with self._lock:
+            self._conn.executemany(
+                'INSERT INTO intro_choices (user_id, choice) VALUES (:user_id, :choice) '
+                'ON CONFLICT (user_id) DO UPDATE SET choice = excluded.choice, updated_at = CURRENT_TIMESTAMP',
+                rows
+            )
+
+    def get_intro_counts(self) -> tuple[dict, str | None]:
+        rows = self._query('SELECT choice, count, updated_at FROM intro_choice_counts')
+        return {row['choice']: row['count'] for row in rows}, max((row['updated_at'] for row in rows), default=None)
+
+    # questionnaire_submissions / question_answers
+
+    def save_submission(self, user_id: str, questionnaire_type: str, answers: list[dict],
+                        corporate_role: str | None = None, idempotency_key: str | None = None):
+        return self.save_submissions([{
+            'user_id': user_id,
+            'questionnaire_type': questionnaire_type,
+            'answers': answers,
+            'corporate_role': corporate_role,
+            'idempotency_key': idempotency_key,
+        }])[0]
+
+    def save_submissions(self, submissions: list[dict]) -> list[tuple[int, bool]]:
+        with self._lock:
+            conn = self._conn
+            conn.execute('BEGIN')
+            try:
+                results = [self._insert_submission(**submission) for submission in submissions]
+                conn.execute('COMMIT')
+                return results
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def _insert_submission(self, user_id: str, questionnaire_type: str, answers: list[dict],
+                           corporate_role: str | None = None, idempotency_key: str | None = None):
+        """submit_questionnaire() from migrations/04_submit_questionnaire.sql, inside the caller's transaction."""
+        conn = self._conn
+        row = conn.execute(
+            'INSERT INTO questionnaire_submissions (user_id, questionnaire_type, corporate_role, idempotency_key) '
+            'VALUES (?, ?, ?, ?) ON CONFLICT (user_id, idempotency_key) DO NOTHING RETURNING id',
+            (user_id, questionnaire_type, corporate_role, idempotency_key)
+        ).fetchone()
+        if row is None:
+            existing = conn.execute(
+                'SELECT id FROM questionnaire_submissions WHERE user_id = ? AND idempotency_key = ?',
+                (user_id, idempotency_key)
+            ).fetchone()
+            return existing['id'], False
+        submission_id = row['id']
+        conn.executemany(
+            'INSERT INTO question_answers (submission_id, question_id, response_value) VALUES (?, ?, ?)',
+            [(submission_id, int(a['question_id']), _as_text(a['response_value'])) for a in answers]
+        )
+        self._add_question_option_counts(questionnaire_type, answers)
+        return submission_id, True
+
+    def _add_question_option_counts(self, questionnaire_type: str, answers: list[dict]):
+        """add_question_option_counts() from migrations/05_question_option_counts.sql."""
+        placeholders = ', '.join('?' * len(CHOICE_QUESTION_TYPES))
+        mapping = {
+            row['question_id']: row['unique_question_id']
+            for row in self._conn.execute(
+                'SELECT question_id, unique_question_id FROM question_identity_mapping '
+                f'WHERE questionnaire_type = ? AND question_type IN ({placeholders})',
+                (questionnaire_type, *CHOICE_QUESTION_TYPES)
+            )
+        }
+        option_counts, respondents = {}, set()
+        for answer in answers:
+            unique_id = mapping.get(int(answer['question_id']))
+            if unique_id is None:
+                continue
+            for option in answer_options(_as_text(answer['response_value'])):
+                option_counts[(unique_id, option)] = option_counts.get((unique_id, option), 0) + 1
+                respondents.add(unique_id)
+        self._conn.executemany(
+            'INSERT INTO question_option_counts (unique_question_id, option_value, count) VALUES (?, ?, ?) '
+            'ON CONFLICT (unique_question_id, option_value) DO UPDATE SET count = count + excluded.count, '
+            'updated_at = CURRENT_TIMESTAMP',
+            [(unique_id, option, count) for (unique_id, option), count in option_counts.items()]
+        )
+        self._conn.executemany(
+            'INSERT INTO question_respondent_counts (unique_question_id, respondents) VALUES (?, 1) '
+            'ON CONFLICT (unique_question_id) DO UPDATE SET respondents = respondents + 1, '
+            'updated_at = CURRENT_TIMESTAMP',
+            [(unique_id,) for unique_id in respondents]
+        )
+
+    def list_submissions(self, user_id: str, limit: int | None = None, after_id: int | None = None) -> list[dict]:
+        sql = f'SELECT {SUBMISSION_COLUMNS} FROM questionnaire_submissions WHERE user_id = ?'
+        params = [user_id]
+        if after_id is not None:
+            sql += ' AND id > ?'
+            params.append(after_id)
+        sql += ' ORDER BY id'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+
+        return self._query_with_answers(sql, params)
+
+    def get_submission(self, submission_id: int) -> dict | None:
+        rows = self._query_with_answers(
+            f'SELECT {SUBMISSION_COLUMNS} FROM questionnaire_submissions WHERE id = ?', (submission_id,),
+            answer_columns='submission_id, question_id, response_value'
+        )
+        return rows[0] if rows else None
+
+    def scan_submissions(self, after_id: int | None = None, limit: int = 500,
+                         questionnaire_type: str | None = None, updated_since: datetime | None = None,
+                         columns: str = SUBMISSION_COLUMNS) -> list[dict]:
+        sql = f'SELECT {columns} FROM questionnaire_submissions WHERE id > ?'
+        params = [after_id if after_id is not None else -1]
+        if questionnaire_type is not None:
+            sql += ' AND questionnaire_type = ?'
+            params.append(questionnaire_type)
+        if updated_since is not None:
+            sql += ' AND updated_at >= ?'
+            params.append(_sqlite_timestamp(updated_since))
+        sql += ' ORDER BY id LIMIT ?'
+        params.append(limit)
+        return self._query_with_answers(sql, params, answer_columns='submission_id, question_id, response_value')
+
+    def _query_with_answers(self, sql: str, params=(), answer_columns: str = '*') -> list[dict]:
+        """Submission rows from `sql` with their question_answers attached under 'answers'."""
+        answers = []
+        with self._lock:
+            rows = self._query(sql, params)
+            if rows:
+                ids = [row['id'] for row in rows]
+                placeholders = ', '.join('?' * len(ids))
+                answers = self._query(
+                    f'SELECT {answer_columns} FROM question_answers WHERE submission_id IN ({placeholders}) '
+                    'ORDER BY id', ids
+                )
+        by_submission = {row['id']: [] for row in rows}
+        for answer in answers:
+            by_submission[answer['submission_id']].append(answer)
+        for row in rows:
+            row['answers'] = by_submission[row['id']]
+        return rows
+
+    def submission_exists(self, user_id: str) -> bool:
+        return bool(self._query('SELECT 1 FROM questionnaire_submissions WHERE user_id = ? LIMIT 1', (user_id,)))
+
+    def get_submission_version(self, user_id: str) -> tuple[int, int | None, str | None]:
+        with self._lock:
+            count = self._query('SELECT COUNT(*) AS count FROM questionnaire_submissions WHERE user_id = ?', (user_id,))
+            latest = self._query(
+                'SELECT id, updated_at FROM questionnaire_submissions WHERE user_id = ? '
+                'ORDER BY updated_at DESC, id DESC LIMIT 1', (user_id,)
+            )
+        return count[0]['count'], latest[0]['id'] if latest else None, latest[0]['updated_at'] if latest else None
+
+    def list_submission_answer_counts(self, user_id: str) -> list[dict]:
+        return self._query(
+            'SELECT s.id, s.questionnaire_type, s.created_at, s.updated_at, COUNT(a.id) AS answer_count '
+            'FROM questionnaire_submissions s LEFT JOIN question_answers a ON a.submission_id = s.id '
+            'WHERE s.user_id = ? GROUP BY s.id ORDER BY s.id',
+            (user_id,)
+        )
+
+    # questionnaire_drafts
+
+    def get_draft(self, user_id: str) -> dict | None:
+        rows = self._query(f'SELECT {DRAFT_COLUMNS} FROM questionnaire_drafts WHERE user_id = ?', (user_id,))
+        if not rows:
+            return None
+        return {**rows[0], 'answers': json.loads(rows[0]['answers'])}
+
+    def patch_draft(self, user_id: str, version: int, questionnaire_type: str,
+                    corporate_role: str | None, answers: dict, first_version: int | None = None) -> tuple[int, bool]:
+        with self._lock:
+            conn = self._conn
+            conn.execute('BEGIN')
+            try:
+                row = conn.execute(
+                    'SELECT questionnaire_type, answers, version FROM questionnaire_drafts WHERE user_id = ?',
+                    (user_id,)
+                ).fetchone()
+                if row is not None and row['version'] >= min(version, first_version or version):
+                    conn.execute('COMMIT')
+                    return row['version'], False
+                same_type = row is not None and row['questionnaire_type'] == questionnaire_type
+                merged = {**(json.loads(row['answers']) if same_type else {}), **answers}
+                conn.execute(
+                    'INSERT INTO questionnaire_drafts (user_id, questionnaire_type, corporate_role, answers, version) '
+                    'VALUES (?, ?, ?, ?, ?) ON CONFLICT (user_id) DO UPDATE SET '
+                    'questionnaire_type = excluded.questionnaire_type, '
+                    'corporate_role = COALESCE(excluded.corporate_role, corporate_role), '
+                    'answers = excluded.answers, version = excluded.version, updated_at = CURRENT_TIMESTAMP',
+                    (user_id, questionnaire_type, corporate_role,
+                     json.dumps({key: value for key, value in merged.items() if value is not None}), version)
+                )
+                conn.execute('COMMIT')
+                return version, True
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def promote_draft(self, user_id: str, version: int | None = None, idempotency_key: str | None = None) -> dict:
+        with self._lock:
+            conn = self._conn
+            conn.execute('BEGIN')
+            try:
+                draft = conn.execute(
+                    'SELECT id, questionnaire_type, corporate_role, answers, version FROM questionnaire_drafts '
+                    'WHERE user_id = ?', (user_id,)
+                ).fetchone()
+                answers = json.loads(draft['answers']) if draft is not None else {}
+                if draft is None:
+                    existing = conn.execute(
+                        'SELECT id FROM questionnaire_submissions WHERE user_id = ? AND idempotency_key = ?',
+                        (user_id, idempotency_key)
+                    ).fetchone()
+                    result = {'submission_id': existing['id'], 'created': False} if existing else {'status': 'not_found'}
+                elif version is not None and draft['version'] != version:
+                    result = {'status': 'conflict', 'version': draft['version']}
+                elif not answers:
+                    result = {'status': 'empty', 'version': draft['version']}
+                else:
+                    conn.execute('DELETE FROM questionnaire_drafts WHERE id = ?', (draft['id'],))
+                    submission_id, created = self._insert_submission(
+                        user_id, draft['questionnaire_type'],
+                        [{'question_id': int(question_id), 'response_value': answers[question_id]}
+                         for question_id in sorted(answers, key=int)],
+                        draft['corporate_role'], idempotency_key
+                    )
+                    result = {'submission_id': submission_id, 'created': created}
+                conn.execute('COMMIT')
+                return result
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    # users
+
+    def find_user(self, columns: str = '*', **match) -> dict | None:
+        where = ' AND '.join(f'{column} = ?' for column in match)
+        rows = self._query(f'SELECT {columns} FROM users WHERE {where} LIMIT 1', list(match.values()))
+        return rows[0] if rows else None
+
+    def upsert_user(self, row: dict):
+        columns = ', '.join(row)
+        placeholders = ', '.join('?' * len(row))
+        assignments = ', '.join(f'{column} = excluded.{column}' for column in row if column != 'user_id')
+        self._execute(
+            f'INSERT INTO users ({columns}) VALUES ({placeholders}) '
+            f'ON CONFLICT (user_id) DO UPDATE SET {assignments}, updated_at = CURRENT_TIMESTAMP',
+            list(row.values())
+        )
+
+    def update_user(self, user_id: str, fields: dict):
+        assignments = ', '.join(f'{column} = ?' for column in fields)
+        self._execute(
+            f'UPDATE users SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE user_id = ?',
+            [*fields.values(), user_id]
+        )
+
+    # question_identity_mapping
+
+    def get_question_mapping(self) -> dict:
+        rows = self._query('SELECT questionnaire_type, question_id, unique_question_id FROM question_identity_mapping')
+        return {(row['questionnaire_type'], row['question_id']): row['unique_question_id'] for row in rows}
+
+    def get_question_stats(self, unique_question_id: int):
+        with self._lock:
+            respondents = self._query(
+                'SELECT respondents FROM question_respondent_counts WHERE unique_question_id = ?', (unique_question_id,)
+            )
+            options = self._query(
+                'SELECT option_value, count FROM question_option_counts WHERE unique_question_id = ?', (unique_question_id,)
+            )
+        return (
+            respondents[0]['respondents'] if respondents else 0,
+            {row['option_value']: row['count'] for row in options}
+        )
+
+
+def answer_options(response_value: str) -> list[str]:
+    """The option(s) an answer selected; multi-select answers are stored as a JSON array."""
+    if response_value.startswith('['):
+        try:
+            values = json.loads(response_value)
+        except ValueError:
+            return []
+        return sorted({str(v) for v in values if v != ''}) if isinstance(values, list) else []
+    return [response_value] if response_value else []
+
+
+def _sqlite_timestamp(value: datetime) -> str:
+    # CURRENT_TIMESTAMP's format (UTC, space separated), so text comparison orders correctly
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _as_text(value) -> str:
+    # Postgres' `answer->>'response_value'` renders non-strings as JSON text
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def create_storage(backend: str = STORAGE_BACKEND):
+    if backend == 'sqlite':
+        return SQLiteStorage(SQLITE_PATH)
+    if backend != 'supabase':
+        raise ValueError(f'Unknown CHON_STORAGE backend: {backend}')
+
+    supabase_url = os.getenv("SUPABASE_URL")
+    supabase_key = os.getenv("SUPABASE_KEY")
+    if not (supabase_url and supabase_key):
+        # Fail on first use rather than at import, so the app can still start
+        print("Warning: Supabase credentials not found")
+
+    # The HTTP client itself is created on the first query
+    return SupabaseStorage(supabase_url, supabase_key)
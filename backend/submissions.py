@@ -0,0 +1,44 @@
+import os
+import sys
+
+MAX_IDEMPOTENCY_KEY_LENGTH = 100
+
+
+def save_submission(db, user_id: str, questionnaire_type: str, answers: list[dict],
+                    corporate_role: str | None = None, idempotency_key: str | None = None):
+    """
+    Insert a submission and all of its answers atomically.
+    Returns (submission_id, created); `created` is False when `idempotency_key`
+    was already used by this user and the original submission id is returned.
+    """
+    submission_id, created = db.save_submission(user_id, questionnaire_type, answers, corporate_role, idempotency_key)
+    if created:
+        index_submission(db, submission_id, answers)
+    return submission_id, created
+
+
+def _indexing() -> bool:
+    # The index (and numpy) is only loaded by processes sharing an index file
+    # or serving similarity queries; everyone else skips the import
+    return 'similarity' in sys.modules or bool(os.getenv('CHON_SIMILARITY_INDEX_PATH'))
+
+
+def index_submission(db, submission_id: int, answers: list[dict]):
+    """Add a new submission to the similar-respondents index, if this process keeps one."""
+    if not _indexing():
+        return
+    import similarity
+    try:
+        similarity.add_submission(db, submission_id, answers)
+    except Exception as e:
+        # The submission is saved; the index catches up from the database when next opened
+        print(f"Error indexing submission {submission_id}: {e}")
+
+
+def index_stored_submission(db, submission_id: int):
+    """index_submission() for a submission written without its answers passing through here (a promoted draft)."""
+    if not _indexing():
+        return
+    submission = db.get_submission(submission_id)
+    if submission is not None:
+        index_submission(db, submission_id, submission['answers'])
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The backend modules import each other as top-level modules (as app.py runs them)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Never reach Supabase from the tests; app.py creates its storage at import
+os.environ.setdefault('CHON_STORAGE', 'sqlite')
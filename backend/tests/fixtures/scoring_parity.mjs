@@ -0,0 +1,44 @@
+// Recompute the "expected" stats in scoring_parity.json with the frontend's
+// own calculateTagStatsFromLocalAnswers (frontend/src/utils/scoring.ts).
+// Run after changing scoring.ts or questions.ts:
+//
+//   npm ci --prefix frontend && node backend/tests/fixtures/scoring_parity.mjs
+import fs from 'fs';
+import os from 'os';
+import path from 'path';
+import { createRequire } from 'module';
+import { fileURLToPath, pathToFileURL } from 'url';
+
+const here = path.dirname(fileURLToPath(import.meta.url));
+const frontend = path.join(here, '..', '..', '..', 'frontend');
+const ts = createRequire(path.join(frontend, 'package.json'))('typescript');
+
+const build = fs.mkdtempSync(path.join(os.tmpdir(), 'scoring-parity-'));
+const transpile = (source, target, rewrite = s => s) => {
+  const { outputText } = ts.transpileModule(fs.readFileSync(path.join(frontend, 'src', source), 'utf8'), {
+    compilerOptions: { module: ts.ModuleKind.ESNext, target: ts.ScriptTarget.ES2020 }
+  });
+  fs.writeFileSync(path.join(build, target), rewrite(outputText));
+};
+transpile('features/personality-test/data/questions.ts', 'questions.mjs');
+transpile('utils/scoring.ts', 'scoring.mjs', s => s.replace(/from ['"][^'"]*\/data\/questions(\.ts)?['"]/, "from './questions.mjs'"));
+
+const store = {};
+globalThis.localStorage = {
+  getItem: key => (key in store ? store[key] : null),
+  setItem: (key, value) => { store[key] = String(value); },
+  removeItem: key => { delete store[key]; }
+};
+const { calculateTagStatsFromLocalAnswers } = await import(pathToFileURL(path.join(build, 'scoring.mjs')));
+
+const fixturePath = path.join(here, 'scoring_parity.json');
+const fixture = JSON.parse(fs.readFileSync(fixturePath, 'utf8'));
+for (const testCase of fixture.cases) {
+  const stored = Object.fromEntries(Object.entries(testCase.answers).map(([id, value]) => [id, { value }]));
+  store['chon_personality_answers'] = JSON.stringify(stored);
+  delete store['tagStats'];
+  testCase.expected = calculateTagStatsFromLocalAnswers();
+}
+fs.writeFileSync(fixturePath, JSON.stringify(fixture, null, 1) + '\n');
+fs.rmSync(build, { recursive: true });
+console.log(`Updated ${fixture.cases.length} cases in ${fixturePath}`);
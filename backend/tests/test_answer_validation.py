@@ -0,0 +1,118 @@
+import json
+
+import pytest
+
+import answer_validation
+import catalog
+
+CLIENT_CATALOG = catalog.load_client_catalog()
+QUESTIONS = {question['id']: question for question in CLIENT_CATALOG['questions']}
+
+
+def _frontend_value(question: dict):
+    """An answer as the questionnaire page stores it."""
+    if question['type'] == 'multiple-choice':
+        return question['options'][-1]
+    if question['type'] == 'multi-select':
+        return question['options'][1:3]
+    if question['type'] == 'scale-question':
+        return '4'
+    return 'Shanghai'
+
+
+def _frontend_payload(questionnaire_type: str, question_ids) -> dict:
+    """The body saveAllQuestionResponses (frontend/src/api/questionnaire.ts) posts."""
+    return {
+        'user_id': 'user_1718000000000_abc123xyz',
+        'type': questionnaire_type,
+        'corporate_role': 'founder' if questionnaire_type in ('corporate', 'both') else None,
+        'answers': [
+            {'question_id': question_id,
+             'response_value': json.dumps(value) if isinstance(value, list) else value}
+            for question_id, value in ((qid, _frontend_value(QUESTIONS[qid])) for qid in question_ids)
+        ],
+    }
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(answer_validation, 'VALIDATE_ANSWERS', True)
+    import app
+    return app.app.test_client()
+
+
+@pytest.mark.parametrize('questionnaire_type', sorted(CLIENT_CATALOG['menus']))
+def test_frontend_submission_is_accepted(client, questionnaire_type):
+    payload = _frontend_payload(questionnaire_type, CLIENT_CATALOG['menus'][questionnaire_type])
+    response = client.post('/api/batch-question-responses', json=payload)
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['success'] is True
+
+
+def test_mother_submission_with_global_ids(client):
+    # Ids from menu.ts, numbered across questionnaires: mother starts at 2-5, then 52+
+    payload = {'user_id': 'mother_1', 'type': 'mother', 'answers': [
+        {'question_id': 2, 'response_value': 'C'},
+        {'question_id': 3, 'response_value': 'China'},
+        {'question_id': 4, 'response_value': 'A'},
+        {'question_id': 5, 'response_value': 'C'},
+        {'question_id': 52, 'response_value': '2'},
+        {'question_id': 53, 'response_value': '["B","C"]'},
+        {'question_id': 56, 'response_value': 'E'},
+        {'question_id': 59, 'response_value': '5'},
+        {'question_id': 80, 'response_value': '1'},
+    ]}
+    response = client.post('/api/batch-question-responses', json=payload)
+    assert response.status_code == 200, response.get_json()
+
+
+def test_answers_kept_from_another_identity_are_accepted(client):
+    # The frontend keeps answers when the user goes back and picks another identity
+    question_ids = CLIENT_CATALOG['menus']['mother'] + [1, 6, 7, 45]
+    response = client.post('/api/batch-question-responses', json=_frontend_payload('mother', question_ids))
+    assert response.status_code == 200, response.get_json()
+
+
+@pytest.mark.parametrize('question_id, value', [
+    (999, 'A'),      # not in the catalog
+    (59, '6'),       # scale questions are 1-5
+    (2, 'Z'),        # not an option of question 2
+    (53, '["Q"]'),   # not an option of the multi-select
+    (3, '   '),      # blank text
+])
+def test_invalid_answers_are_rejected(client, question_id, value):
+    payload = {'user_id': 'u', 'type': 'corporate', 'answers': [{'question_id': question_id, 'response_value': value}]}
+    response = client.post('/api/batch-question-responses', json=payload)
+    assert response.status_code == 400
+    assert response.get_json()['details']
+
+
+def _draft_patch(questionnaire_type: str, question_ids, version: int) -> dict:
+    """The body saveDraftPatch (frontend/src/api/questionnaire.ts) sends on autosave."""
+    answers = {}
+    for question_id in question_ids:
+        value = _frontend_value(QUESTIONS[question_id])
+        answers[str(question_id)] = json.dumps(value) if isinstance(value, list) else value
+    return {'type': questionnaire_type, 'version': version, 'answers': answers}
+
+
+@pytest.mark.parametrize('questionnaire_type', sorted(CLIENT_CATALOG['menus']))
+def test_frontend_draft_patch_is_accepted(client, questionnaire_type):
+    user_id = f'draft_{questionnaire_type}'
+    question_ids = CLIENT_CATALOG['menus'][questionnaire_type]
+    response = client.patch(f'/api/drafts/{user_id}', json=_draft_patch(questionnaire_type, question_ids[:10], 1))
+    assert response.status_code == 200, response.get_json()
+
+    # A later patch changes one answer and clears another
+    patch = _draft_patch(questionnaire_type, question_ids[10:12], 2)
+    patch['answers'][str(question_ids[0])] = None
+    response = client.patch(f'/api/drafts/{user_id}', json=patch)
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['version'] == 2
+
+
+def test_invalid_draft_patch_is_rejected(client):
+    response = client.patch('/api/drafts/draft_invalid', json={'type': 'mother', 'version': 1,
+                                                                'answers': {'59': '6', '999': 'A'}})
+    assert response.status_code == 400
+    assert len(response.get_json()['details']) == 2
@@ -0,0 +1,59 @@
+import threading
+import time
+
+import drafts
+import storage
+
+
+def _patch_together(writer: drafts.DraftWriter, user_id: str, patches: list) -> list:
+    """Send the patches from separate threads, 5 ms apart, so they land in one batch."""
+    results = [None] * len(patches)
+
+    def send(i):
+        results[i] = writer.patch(user_id, *patches[i])
+
+    threads = [threading.Thread(target=send, args=(i,)) for i in range(len(patches))]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.005)
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def _stored_at_v4():
+    db = storage.SQLiteStorage(':memory:')
+    for version in range(1, 5):
+        db.patch_draft('u1', version, 'mother', None, {'52': str(version)})
+    return db
+
+
+def test_newer_patches_are_merged_into_one_write():
+    db = _stored_at_v4()
+    results = _patch_together(drafts.DraftWriter(db, coalesce_ms=50), 'u1', [
+        (5, 'mother', None, {'1': 'A'}),
+        (6, 'mother', None, {'2': 'B', '52': None}),
+    ])
+    assert results == [(6, True), (6, True)]
+    draft = db.get_draft('u1')
+    assert (draft['version'], draft['answers']) == (6, {'1': 'A', '2': 'B'})
+
+
+def test_stale_patch_after_a_newer_one_is_not_written():
+    db = _stored_at_v4()
+    results = _patch_together(drafts.DraftWriter(db, coalesce_ms=50), 'u1', [
+        (5, 'mother', None, {'1': 'a'}),
+        (3, 'mother', None, {'2': 'stale'}),
+    ])
+    assert results == [(5, True), (5, False)]
+    assert db.get_draft('u1')['answers'] == {'1': 'a', '52': '4'}
+
+
+def test_stale_patch_before_a_newer_one_is_not_written():
+    db = _stored_at_v4()
+    results = _patch_together(drafts.DraftWriter(db, coalesce_ms=50), 'u1', [
+        (3, 'mother', None, {'2': 'stale'}),
+        (5, 'mother', None, {'1': 'a'}),
+    ])
+    assert results == [(4, False), (5, True)]
+    assert db.get_draft('u1')['answers'] == {'1': 'a', '52': '4'}
@@ -0,0 +1,33 @@
+import gzip
+
+import pytest
+
+import export
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(export, 'EXPORT_TOKEN', 's3cret')
+    import app
+    return app.app.test_client()
+
+
+def test_export_needs_the_token(client):
+    assert client.get('/api/export/submissions').status_code == 401
+    response = client.get('/api/export/submissions', headers={'Authorization': 'Bearer wrong'})
+    assert response.status_code == 401
+
+
+@pytest.mark.parametrize('accept_encoding, compressed', [
+    ('gzip', True),
+    ('br, gzip;q=0.5', True),
+    ('gzip;q=0', False),
+    ('identity', False),
+])
+def test_export_gzips_only_when_accepted(client, accept_encoding, compressed):
+    response = client.get('/api/export/submissions?format=csv',
+                          headers={'Authorization': 'Bearer s3cret', 'Accept-Encoding': accept_encoding})
+    assert response.status_code == 200
+    assert (response.headers.get('Content-Encoding') == 'gzip') is compressed
+    body = gzip.decompress(response.data) if compressed else response.data
+    assert body.startswith(b'submission_id,')
@@ -0,0 +1,23 @@
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def client():
+    import app
+    return app.app.test_client()
+
+
+def test_metrics_are_disabled_without_a_token(client, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_TOKEN', None)
+    assert client.get('/api/metrics').status_code == 404
+
+
+def test_metrics_need_the_token(client, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_TOKEN', 's3cret')
+    assert client.get('/api/metrics').status_code == 401
+    assert client.get('/api/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/api/metrics', headers={'Authorization': 'Bearer s3cret'})
+    assert response.status_code == 200
+    assert b'# TYPE' in response.data
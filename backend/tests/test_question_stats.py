@@ -0,0 +1,63 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+DATABASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'database')
+
+with open(os.path.join(DATABASE_DIR, 'question_mapping.json'), 'r', encoding='utf-8') as f:
+    MAPPING = json.load(f)
+with open(os.path.join(DATABASE_DIR, 'unique_questions.json'), 'r', encoding='utf-8') as f:
+    UNIQUE_QUESTIONS = json.load(f)
+
+
+@pytest.fixture
+def app():
+    import app
+    return app
+
+
+def _stats(app, question_id: int) -> tuple[int, dict]:
+    return app.db.get_question_stats(MAPPING[f'mother:{question_id}'])
+
+
+def test_mapping_is_keyed_by_frontend_ids():
+    # questions.ts ids are global: a question maps to one unique question whatever the questionnaire
+    assert UNIQUE_QUESTIONS[str(MAPPING['mother:2'])]['textEn'] == 'What is your age range?'
+    for questionnaire_type in ('corporate', 'other', 'both'):
+        assert MAPPING[f'{questionnaire_type}:2'] == MAPPING['mother:2']
+
+
+def test_frontend_submission_is_counted_per_option(app):
+    # The body saveAllQuestionResponses sends for the first mother questions (menu.ts ids)
+    answers = {2: 'C', 3: 'China', 53: '["B","C"]', 56: 'E', 59: '5'}
+    before = {question_id: _stats(app, question_id) for question_id in answers}
+
+    response = app.app.test_client().post('/api/batch-question-responses', json={
+        'user_id': 'stats_1', 'type': 'mother',
+        'answers': [{'question_id': question_id, 'response_value': value} for question_id, value in answers.items()],
+    })
+    assert response.status_code == 200, response.get_json()
+
+    def added(question_id):
+        respondents, counts = _stats(app, question_id)
+        old_respondents, old_counts = before[question_id]
+        return respondents - old_respondents, {
+            option: count - old_counts.get(option, 0) for option, count in counts.items()
+            if count != old_counts.get(option, 0)
+        }
+
+    assert added(2) == (1, {'C': 1})
+    assert added(56) == (1, {'E': 1})
+    assert added(53) == (1, {'B': 1, 'C': 1})
+    assert added(59) == (1, {'5': 1})
+    assert added(3) == (0, {})  # free text is not a distribution
+
+
+def test_question_mapping_is_current():
+    # question_mapping.json must be regenerated whenever questions.ts or menu.ts change
+    result = subprocess.run([sys.executable, os.path.join(DATABASE_DIR, 'generate_mapping.py'), '--check'],
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
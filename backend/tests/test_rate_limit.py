@@ -0,0 +1,27 @@
+import pytest
+
+import rate_limit
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def limiter(request, tmp_path):
+    spec = 'memory' if request.param == 'memory' else f'sqlite:{tmp_path / "buckets.db"}'
+    return rate_limit.AuthLimiter(rate_limit.create_store(spec))
+
+
+def test_rejected_attempt_takes_no_ip_token(limiter):
+    identity_attempts = [limiter.check('203.0.113.7', 'email:a@example.com') for _ in range(rate_limit.IDENTITY_BURST + 3)]
+    assert identity_attempts.count(0.0) == rate_limit.IDENTITY_BURST
+
+    # The three attempts rejected by the identity bucket left the IP bucket alone
+    remaining = rate_limit.IP_BURST - rate_limit.IDENTITY_BURST
+    others = [limiter.check('203.0.113.7', f'email:{i}@example.com') for i in range(remaining + 1)]
+    assert others[:remaining] == [0.0] * remaining
+    assert others[-1] > 0
+
+
+def test_forwarded_for_needs_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(rate_limit, 'TRUSTED_PROXIES', 0)
+    assert rate_limit.client_ip('10.0.0.1', '198.51.100.2') == '10.0.0.1'
+    monkeypatch.setattr(rate_limit, 'TRUSTED_PROXIES', 1)
+    assert rate_limit.client_ip('10.0.0.1', '192.0.2.9, 198.51.100.2') == '198.51.100.2'
@@ -0,0 +1,41 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import scoring
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+DATABASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'database')
+
+with open(os.path.join(FIXTURES, 'scoring_parity.json'), encoding='utf-8') as f:
+    CASES = json.load(f)['cases']
+
+
+def _submission(answers: dict) -> dict:
+    """A stored submission, from answers shaped like the frontend's (saveAllQuestionResponses)."""
+    return {'answers': [
+        {'question_id': int(question_id),
+         'response_value': json.dumps(value, separators=(',', ':')) if isinstance(value, list) else value}
+        for question_id, value in answers.items()
+    ]}
+
+
+@pytest.mark.parametrize('case', CASES, ids=[case['name'] for case in CASES])
+def test_scores_match_frontend(case):
+    assert scoring.score_batch(case['type'], [_submission(case['answers'])])[0] == case['expected']
+
+
+def test_batch_scores_match_frontend():
+    # Several submissions through one matrix product, rows not mixed up
+    scores = scoring.score_batch('both', [_submission(case['answers']) for case in CASES])
+    assert scores == [case['expected'] for case in CASES]
+
+
+def test_client_catalog_is_current():
+    # client_catalog.json must be regenerated whenever questions.ts or menu.ts change
+    result = subprocess.run([sys.executable, os.path.join(DATABASE_DIR, 'generate_client_catalog.py'), '--check'],
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
@@ -0,0 +1,86 @@
+import json
+import random
+
+import numpy as np
+
+import catalog
+import similarity
+
+CLIENT_CATALOG = catalog.load_client_catalog()
+QUESTIONS = {question['id']: question for question in CLIENT_CATALOG['questions']}
+
+
+def _answers(rng: random.Random, questionnaire_type: str) -> list[dict]:
+    """Stored answers of a frontend submission (global ids from menu.ts, values as saveAllQuestionResponses sends)."""
+    answers = []
+    for question_id in CLIENT_CATALOG['menus'][questionnaire_type]:
+        question = QUESTIONS[question_id]
+        if question['type'] == 'scale-question':
+            value = rng.choice('12345')
+        elif question['type'] == 'multiple-choice':
+            value = rng.choice(question['options'])
+        elif question['type'] == 'multi-select':
+            value = json.dumps(rng.sample(question['options'], 2))
+        else:
+            value = 'Shanghai'
+        answers.append({'question_id': question_id, 'response_value': value})
+    return answers
+
+
+def test_frontend_answers_land_in_their_questions_columns():
+    layout = similarity.load_layout()
+    answers = [
+        {'question_id': 2, 'response_value': 'C'},       # age range: third option
+        {'question_id': 59, 'response_value': '5'},      # scale
+        {'question_id': 56, 'response_value': 'E'},      # options A, E
+        {'question_id': 53, 'response_value': '["B","C"]'},  # multi-select: not encoded
+        {'question_id': 3, 'response_value': 'China'},   # free text: not encoded
+    ]
+    vector = layout.encode(answers)
+    assert np.count_nonzero(vector) == 3
+    assert vector[layout.columns[2]] == 3
+    assert vector[layout.columns[59]] == 5
+    assert vector[layout.columns[56]] == 2
+
+
+def test_query_matches_brute_force_on_frontend_submissions():
+    rng = random.Random(7)
+    layout = similarity.load_layout()
+    index = similarity.SimilarityIndex(layout)
+    index._arrays = index._allocate(128)
+    types = sorted(CLIENT_CATALOG['menus'])
+    vectors = {}
+    for submission_id in range(1, 301):
+        vectors[submission_id] = layout.encode(_answers(rng, rng.choice(types)))
+        index.add(submission_id, vectors[submission_id])
+
+    for query_id in (1, 150, 300):
+        query = vectors[query_id]
+        expected = sorted(
+            ((int(np.count_nonzero((vector == query) & (query != 0))), submission_id)
+             for submission_id, vector in vectors.items() if submission_id != query_id),
+            key=lambda match: (-match[0], match[1])
+        )[:10]
+        result = index.query(query, 10, exclude_id=query_id)
+        assert [(r['matching_answers'], r['submission_id']) for r in result] == expected
+        # Submissions of different questionnaires still match on the questions they share
+        assert result[0]['matching_answers'] > 0
+
+
+def test_similar_respondents_route_compares_frontend_submissions():
+    import app
+    client = app.app.test_client()
+    rng = random.Random(11)
+    mother = _answers(rng, 'mother')
+    ids = []
+    for user_id, answers in (('sim_a', mother), ('sim_b', mother), ('sim_c', _answers(rng, 'corporate'))):
+        response = client.post('/api/batch-question-responses',
+                               json={'user_id': user_id, 'type': 'mother' if answers is mother else 'corporate',
+                                     'corporate_role': None, 'answers': answers})
+        assert response.status_code == 200, response.get_json()
+        ids.append(response.get_json()['submission_id'])
+
+    result = client.get(f'/api/similar-respondents/{ids[0]}?k=1').get_json()
+    encoded = int(np.count_nonzero(similarity.load_layout().encode(mother)))
+    assert result['compared_answers'] == encoded > 0
+    assert result['neighbors'] == [{'submission_id': ids[1], 'matching_answers': encoded}]
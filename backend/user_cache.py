@@ -0,0 +1,351 @@
+"""
+Read-through cache for the per-user submission reads behind
+/api/user-responses/<user_id> (exists, summary, versions, submissions).
+
+A user's submissions only change when a submission is saved for them, and
+every such write goes through this module's storage proxy, which drops that
+user's entries once it commits. Repeat reads (the frontend's existence check,
+profile views, revalidations) are then answered without a database call.
+
+CHON_USER_CACHE turns it on:
+    local                 -- in-process LRU of CHON_USER_CACHE_SIZE users;
+                             right for a single server process
+    sqlite:/path/file.db  -- plus a tier shared by the processes on one host
+    redis://host:6379/0   -- plus a tier shared by every instance (needs `redis`)
+Left unset, reads go straight to storage: with several processes and no
+shared tier, one process would not see another's invalidations.
+
+Each user has a generation that an invalidation advances; a value is only
+cached under the generation that was current before it was loaded, so a
+read racing a write never caches what the write replaced. With a shared
+tier, the generation lives there, and the local LRU is checked against it
+on every read. Entries also expire after CHON_USER_CACHE_TTL_SECONDS, which
+bounds staleness from writes made outside the API (bulk loads, manual edits).
+A shared tier that can't be reached turns lookups into misses.
+"""
+import asyncio
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import metrics
+from caching import LRUCache
+
+USER_CACHE = os.getenv('CHON_USER_CACHE', '')
+CACHE_SIZE = int(os.getenv('CHON_USER_CACHE_SIZE', '10000'))
+TTL_SECONDS = int(os.getenv('CHON_USER_CACHE_TTL_SECONDS', '3600'))
+
+# The storage reads that take user_id first and depend only on that user's submissions
+CACHED_READS = ('submission_exists', 'get_submission_version', 'list_submissions', 'list_submission_answer_counts')
+
+_MISSING = object()
+
+
+class SQLiteStore:
+    """Shared tier in a SQLite file: generations and JSON values per user."""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=1)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS user_cache_generations '
+                               '(user_id TEXT PRIMARY KEY, generation INTEGER NOT NULL)')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS user_cache_values (user_id TEXT, key TEXT, '
+                               'generation INTEGER, value TEXT, expires REAL, PRIMARY KEY (user_id, key))')
+
+    def get(self, user_id: str, key: str) -> tuple[int, str | None]:
+        """(the user's generation, the value cached for `key` under it or None)."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT IFNULL(g.generation, 0), v.value FROM (SELECT ? AS user_id) u '
+                'LEFT JOIN user_cache_generations g ON g.user_id = u.user_id '
+                'LEFT JOIN user_cache_values v ON v.user_id = u.user_id AND v.key = ? '
+                'AND v.generation = IFNULL(g.generation, 0) AND v.expires > ?',
+                (user_id, key, time.time())
+            ).fetchone()
+        return row[0], row[1]
+
+    def set(self, user_id: str, generation: int, key: str, value: str, ttl: int):
+        """Store `value` unless the user's generation has moved past `generation`."""
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO user_cache_values (user_id, key, generation, value, expires) '
+                'SELECT ?, ?, ?, ?, ? WHERE IFNULL((SELECT generation FROM user_cache_generations '
+                'WHERE user_id = ?), 0) = ? ON CONFLICT (user_id, key) DO UPDATE SET '
+                'generation = excluded.generation, value = excluded.value, expires = excluded.expires',
+                (user_id, key, generation, value, time.time() + ttl, user_id, generation)
+            )
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.execute(
+                    'INSERT INTO user_cache_generations (user_id, generation) VALUES (?, 1) '
+                    'ON CONFLICT (user_id) DO UPDATE SET generation = generation + 1', (user_id,)
+                )
+                self._conn.execute('DELETE FROM user_cache_values WHERE user_id = ?', (user_id,))
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+
+
+class RedisStore:
+    """Shared tier in Redis: one hash per user holding its generation and JSON values."""
+
+    _SET = """
+    if tonumber(redis.call('HGET', KEYS[1], 'gen') or '0') == tonumber(ARGV[1]) then
+        redis.call('HSET', KEYS[1], ARGV[2], ARGV[3])
+        redis.call('EXPIRE', KEYS[1], ARGV[4])
+    end
+    """
+    _INVALIDATE = """
+    local generation = (tonumber(redis.call('HGET', KEYS[1], 'gen')) or 0) + 1
+    redis.call('DEL', KEYS[1])
+    redis.call('HSET', KEYS[1], 'gen', generation)
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+    """
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('CHON_USER_CACHE=redis:// needs the redis package: pip install redis')
+        self._client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        self._set = self._client.register_script(self._SET)
+        self._invalidate = self._client.register_script(self._INVALIDATE)
+
+    def get(self, user_id: str, key: str) -> tuple[int, str | None]:
+        generation, value = self._client.hmget(f'chon:uc:{user_id}', 'gen', f'v:{key}')
+        return int(generation or 0), value.decode('utf-8') if value is not None else None
+
+    def set(self, user_id: str, generation: int, key: str, value: str, ttl: int):
+        self._set(keys=[f'chon:uc:{user_id}'], args=[generation, f'v:{key}', value, ttl])
+
+    def invalidate(self, user_id: str):
+        self._invalidate(keys=[f'chon:uc:{user_id}'], args=[TTL_SECONDS])
+
+
+def create_shared_store(spec: str):
+    if spec.startswith('sqlite:'):
+        return SQLiteStore(spec.removeprefix('sqlite:'))
+    if spec.startswith(('redis://', 'rediss://')):
+        return RedisStore(spec)
+    raise ValueError(f'Unknown CHON_USER_CACHE: {spec}')
+
+
+class UserReadCache:
+    """Local LRU of {user_id: (generation, expires_at, {read key: value})}, optionally over a shared store."""
+
+    def __init__(self, maxsize: int = CACHE_SIZE, ttl: int = TTL_SECONDS, shared=None):
+        self.local = LRUCache(maxsize, on_evict=lambda *_: metrics.USER_CACHE_EVICTIONS.inc(('local',)))
+        self.ttl = ttl
+        self.shared = shared
+        self._lock = threading.Lock()
+        # Local generations; any fresh number works, they are only compared for equality
+        self._generations = itertools.count(1)
+
+    def _entry(self, user_id: str):
+        entry = self.local.get(user_id)
+        return entry if entry is not None and entry[1] > time.monotonic() else None
+
+    def lookup(self, user_id: str, key: str):
+        """(cached value or _MISSING, generation to store a loaded value under)."""
+        if self.shared is None:
+            entry = self._entry(user_id)
+            value = entry[2].get(key, _MISSING) if entry is not None else _MISSING
+            metrics.USER_CACHE_LOOKUPS.inc(('miss' if value is _MISSING else 'local_hit',))
+            return value, entry[0] if entry is not None else None
+        try:
+            generation, raw = self.shared.get(user_id, key)
+        except Exception as e:
+            print(f"User cache store unavailable, reading from storage: {e}")
+            metrics.USER_CACHE_LOOKUPS.inc(('miss',))
+            return _MISSING, _MISSING
+        entry = self._entry(user_id)
+        if entry is not None and entry[0] == generation and key in entry[2]:
+            metrics.USER_CACHE_LOOKUPS.inc(('local_hit',))
+            return entry[2][key], generation
+        if raw is None:
+            metrics.USER_CACHE_LOOKUPS.inc(('miss',))
+            return _MISSING, generation
+        metrics.USER_CACHE_LOOKUPS.inc(('shared_hit',))
+        value = json.loads(raw)
+        self._store_local(user_id, generation, key, value)
+        return value, generation
+
+    def _store_local(self, user_id: str, generation, key: str, value) -> bool:
+        with self._lock:
+            entry = self._entry(user_id)
+            if self.shared is None:
+                if entry is None and generation is None:
+                    entry = (next(self._generations), time.monotonic() + self.ttl, {})
+                elif entry is None or entry[0] != generation:
+                    # Invalidated (or evicted) while this value was loading
+                    return False
+            elif entry is None or entry[0] < generation:
+                entry = (generation, time.monotonic() + self.ttl, {})
+            elif entry[0] > generation:
+                return False
+            self.local.set(user_id, (entry[0], entry[1], {**entry[2], key: value}))
+            return True
+
+    def store(self, user_id: str, generation, key: str, value):
+        if generation is _MISSING:
+            return
+        self._store_local(user_id, generation, key, value)
+        if self.shared is not None:
+            try:
+                self.shared.set(user_id, generation, key, json.dumps(value), self.ttl)
+            except Exception as e:
+                print(f"Error caching reads of user {user_id}: {e}")
+
+    def get_or_load(self, user_id: str, key: str, loader):
+        value, generation = self.lookup(user_id, key)
+        if value is _MISSING:
+            value = loader()
+            self.store(user_id, generation, key, value)
+        return value
+
+    async def aget_or_load(self, user_id: str, key: str, loader):
+        """get_or_load() for a coroutine function `loader`; shared-store calls run in a thread."""
+        if self.shared is None:
+            value, generation = self.lookup(user_id, key)
+        else:
+            value, generation = await asyncio.to_thread(self.lookup, user_id, key)
+        if value is _MISSING:
+            value = await loader()
+            if self.shared is None:
+                self.store(user_id, generation, key, value)
+            else:
+                await asyncio.to_thread(self.store, user_id, generation, key, value)
+        return value
+
+    def invalidate(self, user_id: str):
+        """Drop everything cached for `user_id`, here and in the shared store."""
+        if self.shared is None:
+            with self._lock:
+                # A fresh empty entry rather than none, so loads that started earlier can't be stored
+                self.local.set(user_id, (next(self._generations), time.monotonic() + self.ttl, {}))
+        else:
+            # The shared generation moves on, which both hides the local entry and refuses earlier loads
+            self.local.invalidate(user_id)
+            try:
+                self.shared.invalidate(user_id)
+            except Exception as e:
+                print(f"Error invalidating cached reads of user {user_id}: {e}")
+
+    @property
+    def blocking(self) -> bool:
+        """Whether invalidate() does I/O (and so should run off the event loop in the async app)."""
+        return self.shared is not None
+
+
+def _read_key(name: str, args: tuple) -> str:
+    return f"{name}:{json.dumps(args, separators=(',', ':'))}"
+
+
+class CachedStorage:
+    """
+    Storage proxy whose per-user submission reads (CACHED_READS) go through
+    the cache, and whose submission writes invalidate the user they created
+    a submission for. Everything else passes through.
+    """
+
+    def __init__(self, inner, cache: UserReadCache):
+        self._inner = inner
+        self.cache = cache
+
+    def __getattr__(self, name):
+        attr = getattr(self._inner, name)
+        if name not in CACHED_READS:
+            return attr
+
+        def read(user_id, *args):
+            return self.cache.get_or_load(user_id, _read_key(name, args), lambda: attr(user_id, *args))
+        return read
+
+    def save_submission(self, user_id: str, *args, **kwargs):
+        submission_id, created = self._inner.save_submission(user_id, *args, **kwargs)
+        if created:
+            self.cache.invalidate(user_id)
+        return submission_id, created
+
+    def save_submissions(self, submissions: list[dict]):
+        results = self._inner.save_submissions(submissions)
+        for submission, (_, created) in zip(submissions, results):
+            if created:
+                self.cache.invalidate(submission['user_id'])
+        return results
+
+    def promote_draft(self, user_id: str, *args, **kwargs) -> dict:
+        result = self._inner.promote_draft(user_id, *args, **kwargs)
+        if result.get('created'):
+            self.cache.invalidate(user_id)
+        return result
+
+
+class AsyncCachedStorage(CachedStorage):
+    """CachedStorage over async storage (asgi.py)."""
+
+    def __getattr__(self, name):
+        attr = getattr(self._inner, name)
+        if name not in CACHED_READS:
+            return attr
+
+        async def read(user_id, *args):
+            return await self.cache.aget_or_load(user_id, _read_key(name, args), lambda: attr(user_id, *args))
+        return read
+
+    async def _invalidate(self, user_id: str):
+        if self.cache.blocking:
+            await asyncio.to_thread(self.cache.invalidate, user_id)
+        else:
+            self.cache.invalidate(user_id)
+
+    async def save_submission(self, user_id: str, *args, **kwargs):
+        submission_id, created = await self._inner.save_submission(user_id, *args, **kwargs)
+        if created:
+            await self._invalidate(user_id)
+        return submission_id, created
+
+    async def save_submissions(self, submissions: list[dict]):
+        results = await self._inner.save_submissions(submissions)
+        for submission, (_, created) in zip(submissions, results):
+            if created:
+                await self._invalidate(submission['user_id'])
+        return results
+
+    async def promote_draft(self, user_id: str, *args, **kwargs) -> dict:
+        result = await self._inner.promote_draft(user_id, *args, **kwargs)
+        if result.get('created'):
+            await self._invalidate(user_id)
+        return result
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> UserReadCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                shared = create_shared_store(USER_CACHE) if USER_CACHE not in ('', 'local') else None
+                _cache = UserReadCache(shared=shared)
+    return _cache
+
+
+def cache_storage(db):
+    """`db` with cached per-user reads when CHON_USER_CACHE is set, else `db` itself."""
+    return CachedStorage(db, get_cache()) if USER_CACHE else db
+
+
+def cache_async_storage(db):
+    return AsyncCachedStorage(db, get_cache()) if USER_CACHE else db
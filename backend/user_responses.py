@@ -0,0 +1,127 @@
+from datetime import datetime, timezone
+
+import http_cache
+
+MAX_PAGE_SIZE = 100
+
+# Per-user data: browsers may keep it, but must revalidate (cheaply, via ETag) on every use
+CACHE_CONTROL = 'private, no-cache'
+
+_EPOCH = datetime.fromtimestamp(0, timezone.utc)
+
+
+def _format_submission(submission: dict) -> dict:
+    return {
+        'submission_id': submission['id'],
+        'questionnaire_type': submission['questionnaire_type'],
+        'created_at': submission['created_at'],
+        'answers': submission['answers']
+    }
+
+
+def fetch_submissions(db, user_id: str, limit: int | None = None, cursor: int | None = None):
+    """
+    Return (submissions, next_cursor, version) for a user in one round trip,
+    with each submission's answers embedded. When `limit` is given, results are
+    keyset-paginated on submission id: pass the returned `next_cursor` back as
+    `cursor` to get the following page (None means there are no more).
+    `version` (see submission_version) is None for a page, which doesn't see
+    every submission.
+    """
+    # Fetch one extra row to learn whether another page exists
+    rows = db.list_submissions(user_id, limit + 1 if limit is not None else None, cursor)
+    return _page(rows, limit, cursor)
+
+
+async def fetch_submissions_async(db, user_id: str, limit: int | None = None, cursor: int | None = None):
+    rows = await db.list_submissions(user_id, limit + 1 if limit is not None else None, cursor)
+    return _page(rows, limit, cursor)
+
+
+def _page(rows: list[dict], limit: int | None, cursor: int | None):
+    version = _version_of(rows) if limit is None and cursor is None else None
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1]['id']
+
+    return [_format_submission(row) for row in rows], next_cursor, version
+
+
+def submission_version(db, user_id: str) -> tuple:
+    """
+    (count, id, updated_at) of the user's most recently updated submission.
+    Any insert, update or delete of their submissions changes it.
+    """
+    return db.get_submission_version(user_id)
+
+
+def _version_of(rows: list[dict]) -> tuple:
+    """submission_version() computed from all of a user's submission rows."""
+    if not rows:
+        return 0, None, None
+    latest = max(rows, key=lambda row: (http_cache.parse_timestamp(row.get('updated_at')) or _EPOCH, row['id']))
+    return len(rows), latest['id'], latest.get('updated_at')
+
+
+def validators(user_id: str, variant: str, version: tuple):
+    """(ETag, Last-Modified) of one representation (`variant`) of a user's submissions."""
+    count, latest_id, updated_at = version
+    return http_cache.make_etag('user-responses', user_id, variant, count, latest_id, updated_at), \
+        http_cache.parse_timestamp(updated_at)
+
+
+def submission_exists(db, user_id: str) -> bool:
+    return db.submission_exists(user_id)
+
+
+def submission_summary(db, user_id: str):
+    """
+    (summary, version): counts per user without loading any answer rows
+    (answers are counted by the database).
+    """
+    return _summarize(db.list_submission_answer_counts(user_id))
+
+
+async def submission_summary_async(db, user_id: str):
+    return _summarize(await db.list_submission_answer_counts(user_id))
+
+
+def _summarize(rows: list[dict]):
+    by_type = {}
+    for row in rows:
+        by_type[row['questionnaire_type']] = by_type.get(row['questionnaire_type'], 0) + 1
+
+    return {
+        'submission_count': len(rows),
+        'answer_count': sum(row['answer_count'] for row in rows),
+        'submissions_by_type': by_type,
+        'latest_submission_id': rows[-1]['id'] if rows else None,
+        'latest_created_at': rows[-1]['created_at'] if rows else None
+    }, _version_of(rows)
+
+
+def parse_page_args(args):
+    """
+    Read `limit` / `cursor` query parameters.
+    Returns (limit, cursor) or raises ValueError with a client-facing message.
+    """
+    limit = args.get('limit')
+    cursor = args.get('cursor')
+
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError('limit must be an integer')
+        if limit < 1 or limit > MAX_PAGE_SIZE:
+            raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+
+    if cursor is not None:
+        try:
+            cursor = int(cursor)
+        except ValueError:
+            raise ValueError('cursor must be an integer')
+
+    return limit, cursor
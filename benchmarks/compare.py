@@ -0,0 +1,42 @@
+"""
+Diff two benchmark result files.
+
+    python benchmarks/compare.py benchmarks/results/old.json benchmarks/results/new.json
+"""
+import json
+import sys
+
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_per_worker_rps', 'storage_calls_per_request')
+
+
+def _change(old, new) -> str:
+    if old is None or new is None:
+        return f'{old} -> {new}'
+    if old == 0:
+        return f'{old} -> {new}'
+    return f'{old} -> {new} ({(new - old) / old * 100:+.1f}%)'
+
+
+def main(argv=None):
+    argv = argv if argv is not None else sys.argv[1:]
+    if len(argv) != 2:
+        print(__doc__)
+        return 2
+
+    with open(argv[0], 'r', encoding='utf-8') as f:
+        old = json.load(f)['endpoints']
+    with open(argv[1], 'r', encoding='utf-8') as f:
+        new = json.load(f)['endpoints']
+
+    for name in sorted(set(old) | set(new)):
+        print(name)
+        if name not in old or name not in new:
+            print('    only in', argv[0] if name in old else argv[1])
+            continue
+        for metric in METRICS:
+            print(f'    {metric:<28} {_change(old[name].get(metric), new[name].get(metric))}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
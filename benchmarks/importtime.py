@@ -0,0 +1,86 @@
+"""
+Cold-start import cost of the serverless entrypoint (api/index.py).
+
+Runs `python -X importtime -c "import api.index"` in a fresh interpreter a few
+times, keeps the fastest run, and prints the total plus the most expensive
+top-level packages (cumulative time, so children are included).
+
+    python benchmarks/importtime.py
+    python benchmarks/importtime.py --budget-ms 150     # exit 1 when over budget
+    python benchmarks/importtime.py --json importtime.json
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+
+
+def measure(module: str, env: dict) -> dict:
+    """{module name: (self_us, cumulative_us, depth)} for one fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'import {module} failed:\n{result.stderr[-2000:]}')
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            # -X importtime indents nested imports by two spaces per level
+            modules[name] = (int(self_us), int(cumulative_us), (len(indent) - 1) // 2)
+    return modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='api.index')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--budget-ms', type=float, help='fail when the total import time exceeds this')
+    parser.add_argument('--json', help='also write the breakdown to this file')
+    args = parser.parse_args(argv)
+
+    # Measure what a deploy sees: credentials present, default (Supabase) storage
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    env.setdefault('SUPABASE_URL', 'https://example.supabase.co')
+    env.setdefault('SUPABASE_KEY', 'importtime-placeholder-key')
+    env.pop('CHON_STORAGE', None)
+
+    runs = [measure(args.module, env) for _ in range(args.runs)]
+    best = min(runs, key=lambda modules: modules[args.module][1])
+    total_ms = best[args.module][1] / 1000
+
+    top_level = sorted(
+        ((name, cumulative) for name, (_, cumulative, depth) in best.items() if depth == 1),
+        key=lambda item: item[1], reverse=True
+    )
+
+    print(f'import {args.module}: {total_ms:.1f} ms (best of {args.runs})')
+    for name, cumulative in top_level[:args.top]:
+        print(f'  {cumulative / 1000:8.1f} ms  {name}')
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({
+                'module': args.module,
+                'total_ms': total_ms,
+                'modules': {name: {'self_us': s, 'cumulative_us': c, 'depth': d} for name, (s, c, d) in best.items()},
+            }, f, indent=2)
+
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f'Import time {total_ms:.1f} ms exceeds budget of {args.budget_ms:.1f} ms')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
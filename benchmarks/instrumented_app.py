@@ -0,0 +1,23 @@
+"""
+The production Flask app (api/index.py), additionally reporting how many
+database round trips each request made in an X-Storage-Calls header (the
+count is collected by metrics.InstrumentedStorage). Used by run_benchmarks.py
+both in-process and as a gunicorn app module.
+"""
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from flask import g
+
+from api import index as api_index
+
+app = api_index.app
+
+
+@app.after_request
+def report_storage_calls(response):
+    response.headers['X-Storage-Calls'] = str(g.get('storage_calls', 0))
+    return response
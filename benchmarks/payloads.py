@@ -0,0 +1,49 @@
+"""
+Realistic request bodies generated from the frontend's question catalog
+(database/client_catalog.json), with the question ids the frontend sends.
+"""
+import json
+import os
+import random
+
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'database', 'client_catalog.json')
+
+QUESTIONNAIRE_TYPES = ('mother', 'corporate', 'other', 'both')
+
+_SAMPLE_TEXT = ['Shanghai', 'Singapore', 'Toronto', 'London', 'Peking Union Medical College Hospital', '3.2 kg']
+
+
+def load_catalog(path: str = CATALOG_PATH) -> dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def random_answer(question: dict, rng: random.Random) -> str:
+    if question['type'] == 'scale-question':
+        return str(rng.randint(1, 5))
+    if question['type'] == 'multi-select':
+        # Sent as a JSON array, as the frontend does
+        return json.dumps(rng.sample(question['options'], rng.randint(1, 2)))
+    if question['type'] == 'multiple-choice':
+        return rng.choice(question['options'])
+    return rng.choice(_SAMPLE_TEXT)
+
+
+def submission_payload(catalog: dict, questionnaire_type: str, user_id: str, rng: random.Random) -> dict:
+    """A full /api/batch-question-responses body answering every question of one questionnaire."""
+    questions = {q['id']: q for q in catalog['questions']}
+    payload = {
+        'user_id': user_id,
+        'type': questionnaire_type,
+        'answers': [
+            {'question_id': question_id, 'response_value': random_answer(questions[question_id], rng)}
+            for question_id in catalog['menus'][questionnaire_type]
+        ]
+    }
+    if questionnaire_type in ('corporate', 'both'):
+        payload['corporate_role'] = rng.choice(['founder', 'board_member', 'executive'])
+    return payload
+
+
+def user_id(n: int) -> str:
+    return f'chon_bench_{n}'
@@ -0,0 +1,268 @@
+"""
+Benchmark / load test for every /api route against a local SQLite database.
+
+    python benchmarks/run_benchmarks.py                       # in-process (Flask test client)
+    python benchmarks/run_benchmarks.py --mode gunicorn -w 4 -c 16
+    python benchmarks/compare.py old.json new.json
+
+Reports p50/p95/p99 latency, throughput per worker and database round trips
+per request for each endpoint, and writes the results as JSON
+(benchmarks/results/<mode>-<timestamp>.json by default) so runs can be diffed.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import payloads
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BENCH_DIR, '..')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+SEED_USERS = 20
+SEED_PASSWORD = 'benchmark-password'
+
+
+class InProcessClient:
+    workers = 1
+
+    def __init__(self):
+        from instrumented_app import app
+        self._client = app.test_client()
+
+    def request(self, method, path, body=None, headers=None):
+        start = time.perf_counter()
+        response = self._client.open(path, method=method, json=body, headers=headers or {})
+        elapsed = time.perf_counter() - start
+        return response.status_code, response.headers.get('X-Storage-Calls'), elapsed
+
+    def close(self):
+        pass
+
+
+class GunicornClient:
+    def __init__(self, workers: int, port: int, env: dict):
+        self.workers = workers
+        self.port = port
+        self._process = subprocess.Popen(
+            ['gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}', '--chdir', BENCH_DIR,
+             '--log-level', 'warning', 'instrumented_app:app'],
+            env=env
+        )
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                self.request('GET', '/')
+                break
+            except OSError:
+                if time.monotonic() > deadline or self._process.poll() is not None:
+                    self.close()
+                    raise RuntimeError('gunicorn did not start')
+                time.sleep(0.2)
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        data = None
+        if body is not None:
+            data = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        start = time.perf_counter()
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        try:
+            conn.request(method, path, body=data, headers=headers)
+            response = conn.getresponse()
+            response.read()
+        finally:
+            conn.close()
+        elapsed = time.perf_counter() - start
+        return response.status, response.getheader('X-Storage-Calls'), elapsed
+
+    def close(self):
+        self._process.terminate()
+        self._process.wait(timeout=30)
+
+
+def build_scenarios(catalog: dict, rng: random.Random) -> dict:
+    """name -> callable(i) returning (method, path, body, headers)."""
+    counter = iter(range(10**9))
+
+    def seeded_user():
+        return payloads.user_id(rng.randrange(SEED_USERS))
+
+    scenarios = {
+        'GET /': lambda i: ('GET', '/', None, None),
+        'OPTIONS /api/login (preflight)': lambda i: (
+            'OPTIONS', '/api/login', None,
+            {'Origin': 'http://localhost:5173', 'Access-Control-Request-Method': 'POST'}
+        ),
+        'POST /api/intro-choice': lambda i: (
+            'POST', '/api/intro-choice',
+            {'user_id': payloads.user_id(rng.randrange(10_000)), 'choice': rng.choice(['yes', 'no'])}, None
+        ),
+        'GET /api/intro-stats': lambda i: ('GET', '/api/intro-stats', None, None),
+        'GET /api/user-responses/<id>': lambda i: ('GET', f'/api/user-responses/{seeded_user()}', None, None),
+        'GET /api/user-responses/<id>?limit=2': lambda i: (
+            'GET', f'/api/user-responses/{seeded_user()}?limit=2', None, None
+        ),
+        'GET /api/user-responses/<id>?exists=1': lambda i: (
+            'GET', f'/api/user-responses/{seeded_user()}?exists=1', None, None
+        ),
+        'GET /api/user-responses/<id>?summary=1': lambda i: (
+            'GET', f'/api/user-responses/{seeded_user()}?summary=1', None, None
+        ),
+        'POST /api/signup': lambda i: (
+            'POST', '/api/signup',
+            {'user_id': f'chon_signup_{next(counter)}_{rng.random()}', 'username': 'bench',
+             'password': SEED_PASSWORD, 'email': f'signup{rng.random()}@example.com'}, None
+        ),
+        'POST /api/login': lambda i: (
+            'POST', '/api/login',
+            {'email': f'{seeded_user()}@example.com', 'password': SEED_PASSWORD}, None
+        ),
+    }
+    for questionnaire_type in payloads.QUESTIONNAIRE_TYPES:
+        count = len(catalog['menus'][questionnaire_type])
+        scenarios[f'POST /api/batch-question-responses ({questionnaire_type}, {count} answers)'] = (
+            lambda i, t=questionnaire_type: (
+                'POST', '/api/batch-question-responses',
+                payloads.submission_payload(catalog, t, payloads.user_id(SEED_USERS + rng.randrange(10_000)), rng),
+                None
+            )
+        )
+    return scenarios
+
+
+def seed(client, catalog: dict, rng: random.Random):
+    """Give every seeded user an account and one submission per questionnaire type."""
+    for n in range(SEED_USERS):
+        user_id = payloads.user_id(n)
+        client.request('POST', '/api/signup', {
+            'user_id': user_id, 'username': user_id, 'password': SEED_PASSWORD, 'email': f'{user_id}@example.com'
+        })
+        for questionnaire_type in payloads.QUESTIONNAIRE_TYPES:
+            client.request('POST', '/api/batch-question-responses',
+                           payloads.submission_payload(catalog, questionnaire_type, user_id, rng))
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(client, make_request, requests: int, concurrency: int) -> dict:
+    def one(i):
+        method, path, body, headers = make_request(i)
+        return client.request(method, path, body, headers)
+
+    start = time.perf_counter()
+    if concurrency <= 1:
+        results = [one(i) for i in range(requests)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - start
+
+    latencies = sorted(elapsed * 1000 for _, _, elapsed in results)
+    errors = sum(1 for status, _, _ in results if status >= 400)
+    calls = [int(c) for _, c, _ in results if c is not None]
+    throughput = requests / wall if wall > 0 else 0.0
+    return {
+        'requests': requests,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        'throughput_rps': round(throughput, 1),
+        'throughput_per_worker_rps': round(throughput / client.workers, 1),
+        'storage_calls_per_request': round(sum(calls) / len(calls), 2) if calls else None,
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['inprocess', 'gunicorn'], default='inprocess')
+    parser.add_argument('-n', '--requests', type=int, default=200, help='requests per endpoint')
+    parser.add_argument('-c', '--concurrency', type=int, default=1, help='client threads (gunicorn mode)')
+    parser.add_argument('-w', '--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--only', help='run only endpoints whose name contains this text')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('-o', '--output', help='results file (default: benchmarks/results/<mode>-<timestamp>.json)')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    catalog = payloads.load_catalog()
+
+    db_dir = tempfile.mkdtemp(prefix='chon-bench-')
+    # Logins and signups all come from one address; measure them, not the rate limiter
+    env = dict(os.environ, CHON_STORAGE='sqlite', CHON_SQLITE_PATH=os.path.join(db_dir, 'bench.db'),
+               CHON_RATE_LIMIT='0')
+    os.environ.update(env)
+
+    if args.mode == 'inprocess':
+        concurrency = 1
+        client = InProcessClient()
+    else:
+        concurrency = args.concurrency
+        # Build the schema once so workers don't race to migrate the same file
+        sys.path.insert(0, os.path.join(ROOT, 'backend'))
+        import storage
+        storage.SQLiteStorage(env['CHON_SQLITE_PATH'])
+        client = GunicornClient(args.workers, args.port, env)
+
+    try:
+        seed(client, catalog, rng)
+        results = {}
+        for name, make_request in build_scenarios(catalog, rng).items():
+            if args.only and args.only not in name:
+                continue
+            results[name] = run_scenario(client, make_request, args.requests, concurrency)
+            r = results[name]
+            print(f"{name:<72} p50 {r['p50_ms']:>8.2f}ms  p95 {r['p95_ms']:>8.2f}ms  p99 {r['p99_ms']:>8.2f}ms  "
+                  f"{r['throughput_per_worker_rps']:>8.1f} rps/worker  calls {r['storage_calls_per_request']}"
+                  f"{'  errors ' + str(r['errors']) if r['errors'] else ''}")
+    finally:
+        client.close()
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'mode': args.mode,
+            'workers': client.workers,
+            'concurrency': concurrency,
+            'requests_per_endpoint': args.requests,
+            'seed': args.seed,
+        },
+        'endpoints': results,
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{args.mode}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
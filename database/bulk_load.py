@@ -0,0 +1,279 @@
+"""
+Streaming bulk loader: question_identity_mapping from the mapping files, or
+any table from a CSV / NDJSON file, in bounded chunks.
+
+    python database/bulk_load.py question-mapping --dry-run mapping.csv
+    python database/bulk_load.py question-mapping                  # Supabase (SUPABASE_URL / SUPABASE_KEY)
+    python database/bulk_load.py question-mapping --database-url postgresql://...   # COPY, needs psycopg
+    python database/bulk_load.py question-mapping --sqlite chon.db
+    python database/bulk_load.py ndjson answers.ndjson --table question_answers --conflict id
+
+Rows are read lazily and written `--chunk-size` at a time, so memory stays
+flat however large the input. Every write is INSERT ... ON CONFLICT (--conflict)
+DO NOTHING, so a load can be re-run or resumed safely; pass --update to
+overwrite existing rows instead (e.g. to apply remapped unique ids after
+generate_mapping.py). With a database URL each chunk is COPYed into a temp
+table and inserted from there, the fastest path into Postgres.
+
+Loading question-mapping into Supabase or Postgres then recounts the answer
+distributions (rebuild_question_option_counts(), migrations/05), which are
+keyed by unique question id. The SQLite stand-in counts new submissions only.
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+
+DATABASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MAPPING_TABLE = 'question_identity_mapping'
+MAPPING_COLUMNS = ('questionnaire_type', 'question_id', 'unique_question_id', 'question_type')
+MAPPING_CONFLICT = 'questionnaire_type, question_id'
+
+
+# sources
+
+def mapping_rows(mapping_path: str, unique_questions_path: str):
+    with open(mapping_path, 'r', encoding='utf-8') as f:
+        mapping = json.load(f)
+    with open(unique_questions_path, 'r', encoding='utf-8') as f:
+        question_types = {unique_id: question.get('type') for unique_id, question in json.load(f).items()}
+    for key, unique_id in mapping.items():
+        questionnaire_type, _, question_id = key.partition(':')
+        if not question_id.isdigit():
+            print(f'Skipping malformed mapping key: {key}', file=sys.stderr)
+            continue
+        yield {
+            'questionnaire_type': questionnaire_type,
+            'question_id': int(question_id),
+            'unique_question_id': unique_id,
+            'question_type': question_types.get(str(unique_id)),
+        }
+
+
+def csv_rows(path: str):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            # Empty cells are NULLs, as in COPY's CSV format
+            yield {column: (value if value != '' else None) for column, value in row.items()}
+
+
+def ndjson_rows(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def chunks(rows, size: int):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# sinks: write(chunk) -> rows inserted or updated (None when the backend doesn't say)
+
+class CsvSink:
+    def __init__(self, path: str, columns: tuple):
+        self._file = sys.stdout if path == '-' else open(path, 'w', encoding='utf-8', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=columns, extrasaction='ignore')
+        self._writer.writeheader()
+
+    def write(self, chunk: list[dict]) -> int:
+        self._writer.writerows(chunk)
+        return len(chunk)
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+
+class PostgrestSink:
+    def __init__(self, url: str, key: str, table: str, conflict: str, update: bool):
+        from postgrest import SyncPostgrestClient
+        from postgrest.types import ReturnMethod
+
+        self._client = SyncPostgrestClient(f"{url}/rest/v1", headers={
+            'apikey': key,
+            'Authorization': f'Bearer {key}'
+        })
+        self._table = table
+        self._conflict = conflict.replace(' ', '')
+        self._update = update
+        self._returning = ReturnMethod.minimal
+
+    def write(self, chunk: list[dict]) -> int | None:
+        self._client.table(self._table).upsert(
+            chunk, on_conflict=self._conflict, ignore_duplicates=not self._update, returning=self._returning
+        ).execute()
+        return None
+
+    def rebuild_counts(self):
+        self._client.rpc('rebuild_question_option_counts', {}).execute()
+
+    def close(self):
+        self._client.aclose()
+
+
+class PostgresCopySink:
+    def __init__(self, database_url: str, table: str, columns: tuple, conflict: str, update: bool):
+        try:
+            import psycopg
+            from psycopg import sql
+        except ImportError:
+            raise SystemExit('--database-url needs psycopg: pip install "psycopg[binary]"')
+
+        self._conn = psycopg.connect(database_url)
+        self._columns = columns
+        column_list = sql.SQL(', ').join(map(sql.Identifier, columns))
+        conflict_list = sql.SQL(', ').join(sql.Identifier(c.strip()) for c in conflict.split(','))
+        if update:
+            action = sql.SQL('DO UPDATE SET {}').format(sql.SQL(', ').join(
+                sql.SQL('{0} = EXCLUDED.{0}').format(sql.Identifier(c)) for c in columns
+            ))
+        else:
+            action = sql.SQL('DO NOTHING')
+        self._create = sql.SQL('CREATE TEMP TABLE bulk_load_chunk (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP').format(
+            sql.Identifier(table)
+        )
+        self._copy = sql.SQL('COPY bulk_load_chunk ({}) FROM STDIN').format(column_list)
+        self._insert = sql.SQL('INSERT INTO {0} ({1}) SELECT {1} FROM bulk_load_chunk ON CONFLICT ({2}) {3}').format(
+            sql.Identifier(table), column_list, conflict_list, action
+        )
+
+    def write(self, chunk: list[dict]) -> int:
+        with self._conn.transaction(), self._conn.cursor() as cursor:
+            cursor.execute(self._create)
+            with cursor.copy(self._copy) as copy:
+                for row in chunk:
+                    copy.write_row([row.get(column) for column in self._columns])
+            cursor.execute(self._insert)
+            return cursor.rowcount
+
+    def rebuild_counts(self):
+        with self._conn.transaction():
+            self._conn.execute('SELECT rebuild_question_option_counts()')
+
+    def close(self):
+        self._conn.close()
+
+
+class SQLiteSink:
+    def __init__(self, path: str, table: str, columns: tuple, conflict: str, update: bool):
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._columns = columns
+        action = (
+            'DO UPDATE SET ' + ', '.join(f'{c} = excluded.{c}' for c in columns) if update else 'DO NOTHING'
+        )
+        self._insert = (
+            f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))}) '
+            f'ON CONFLICT ({conflict}) {action}'
+        )
+
+    def write(self, chunk: list[dict]) -> int:
+        before = self._conn.total_changes
+        self._conn.execute('BEGIN')
+        self._conn.executemany(self._insert, [[row.get(c) for c in self._columns] for row in chunk])
+        self._conn.execute('COMMIT')
+        return self._conn.total_changes - before
+
+    def close(self):
+        self._conn.close()
+
+
+def load(rows, sink, chunk_size: int, report_every: float = 2.0) -> dict:
+    started = last_report = time.perf_counter()
+    read = written = 0
+    written_known = True
+    for chunk in chunks(rows, chunk_size):
+        changed = sink.write(chunk)
+        read += len(chunk)
+        if changed is None:
+            written_known = False
+        else:
+            written += changed
+        now = time.perf_counter()
+        if now - last_report >= report_every:
+            print(f'{read} rows, {read / (now - started):.0f} rows/s', file=sys.stderr)
+            last_report = now
+    elapsed = time.perf_counter() - started
+    return {
+        'rows': read,
+        'written': written if written_known else None,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(read / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', choices=['question-mapping', 'csv', 'ndjson'])
+    parser.add_argument('path', nargs='?', help='input file for csv / ndjson')
+    parser.add_argument('--table', help='target table (question-mapping: question_identity_mapping)')
+    parser.add_argument('--conflict', help='conflict target columns, comma separated')
+    parser.add_argument('--columns', help='columns to load, comma separated (default: the first row\'s keys)')
+    parser.add_argument('--mapping', default=os.path.join(DATABASE_DIR, 'question_mapping.json'))
+    parser.add_argument('--unique-questions', default=os.path.join(DATABASE_DIR, 'unique_questions.json'))
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--update', action='store_true', help='overwrite conflicting rows instead of skipping them')
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--dry-run', metavar='CSV', help="write the rows to this CSV file ('-' for stdout) instead")
+    target.add_argument('--database-url', default=os.getenv('DATABASE_URL'), help='Postgres URL, loads with COPY')
+    target.add_argument('--sqlite', help='SQLite database file (CHON_STORAGE=sqlite schema)')
+    args = parser.parse_args(argv)
+
+    if args.source == 'question-mapping':
+        rows = mapping_rows(args.mapping, args.unique_questions)
+        table, conflict, columns = args.table or MAPPING_TABLE, args.conflict or MAPPING_CONFLICT, MAPPING_COLUMNS
+    else:
+        if not (args.path and args.table and args.conflict):
+            parser.error(f'{args.source} needs a path, --table and --conflict')
+        rows = csv_rows(args.path) if args.source == 'csv' else ndjson_rows(args.path)
+        table, conflict = args.table, args.conflict
+        first = next(rows, None)
+        if first is None:
+            print('No rows to load')
+            return 0
+        columns = tuple(c.strip() for c in args.columns.split(',')) if args.columns else tuple(first)
+        rows = _prepend(first, rows)
+
+    if args.dry_run:
+        sink = CsvSink(args.dry_run, columns)
+    elif args.sqlite:
+        sink = SQLiteSink(args.sqlite, table, columns, conflict, args.update)
+    elif args.database_url:
+        sink = PostgresCopySink(args.database_url, table, columns, conflict, args.update)
+    else:
+        url, key = os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_KEY')
+        if not (url and key):
+            parser.error('set SUPABASE_URL / SUPABASE_KEY, or pass --database-url, --sqlite or --dry-run')
+        sink = PostgrestSink(url, key, table, conflict, args.update)
+
+    try:
+        result = load(rows, sink, args.chunk_size)
+        if args.source == 'question-mapping' and hasattr(sink, 'rebuild_counts'):
+            sink.rebuild_counts()
+            print('Rebuilt question_option_counts from the new mapping', file=sys.stderr)
+    finally:
+        sink.close()
+    written = 'unknown' if result['written'] is None else result['written']
+    print(f"{result['rows']} rows ({written} written) in {result['seconds']}s, "
+          f"{result['rows_per_second']} rows/s", file=sys.stderr)
+    return 0
+
+
+def _prepend(first, rows):
+    yield first
+    yield from rows
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+Download submissions from /api/export/submissions, streaming to a file.
+
+    python database/export_submissions.py --url https://<host> -o submissions.ndjson
+    python database/export_submissions.py --url https://<host> --format csv -o submissions.csv.gz
+    python database/export_submissions.py --url https://<host> -o nightly.ndjson --state export_state.json
+
+The token is read from CHON_EXPORT_TOKEN (or --token). The response is
+requested gzip-compressed and copied to the output in fixed-size blocks,
+decompressed on the way unless the output name ends in .gz (then a response
+the server didn't compress is gzipped here), so memory stays flat. With --state, only submissions created or changed since the previous
+successful run are pulled, and the state file is updated afterwards.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.parse
+import urllib.request
+import zlib
+
+BLOCK_SIZE = 1 << 16
+
+
+def _read_state(path: str | None) -> dict:
+    if not path:
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_state(path: str, state: dict):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', required=True, help='API base URL, e.g. https://example.vercel.app')
+    parser.add_argument('--token', default=os.getenv('CHON_EXPORT_TOKEN'))
+    parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson')
+    parser.add_argument('--type', help='only this questionnaire type')
+    parser.add_argument('--updated-since', help='ISO 8601 timestamp (overrides --state)')
+    parser.add_argument('--state', help='file remembering where the last successful run stopped')
+    parser.add_argument('-o', '--output', default='-', help="output file ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    if not args.token:
+        parser.error('set CHON_EXPORT_TOKEN or pass --token')
+
+    state = _read_state(args.state)
+    params = {'format': args.format}
+    updated_since = args.updated_since or state.get('updated_since')
+    if updated_since:
+        params['updated_since'] = updated_since
+    if args.type:
+        params['type'] = args.type
+
+    url = f"{args.url.rstrip('/')}/api/export/submissions?{urllib.parse.urlencode(params)}"
+    http_request = urllib.request.Request(url, headers={
+        'Authorization': f'Bearer {args.token}',
+        'Accept-Encoding': 'gzip',
+    })
+
+    keep_compressed = args.output.endswith('.gz')
+    out = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+    started = time.perf_counter()
+    received = written = 0
+    try:
+        with urllib.request.urlopen(http_request) as response:
+            export_started_at = response.headers.get('X-Export-Started-At')
+            gzipped = response.headers.get('Content-Encoding') == 'gzip'
+            # wbits 31: the gzip container, which the server sends and .gz files hold
+            if gzipped and not keep_compressed:
+                codec = zlib.decompressobj(31)
+                convert = codec.decompress
+            elif keep_compressed and not gzipped:
+                codec = zlib.compressobj(6, zlib.DEFLATED, 31)
+                convert = codec.compress
+            else:
+                codec = None
+            while block := response.read(BLOCK_SIZE):
+                received += len(block)
+                data = convert(block) if codec is not None else block
+                out.write(data)
+                written += len(data)
+            if codec is not None:
+                tail = codec.flush()
+                out.write(tail)
+                written += len(tail)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+
+    elapsed = time.perf_counter() - started
+    print(f'{received} bytes received, {written} bytes written in {elapsed:.1f}s'
+          f"{' (since ' + updated_since + ')' if updated_since else ''}", file=sys.stderr)
+
+    if args.state and export_started_at:
+        _write_state(args.state, {**state, 'updated_since': export_started_at})
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Build client_catalog.json from the question catalog the frontend ships
+(frontend/src/features/personality-test/data/questions.ts and menu.ts).
+
+Submissions carry the frontend's question ids, which are global: one id per
+question across every questionnaire, picked per questionnaire type by
+menu.ts. output.json numbers questions per questionnaire instead, so the
+backend validates and scores submissions against this file, not output.json.
+Only what the backend needs is kept: each question's type, option ids and
+tags, and each type's question ids.
+
+    python database/generate_client_catalog.py           # rewrite client_catalog.json
+    python database/generate_client_catalog.py --check   # exit 1 when it is out of date
+
+The .ts files are plain object literals, read by a small parser for that
+subset of JavaScript (no expressions, spreads or template strings).
+"""
+import argparse
+import json
+import os
+import re
+import sys
+
+DATABASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FRONTEND_DATA_DIR = os.path.join(DATABASE_DIR, '..', 'frontend', 'src', 'features', 'personality-test', 'data')
+
+# Question fields the backend reads; options are reduced to their ids
+QUESTION_FIELDS = ('id', 'type', 'options', 'independentSelect', 'tags', 'tagsFemale', 'tagsMale')
+
+_TOKEN = re.compile(r'''
+    \s+ | //[^\n]* | /\*.*?\*/                   # skipped
+  | (?P<string>'(?:\\.|[^'\\])*'|"(?:\\.|[^"\\])*")
+  | (?P<number>-?\d+(?:\.\d+)?)
+  | (?P<name>[A-Za-z_$][\w$]*)
+  | (?P<punct>[{}\[\]:,;])
+''', re.VERBOSE | re.DOTALL)
+_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f', 'v': '\v', '0': '\0'}
+_CONSTANTS = {'true': True, 'false': False, 'null': None}
+
+
+def _unescape(literal: str) -> str:
+    return re.sub(r'\\(u[0-9a-fA-F]{4}|.)',
+                  lambda m: chr(int(m.group(1)[1:], 16)) if len(m.group(1)) == 5 else _ESCAPES.get(m.group(1), m.group(1)),
+                  literal[1:-1], flags=re.DOTALL)
+
+
+def _tokens(source: str, start: int) -> list[tuple[str, str]]:
+    tokens, position = [], start
+    while position < len(source):
+        match = _TOKEN.match(source, position)
+        if match is None:
+            raise ValueError(f'Unexpected {source[position:position + 20]!r} at offset {position}')
+        position = match.end()
+        if match.lastgroup:
+            tokens.append((match.lastgroup, match.group(match.lastgroup)))
+    return tokens
+
+
+def _parse_value(tokens: list, i: int):
+    """(value, index after it) for the literal starting at tokens[i]."""
+    kind, text = tokens[i]
+    if kind == 'string':
+        return _unescape(text), i + 1
+    if kind == 'number':
+        return float(text) if '.' in text else int(text), i + 1
+    if kind == 'name':
+        if text not in _CONSTANTS:
+            raise ValueError(f'Unsupported identifier {text!r}')
+        return _CONSTANTS[text], i + 1
+    if text == '[':
+        items, i = [], i + 1
+        while tokens[i][1] != ']':
+            value, i = _parse_value(tokens, i)
+            items.append(value)
+            if tokens[i][1] == ',':
+                i += 1
+        return items, i + 1
+    if text == '{':
+        obj, i = {}, i + 1
+        while tokens[i][1] != '}':
+            kind, key = tokens[i]
+            if kind not in ('name', 'string') or tokens[i + 1][1] != ':':
+                raise ValueError(f'Unexpected {key!r} where a key was expected')
+            obj[key if kind == 'name' else _unescape(key)], i = _parse_value(tokens, i + 2)
+            if tokens[i][1] == ',':
+                i += 1
+        return obj, i + 1
+    raise ValueError(f'Unexpected {text!r}')
+
+
+def parse_export(path: str, name: str):
+    """The literal assigned to `export const <name>` in a .ts file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        source = f.read()
+    match = re.search(rf'export\s+const\s+{re.escape(name)}\b[^=]*=', source)
+    if match is None:
+        raise ValueError(f'No export const {name} in {path}')
+    return _parse_value(_tokens(source, match.end()), 0)[0]
+
+
+def build(questions: list[dict], menus: list[dict]) -> dict:
+    compact = []
+    for question in sorted(questions, key=lambda q: q['id']):
+        entry = {field: question[field] for field in QUESTION_FIELDS if field in question}
+        if 'options' in entry:
+            entry['options'] = [option['id'] for option in entry['options']]
+        compact.append(entry)
+    ids = [question['id'] for question in compact]
+    if len(ids) != len(set(ids)):
+        raise ValueError('questions.ts has duplicate question ids')
+
+    by_type = {}
+    for menu in menus:
+        menu_ids = [qid for section in menu['sections'] for qid in section['questions']]
+        unknown = sorted(set(menu_ids) - set(ids))
+        if unknown:
+            raise ValueError(f'menu.ts lists unknown questions for {menu["identity"]}: {unknown}')
+        by_type[menu['identity']] = menu_ids
+    return {'questions': compact, 'menus': by_type}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', default=os.path.join(FRONTEND_DATA_DIR, 'questions.ts'))
+    parser.add_argument('--menu', default=os.path.join(FRONTEND_DATA_DIR, 'menu.ts'))
+    parser.add_argument('--output', default=os.path.join(DATABASE_DIR, 'client_catalog.json'))
+    parser.add_argument('--check', action='store_true', help='exit 1 when the output is out of date')
+    args = parser.parse_args(argv)
+
+    client_catalog = build(parse_export(args.questions, 'questions'), parse_export(args.menu, 'questionsMenu'))
+    try:
+        with open(args.output, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+    except FileNotFoundError:
+        previous = None
+    changed = client_catalog != previous
+    counts = ', '.join(f'{t} {len(ids)}' for t, ids in client_catalog['menus'].items())
+    print(f'{len(client_catalog["questions"])} questions ({counts}){", out of date" if changed else ""}')
+
+    if args.check:
+        return 1 if changed else 0
+    if changed:
+        tmp_path = f'{args.output}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(client_catalog, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        os.replace(tmp_path, args.output)
+        print(f'Wrote {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,41 +1,156 @@
+"""
+Build unique_questions.json and question_mapping.json from the question
+catalog the frontend ships (questions.ts and menu.ts).
+
+Submissions carry the frontend's global question ids, and the frontend keeps
+answers when the user switches questionnaire, so every questionnaire type
+maps every question: "<type>:<question id>" -> unique_question_id.
+
+A question's identity is a hash of its normalized English text and options
+(see content_hash). The existing unique_questions.json is the cache: content
+it has seen keeps its unique_question_id, and only content it hasn't seen
+gets a new one (above every id ever issued). Reordering, adding or editing a
+question therefore never renumbers the others, and stored answers keep
+joining to the same unique ids.
+
+    python database/generate_mapping.py             # update both files, print the diff
+    python database/generate_mapping.py --dry-run   # print the diff only
+    python database/generate_mapping.py --check     # exit 1 when the files are out of date
+
+Ids that no longer appear in the catalog stay in unique_questions.json,
+marked "retired", so they are never issued again. After a change, load the
+mapping with `database/bulk_load.py question-mapping --update`.
+"""
+import argparse
+import hashlib
 import json
+import os
+import re
+import sys
+import unicodedata
+
+from generate_client_catalog import FRONTEND_DATA_DIR, parse_export
+
+DATABASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_text(text: str | None) -> str:
+    """NFKC, case-folded, with whitespace runs collapsed, so cosmetic edits don't change identity."""
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFKC', text or '')).strip().casefold()
+
+
+def content_hash(question: dict) -> str:
+    content = {
+        'text': normalize_text(question.get('textEn')),
+        'options': [[option.get('id'), normalize_text(option.get('textEn'))] for option in question.get('options', [])],
+    }
+    return hashlib.sha256(json.dumps(content, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def _load_json(path: str, default):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def frontend_catalog(questions_path: str, menu_path: str) -> dict:
+    """{questionnaire_type: {"questions": [...]}}, every type carrying every question of questions.ts."""
+    questions = parse_export(questions_path, 'questions')
+    return {menu['identity']: {'questions': questions} for menu in parse_export(menu_path, 'questionsMenu')}
+
+
+def build(catalog: dict, previous_unique: dict) -> tuple[dict, dict]:
+    """(unique_questions, mapping) for `catalog`, reusing the ids in `previous_unique`."""
+    known = {}
+    for unique_id in sorted(previous_unique, key=int):
+        question = previous_unique[unique_id]
+        # Files written before content hashing get theirs computed once, here
+        known.setdefault(question.get('contentHash') or content_hash(question), int(unique_id))
+    next_id = max(map(int, previous_unique), default=0) + 1
+
+    unique, mapping = {}, {}
+    for questionnaire_type, questionnaire in catalog.items():
+        for question in questionnaire.get('questions', []):
+            if not question.get('textEn'):
+                continue
+            digest = content_hash(question)
+            unique_id = known.get(digest)
+            if unique_id is None:
+                unique_id = known[digest] = next_id
+                next_id += 1
+            if unique_id not in unique:
+                unique[unique_id] = {**question, 'contentHash': digest}
+            mapping[f'{questionnaire_type}:{question["id"]}'] = unique_id
+
+    for unique_id, question in previous_unique.items():
+        if int(unique_id) not in unique:
+            unique[int(unique_id)] = {**question, 'retired': True}
+
+    return {str(uid): unique[uid] for uid in sorted(unique)}, mapping
+
+
+def diff(previous_mapping: dict, mapping: dict, previous_unique: dict, unique: dict) -> list[str]:
+    lines = []
+    for key in sorted(previous_mapping.keys() | mapping.keys()):
+        before, after = previous_mapping.get(key), mapping.get(key)
+        if before is None:
+            lines.append(f'+ {key} -> {after}')
+        elif after is None:
+            lines.append(f'- {key} (was {before})')
+        elif before != after:
+            lines.append(f'~ {key}: {before} -> {after}')
+    for unique_id, question in unique.items():
+        previous = previous_unique.get(unique_id)
+        if previous is None:
+            lines.append(f'+ unique question {unique_id}: {question.get("textEn")}')
+        elif question.get('retired') and not previous.get('retired'):
+            lines.append(f'- unique question {unique_id} retired: {question.get("textEn")}')
+    return lines
+
+
+def _write_json(path: str, data):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', default=os.path.join(FRONTEND_DATA_DIR, 'questions.ts'))
+    parser.add_argument('--menu', default=os.path.join(FRONTEND_DATA_DIR, 'menu.ts'))
+    parser.add_argument('--unique-questions', default=os.path.join(DATABASE_DIR, 'unique_questions.json'))
+    parser.add_argument('--mapping', default=os.path.join(DATABASE_DIR, 'question_mapping.json'))
+    parser.add_argument('--dry-run', action='store_true', help='print the diff without writing anything')
+    parser.add_argument('--check', action='store_true', help='like --dry-run, but exit 1 when anything changed')
+    args = parser.parse_args(argv)
+
+    catalog = frontend_catalog(args.questions, args.menu)
+    previous_unique = _load_json(args.unique_questions, {})
+    previous_mapping = _load_json(args.mapping, {})
+
+    unique, mapping = build(catalog, previous_unique)
+    changes = diff(previous_mapping, mapping, previous_unique, unique)
+    for line in changes:
+        print(line)
+
+    # Hashes added to an old file count as a change to write, but not as a diff line
+    changed = unique != previous_unique or mapping != previous_mapping
+    active = sum(1 for question in unique.values() if not question.get('retired'))
+    print(f'{len(mapping)} questions, {active} unique ({len(unique) - active} retired), {len(changes)} changes')
+
+    if args.check:
+        return 1 if changed else 0
+    if changed and not args.dry_run:
+        _write_json(args.unique_questions, unique)
+        _write_json(args.mapping, mapping)
+        print(f'Wrote {args.unique_questions} and {args.mapping}')
+    return 0
+
 
-# 读取你的 all_questionnaires.json
-with open('/Users/jinhonglin/Desktop/chon/output.json', 'r', encoding='utf-8') as f:
-    all_data = json.load(f)
-
-# 建立映射表
-text_to_uid = {}  # textEn -> unique id
-uid_to_question = {}  # unique id -> question content
-mapping = {}  # (group, question id) -> unique id
-
-uid_counter = 1
-
-# 遍历每个问卷
-for group_name, group_data in all_data.items():
-    questions = group_data.get('questions', [])
-    for q in questions:
-        text_en = q.get('textEn')
-        if not text_en:
-            continue  # 没有 textEn 的跳过
-
-        # 如果这个内容没有遇到过，给它分配一个新的 unique id
-        if text_en not in text_to_uid:
-            text_to_uid[text_en] = uid_counter
-            uid_to_question[uid_counter] = q
-            uid_counter += 1
-
-        # 记录 mapping
-        original_id = q.get('id')
-        mapping_key = f"{group_name}:{original_id}"
-        mapping[mapping_key] = text_to_uid[text_en]
-
-# 保存 unique_questions.json
-with open('unique_questions.json', 'w', encoding='utf-8') as f:
-    json.dump(uid_to_question, f, ensure_ascii=False, indent=2)
-
-# 保存 question_mapping.json
-with open('question_mapping.json', 'w', encoding='utf-8') as f:
-    json.dump(mapping, f, ensure_ascii=False, indent=2)
-
-print("✅ Done! 已生成 unique_questions.json 和 question_mapping.json")
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,6 +7,8 @@ import { CorporateRole } from '../pages/PersonalityTest/identity/IdentitySelecti
 // API Configuration
 const API_URL = import.meta.env.VITE_API_URL || (import.meta.env.PROD ? '' : 'http://localhost:5001');
 
+const SUBMISSION_KEY_STORAGE = 'chon_submission_idempotency_key';
+
 // 问卷类型定义
 export type QuestionnaireType = 'mother' | 'corporate' | 'other' | 'both';
 export type QuestionType = 'multiple-choice' | 'text-input' | 'scale-question';
@@ -69,9 +71,10 @@ export const saveIntroChoice = async (choice: string): Promise<boolean> => {
  */
 export const hasSavedSubmission = async (userId: string): Promise<boolean> => {
   try {
-    const response = await axios.get(`${API_URL}/api/user-responses/${userId}`);
-    const submissions = response?.data?.submissions;
-    return Array.isArray(submissions) && submissions.length > 0;
+    const response = await axios.get(`${API_URL}/api/user-responses/${userId}`, {
+      params: { exists: 1 }
+    });
+    return response?.data?.exists === true;
   } catch (error) {
     console.error('Error checking existing submissions:', error);
     return false;
@@ -131,9 +134,20 @@ export const saveAllQuestionResponses = async (
       submission.corporate_role = corporateRole;
     }
 
+    // Reuse the same key until the save succeeds so a retry after a timeout
+    // returns the original submission instead of creating a duplicate
+    let idempotencyKey = sessionStorage.getItem(SUBMISSION_KEY_STORAGE);
+    if (!idempotencyKey) {
+      idempotencyKey = `${userId}_${Date.now()}_${Math.random().toString(36).substr(2, 9)}`;
+      sessionStorage.setItem(SUBMISSION_KEY_STORAGE, idempotencyKey);
+    }
+
     console.log(`Saving responses for user ${userId} to the backend...`);
     
-    await axios.post(`${API_URL}/api/batch-question-responses`, submission);
+    await axios.post(`${API_URL}/api/batch-question-responses`, submission, {
+      headers: { 'Idempotency-Key': idempotencyKey }
+    });
+    sessionStorage.removeItem(SUBMISSION_KEY_STORAGE);
     
     console.log('Successfully saved all responses to backend');
     return true;
@@ -143,6 +157,78 @@ export const saveAllQuestionResponses = async (
   }
 };
 
+export interface Draft {
+  user_id: string;
+  type: QuestionnaireType;
+  corporate_role?: CorporateRole | null;
+  answers: Record<string, string>;
+  version: number;
+  updated_at: string;
+}
+
+/**
+ * Fetch the user's server-side draft, or null when there is none
+ */
+export const getDraft = async (userId: string = getUserId()): Promise<Draft | null> => {
+  try {
+    const response = await axios.get(`${API_URL}/api/drafts/${userId}`);
+    return response.data;
+  } catch (error) {
+    return null;
+  }
+};
+
+/**
+ * Autosave the answers changed since the last patch (null clears an answer).
+ * `version` is the previous patch's version + 1; the server answers 409 with
+ * its own version when another device got there first (fetch, merge, retry).
+ */
+export const saveDraftPatch = async (
+  changed: Record<number, StoredAnswer | null>,
+  version: number,
+  questionnaireType: QuestionnaireType,
+  corporateRole?: CorporateRole | null
+): Promise<{ success: boolean; version?: number }> => {
+  const userId = getUserId();
+  const answers = Object.fromEntries(Object.entries(changed).map(([questionId, answer]) => [
+    questionId,
+    answer == null ? null : Array.isArray(answer.value) ? JSON.stringify(answer.value) : (answer.value as string)
+  ]));
+  try {
+    const response = await axios.patch(`${API_URL}/api/drafts/${userId}`, {
+      type: questionnaireType,
+      corporate_role: corporateRole ?? undefined,
+      version,
+      answers
+    });
+    return response.data;
+  } catch (error: any) {
+    return { success: false, version: error?.response?.data?.version };
+  }
+};
+
+/**
+ * Submit the saved draft without uploading the answers again
+ */
+export const submitDraft = async (version: number): Promise<boolean> => {
+  const userId = getUserId();
+  let idempotencyKey = sessionStorage.getItem(SUBMISSION_KEY_STORAGE);
+  if (!idempotencyKey) {
+    idempotencyKey = `${userId}_${Date.now()}_${Math.random().toString(36).substr(2, 9)}`;
+    sessionStorage.setItem(SUBMISSION_KEY_STORAGE, idempotencyKey);
+  }
+  try {
+    await axios.post(`${API_URL}/api/drafts/${userId}/submit`, { version }, {
+      headers: { 'Idempotency-Key': idempotencyKey }
+    });
+    sessionStorage.removeItem(SUBMISSION_KEY_STORAGE);
+    return true;
+  } catch (error) {
+    console.error('Error submitting draft:', error);
+    return false;
+  }
+};
+
 export const createAccount = async (payload: Omit<SignupPayload, 'user_id'> & { user_id?: string }): Promise<boolean> => {
   try {
     const userId = payload.user_id || getUserId();
@@ -167,5 +253,8 @@ export default {
   saveAllQuestionResponses,
   createAccount,
   login,
-  getUserResponses
+  getUserResponses,
+  getDraft,
+  saveDraftPatch,
+  submitDraft
 }; 
\ No newline at end of file